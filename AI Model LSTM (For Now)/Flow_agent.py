@@ -13,48 +13,279 @@ Usage:
     agent = FlowAgent()
     result = agent.analyze(recent_data, user_config)
     print(result['report'])
+    
+    # Many businesses, one batched forward pass
+    forecast = agent.predict_cashflow_batch({'shop_a': df_a, 'shop_b': df_b})
+    results = agent.analyze_many({'shop_a': df_a, 'shop_b': df_b}, user_configs)
+    
+    # Streaming: push one week at a time, forecast from the ring buffers
+    store.push('shop_a', week_row, '2025-12-01')
+    forecast = agent.predict_from_store(store)
+    
+    # Global multi-business model (trainLSTM.py on long-format data): one set of
+    # weights, each business forecast with its own scaling + embedding
+    agent.analyze(recent_data, {**user_config, 'business_id': 'shop_a'})
+    
+    # Forecast uncertainty (MC dropout): per-week quantiles + P(shortfall),
+    # which low_cashflow risk detection then uses instead of the point forecast
+    dist = agent.predict_cashflow_distribution(recent_data, samples=100)
+    agent = FlowAgent(uncertainty_samples=100)
+    
+    # Versioned models: serve the registry's CURRENT, hot-swap when it moves
+    agent = FlowAgent(registry='models/registry')
+    RegistryWatcher(agent, interval=30).start()
+    result['model_version']                      # version that produced the result
 """
 
-import torch
-import torch.nn as nn
 import numpy as np
-import pandas as pd
-import joblib
 import json
-import requests
-from typing import Dict, List
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, Dict, List, Optional
 from datetime import datetime
+from functools import partial
 import logging
+import os
+import threading
 import time
 
+from features import FEATURE_COLS, RAW_COLS, engineer_features, frame_to_arrays, history_span
+from forecast_cache import ForecastCache, window_key
+from metrics import REGISTRY, Metrics, NullMetrics
+
+# torch, pandas, joblib/sklearn and requests are imported lazily, only by the
+# code paths that need them, so backend='numpy' starts without any of them
+if TYPE_CHECKING:
+    import pandas as pd
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
+# Risk detection defaults
+LOW_CASHFLOW_THRESHOLD = 2000000   # MAD per week
+SHORTFALL_PROBABILITY = 0.2        # P(any week below the threshold) that flags low_cashflow
+
+# MC-dropout forecast distribution defaults
+MC_SAMPLES = 100
+MC_QUANTILES = (0.05, 0.5, 0.95)
+
+
+def __getattr__(name):
+    # BusinessLSTM / TorchRunner moved to business_lstm.py (keeps torch off the import path)
+    if name in ('BusinessLSTM', 'TorchRunner'):
+        import business_lstm
+        return getattr(business_lstm, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def read_model_metadata(metadata_path: str) -> Dict:
+    """business_metadata.json contents ({} if the file is missing)"""
+    try:
+        with open(metadata_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logger.warning(f"⚠️  {metadata_path} not found - model version unknown, default architecture")
+        return {}
+
+
+def model_version_label(metadata: Dict) -> str:
+    """Registry version id, else '<version>@<trained_at>' from the metadata"""
+    if not metadata:
+        return 'unknown'
+    if 'registry' in metadata:
+        return metadata['registry']['version']
+    return f"{metadata.get('version', '?')}@{metadata.get('trained_at', '?')}"
+
+
+def read_model_version(metadata_path: str) -> str:
+    """Model version of an artifact set (see model_version_label)"""
+    return model_version_label(read_model_metadata(metadata_path))
+
+
 # ==========================================
-# MODEL DEFINITION
+# ANALYSIS RESULT + REPORT
 # ==========================================
-class BusinessLSTM(nn.Module):
-    """LSTM for cashflow forecasting"""
-    
-    def __init__(self, num_features, hidden=64, forecast_weeks=4, num_layers=2, dropout=0.3):
-        super().__init__()
-        self.lstm = nn.LSTM(
-            input_size=num_features,
-            hidden_size=hidden,
-            num_layers=num_layers,
-            batch_first=True,
-            dropout=dropout if num_layers > 1 else 0
-        )
-        self.fc1 = nn.Linear(hidden, hidden // 2)
-        self.fc2 = nn.Linear(hidden // 2, forecast_weeks)
-        self.dropout = nn.Dropout(dropout)
-        self.relu = nn.ReLU()
-    
-    def forward(self, x):
-        lstm_out, _ = self.lstm(x)
-        last_hidden = lstm_out[:, -1, :]
-        x = self.relu(self.fc1(self.dropout(last_hidden)))
-        return self.fc2(self.dropout(x))
+class AnalysisResult(dict):
+    """
+    analyze() result dict whose text 'report' is rendered on first access
+    
+    result['report'] / result.get('report') build and keep the report;
+    until then the key is absent, so bulk serialization never pays for it.
+    """
+    
+    def __init__(self, *args, render=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._render = render
+    
+    def __missing__(self, key):
+        if key == 'report' and self._render is not None:
+            self['report'] = report = self._render()
+            self._render = None
+            return report
+        raise KeyError(key)
+    
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+def render_report(business_name: str, predictions: np.ndarray, risk_analysis: Dict,
+                  reserve_result: Dict, generated_at: Optional[datetime] = None,
+                  uncertainty: Optional[Dict] = None) -> str:
+    """Formatted text report of one analysis (uncertainty: see FlowAgent.uncertainty_at)"""
+    rule = '=' * 70
+    lines = [
+        '',
+        rule,
+        f"📊 FLOW AI CASHFLOW REPORT - {business_name}",
+        rule,
+        '',
+        "📈 4-WEEK FORECAST:"
+    ]
+    
+    # Predictions (with the outermost quantiles as an interval when known)
+    if uncertainty is None:
+        lines.extend(f"   Week {i}: {pred:>12,.2f} MAD" for i, pred in enumerate(predictions, 1))
+    else:
+        levels = sorted(uncertainty['quantiles'], key=lambda level: float(level[1:]))
+        low, high = uncertainty['quantiles'][levels[0]], uncertainty['quantiles'][levels[-1]]
+        lines.extend(f"   Week {i}: {pred:>12,.2f} MAD   ({levels[0]}-{levels[-1]}: {lo:,.0f} - {hi:,.0f})"
+                     for i, (pred, lo, hi) in enumerate(zip(predictions, low, high), 1))
+    lines.append('')
+    lines.append(f"   Average:  {predictions.mean():>12,.2f} MAD")
+    lines.append(f"   Trend:    {'📉 Declining' if predictions[-1] < predictions[0] else '📈 Growing'}")
+    if uncertainty is not None:
+        lines.append(f"   Shortfall: {uncertainty['p_shortfall']:.0%} chance of a week below "
+                     f"{uncertainty['threshold']:,.0f} MAD ({uncertainty['samples']} MC-dropout samples)")
+    lines.append('')
+    
+    # Risks
+    if risk_analysis['has_risk']:
+        severity_emoji = {'low': '⚠️', 'medium': '🔶', 'high': '🔴'}
+        lines.append(f"{severity_emoji[risk_analysis['severity']]} RISKS DETECTED "
+                     f"({risk_analysis['severity'].upper()}):")
+        lines.append('')
+        lines.extend(f"   • {risk['message']}" for risk in risk_analysis['risks'])
+    else:
+        lines.append("✅ NO RISKS DETECTED")
+    lines.append('')
+    
+    # Auto-reserve
+    lines.append("💰 AUTO-RESERVE STATUS:")
+    lines.append('')
+    action = reserve_result['action']
+    if action == 'reserved':
+        lines.append(f"   ✅ Successfully reserved {reserve_result['excess']:,.2f} MAD")
+        lines.append(f"   📍 Current inflow:  {reserve_result['current_cash_in']:,.2f} MAD")
+        lines.append(f"   🎯 Desired salary:  {reserve_result['desired_salary']:,.2f} MAD")
+        lines.append(f"   💼 Reserved amount: {reserve_result['excess']:,.2f} MAD")
+        if 'transaction' in reserve_result and 'transaction_ref' in reserve_result['transaction']:
+            lines.append(f"   🔖 Transaction ID:  {reserve_result['transaction']['transaction_ref']}")
+    elif action == 'queued':
+        lines.append(f"   🕒 Queued {reserve_result['excess']:,.2f} MAD for the next netted reserve")
+        lines.append(f"   📍 Current inflow:  {reserve_result['current_cash_in']:,.2f} MAD")
+        lines.append(f"   🎯 Desired salary:  {reserve_result['desired_salary']:,.2f} MAD")
+        lines.append(f"   🔖 Intent ID:       {reserve_result['intent_id']}")
+    elif action == 'already_reserved' and reserve_result.get('previous_status') == 'needs_reconciliation':
+        lines.append(f"   ⚠️  Earlier reserve for this period awaits reconciliation "
+                     f"(transaction {reserve_result['transaction_ref']})")
+        lines.append(f"   📍 Current inflow:  {reserve_result['current_cash_in']:,.2f} MAD")
+        lines.append(f"   🎯 Desired salary:  {reserve_result['desired_salary']:,.2f} MAD")
+    elif action == 'already_reserved':
+        lines.append(f"   ✓ Already reserved for this period (transaction {reserve_result['transaction_ref']})")
+        lines.append(f"   📍 Current inflow:  {reserve_result['current_cash_in']:,.2f} MAD")
+        lines.append(f"   🎯 Desired salary:  {reserve_result['desired_salary']:,.2f} MAD")
+    elif action == 'no_reserve':
+        lines.append(f"   ℹ️  No excess to reserve")
+        lines.append(f"   📍 Current inflow: {reserve_result['current_cash_in']:,.2f} MAD")
+        lines.append(f"   🎯 Desired salary: {reserve_result['desired_salary']:,.2f} MAD")
+    else:
+        lines.append(f"   ❌ Reserve failed: {reserve_result.get('error', 'Unknown error')}")
+    
+    lines.append('')
+    lines.append(rule)
+    lines.append(f"Generated: {(generated_at or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')}")
+    lines.append(rule)
+    lines.append('')
+    return '\n'.join(lines)
+
+
+# ==========================================
+# INFERENCE BACKENDS
+# ==========================================
+class LoadedModel:
+    """
+    One model version: runner, scalers and architecture config, swapped as a unit
+    
+    Prediction calls take a single reference to the agent's LoadedModel and
+    use only that, so a concurrent reload_model never mixes two versions.
+    """
+    
+    __slots__ = ('version', 'metadata', 'runner', 'model', 'scaler', 'target_scaler',
+                 'seq_length', 'forecast_horizon', 'business_index', 'business_tables', '_mc_runner')
+    
+    def __init__(self, version: str, metadata: Dict, runner, model, scaler, target_scaler,
+                 business_tables: Optional[Dict[str, np.ndarray]] = None):
+        config = metadata.get('config', {})
+        self.version = version
+        self.metadata = metadata
+        self.runner = runner
+        self.model = model
+        self.scaler = scaler
+        self.target_scaler = target_scaler
+        self.seq_length = config.get('seq_length', 8)
+        self.forecast_horizon = config.get('forecast_horizon', 4)
+        
+        # Global multi-business model: per-business scaling + embedding rows,
+        # one extra last row (global scalers, mean embedding) for businesses
+        # the model was not trained on
+        self.business_tables = business_tables
+        self.business_index = None
+        if business_tables is not None:
+            self.business_index = {str(bid): row for row, bid in enumerate(metadata['businesses'])}
+        self._mc_runner = None
+    
+    @property
+    def mc_runner(self):
+        """MCDropoutRunner over this version's fp32 model (None until build_mc_runner)"""
+        return self._mc_runner
+    
+    def build_mc_runner(self):
+        """Builds the MCDropoutRunner; FlowAgent calls it under its reload lock"""
+        if self._mc_runner is None:
+            from business_lstm import BusinessLSTM, MCDropoutRunner
+            if not isinstance(self.model, BusinessLSTM):
+                raise ValueError("MC-dropout forecasts need the fp32 PyTorch model "
+                                 "(backend='torch', quantized=False)")
+            self._mc_runner = MCDropoutRunner(self.model)
+        return self._mc_runner
+    
+    def business_rows(self, business_ids, n: int) -> Optional[np.ndarray]:
+        """Table row per business (unknown / None → fallback row); None for single-series models"""
+        if self.business_index is None:
+            return None
+        fallback = len(self.business_index)
+        if business_ids is None:
+            return np.full(n, fallback, dtype=np.int64)
+        return np.fromiter((self.business_index.get(str(bid), fallback) for bid in business_ids),
+                           dtype=np.int64, count=n)
+
+
+class OnnxRunner:
+    """Runs the exported business_lstm.onnx with ONNX Runtime on CPU"""
+    
+    def __init__(self, onnx_path: str, num_threads: Optional[int] = None):
+        import onnxruntime as ort
+        
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+    
+    def __call__(self, X: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: X})[0]
 
 
 # ==========================================
@@ -63,9 +294,10 @@ class BusinessLSTM(nn.Module):
 class CIHWalletAPI:
     """Real CIH API integration for wallet operations"""
     
-    def __init__(self, base_url="https://api.cih.ma", demo_mode=False):
+    def __init__(self, base_url="https://api.cih.ma", demo_mode=False, metrics: Optional[Metrics] = None):
         self.base_url = base_url
         self.demo_mode = demo_mode  # Toggle for hackathon demo
+        self.metrics = metrics if metrics is not None else REGISTRY
         
     def reserve_to_pot(self, user_contract_id: str, user_phone: str, 
                        pot_phone: str, amount: float) -> Dict:
@@ -79,7 +311,9 @@ class CIHWalletAPI:
             amount: Amount to transfer in MAD
             
         Returns:
-            Transaction result dict
+            Transaction result dict; a failure also carries the 'stage' it
+            happened in ('simulation', 'otp' or 'confirmation' - money may
+            have moved) and the simulation's transaction_ref once known
         """
         
         if self.demo_mode:
@@ -93,22 +327,26 @@ class CIHWalletAPI:
                 'message': f'Successfully reserved {amount:.2f} MAD to Emergency Pot'
             }
         
+        import requests
+        
+        stage, reference_id = 'simulation', None
         try:
             # STEP 1: Simulate W2W Transfer
             logger.info(f"Step 1/3: Simulating transfer of {amount:.2f} MAD...")
-            sim_response = requests.post(
-                f"{self.base_url}/wallet/transfer/wallet",
-                params={'step': 'simulation'},
-                json={
-                    'clentNote': 'Auto-reserve by FLOW AI',
-                    'contractId': user_contract_id,
-                    'amout': str(amount),
-                    'fees': '0',
-                    'destinationPhone': pot_phone,
-                    'mobileNumber': user_phone
-                },
-                timeout=10
-            )
+            with self.metrics.timer('cih_simulation'):
+                sim_response = requests.post(
+                    f"{self.base_url}/wallet/transfer/wallet",
+                    params={'step': 'simulation'},
+                    json={
+                        'clentNote': 'Auto-reserve by FLOW AI',
+                        'contractId': user_contract_id,
+                        'amout': str(amount),
+                        'fees': '0',
+                        'destinationPhone': pot_phone,
+                        'mobileNumber': user_phone
+                    },
+                    timeout=10
+                )
             
             if sim_response.status_code != 200:
                 raise Exception(f"Simulation failed: {sim_response.text}")
@@ -118,12 +356,14 @@ class CIHWalletAPI:
             logger.info(f"✓ Simulation successful - Reference: {reference_id}")
             
             # STEP 2: Get OTP
+            stage = 'otp'
             logger.info("Step 2/3: Requesting OTP...")
-            otp_response = requests.post(
-                f"{self.base_url}/wallet/transfer/wallet/otp",
-                json={'phoneNumber': user_phone},
-                timeout=10
-            )
+            with self.metrics.timer('cih_otp'):
+                otp_response = requests.post(
+                    f"{self.base_url}/wallet/transfer/wallet/otp",
+                    json={'phoneNumber': user_phone},
+                    timeout=10
+                )
             
             if otp_response.status_code != 200:
                 raise Exception(f"OTP request failed: {otp_response.text}")
@@ -134,20 +374,22 @@ class CIHWalletAPI:
             logger.info(f"✓ OTP received: {otp}")
             
             # STEP 3: Confirm Transfer
+            stage = 'confirmation'
             logger.info("Step 3/3: Confirming transfer...")
-            confirm_response = requests.post(
-                f"{self.base_url}/wallet/transfer/wallet",
-                params={'step': 'confirmation'},
-                json={
-                    'mobileNumber': user_phone,
-                    'contractId': user_contract_id,
-                    'otp': otp,
-                    'referenceId': reference_id,
-                    'destinationPhone': pot_phone,
-                    'fees': total_fees
-                },
-                timeout=10
-            )
+            with self.metrics.timer('cih_confirmation'):
+                confirm_response = requests.post(
+                    f"{self.base_url}/wallet/transfer/wallet",
+                    params={'step': 'confirmation'},
+                    json={
+                        'mobileNumber': user_phone,
+                        'contractId': user_contract_id,
+                        'otp': otp,
+                        'referenceId': reference_id,
+                        'destinationPhone': pot_phone,
+                        'fees': total_fees
+                    },
+                    timeout=10
+                )
             
             if confirm_response.status_code != 200:
                 raise Exception(f"Confirmation failed: {confirm_response.text}")
@@ -168,13 +410,23 @@ class CIHWalletAPI:
             
         except requests.exceptions.Timeout:
             logger.error("API request timed out")
-            return {'success': False, 'error': 'API timeout'}
+            return {'success': False, 'error': 'API timeout', 'stage': stage, 'transaction_ref': reference_id}
         except requests.exceptions.RequestException as e:
             logger.error(f"API request failed: {str(e)}")
-            return {'success': False, 'error': str(e)}
+            return {'success': False, 'error': str(e), 'stage': stage, 'transaction_ref': reference_id}
         except Exception as e:
             logger.error(f"Transfer failed: {str(e)}")
-            return {'success': False, 'error': str(e)}
+            return {'success': False, 'error': str(e), 'stage': stage, 'transaction_ref': reference_id}
+    
+    def reserve_many(self, transfers: List[Dict]) -> List[Dict]:
+        """
+        Runs reserve_to_pot for each transfer, one after another
+        (see cih_async.PooledCIHWalletAPI for the concurrent version)
+        
+        Args:
+            transfers: [{user_contract_id, user_phone, pot_phone, amount}, ...]
+        """
+        return [self.reserve_to_pot(**transfer) for transfer in transfers]
 
 
 # ==========================================
@@ -193,115 +445,672 @@ class FlowAgent:
     def __init__(self, model_path='models/business_lstm.pt',
                  scaler_path='models/business_scaler.pkl',
                  target_scaler_path='models/business_target_scaler.pkl',
-                 demo_mode=True):
+                 demo_mode=True, backend='torch',
+                 onnx_path='models/business_lstm.onnx',
+                 quantized=False, quantized_path='models/business_lstm_int8.pt',
+                 weights_path='models/business_lstm.npz', cih_client='requests',
+                 bundle_path='models/business_lstm.bundle',
+                 reserve_window_seconds: Optional[float] = None,
+                 cih_base_url='https://api.cih.ma',
+                 metadata_path='models/business_metadata.json',
+                 forecast_cache_size: int = 4096, forecast_cache_ttl: Optional[float] = None,
+                 metrics: Optional[Metrics] = REGISTRY, registry=None,
+                 model_version: Optional[str] = None, uncertainty_samples: int = 0):
         """
         Initialize agent
         
         Args:
             demo_mode: If True, simulates CIH API calls (for hackathon demo)
+            backend: 'torch' (default), 'onnx' (ONNX Runtime, CPU) or
+                     'numpy' (torch-free, weights + scalers from the bundle)
+            bundle_path: Artifact bundle (weights + scalers + metadata, memory-mapped);
+                         if missing, the legacy .pt / .pkl / .npz paths are used
+            quantized: If True, serve the int8 dynamically quantized model (torch backend)
+            cih_client: 'requests' (one blocking call at a time) or 'async'
+                        (pooled keep-alive connections, concurrent reserve_many)
+            reserve_window_seconds: If set, excess is queued per wallet and netted
+                                    into one transfer per window (see flush_reserves)
+            cih_base_url: CIH API root (e.g. a cih_stub_server.py URL for load tests)
+            forecast_cache_size: Max cached forecasts (0 disables the cache)
+            forecast_cache_ttl: Seconds a cached forecast stays valid (None = no expiry)
+            metrics: Registry for stage timings and counters (default: metrics.REGISTRY,
+                     None disables instrumentation)
+            registry: model_registry.ModelRegistry (or its root directory) to load
+                      artifacts from instead of the *_path arguments
+            model_version: Registry version to load (default: the registry's CURRENT)
+            uncertainty_samples: If > 0, analyses also draw this many MC-dropout
+                                 forecasts: per-week quantiles in the result, and
+                                 low_cashflow flagged on the shortfall probability
+                                 (needs backend='torch' without quantization)
         """
         
         logger.info("🚀 Initializing FLOW AI Agent...")
         
-        # Load scalers
-        self.scaler = joblib.load(scaler_path)
-        self.target_scaler = joblib.load(target_scaler_path)
-        logger.info("✓ Scalers loaded")
+        self.metrics = metrics if metrics is not None else NullMetrics()
         
-        # Load LSTM model
-        self.model = BusinessLSTM(num_features=12, hidden=64, forecast_weeks=4)
-        self.model.load_state_dict(torch.load(model_path, map_location='cpu', weights_only=True))
-        self.model.eval()
-        logger.info("✓ LSTM model loaded")
+        # Load scalers + LSTM model
+        self.backend = backend
+        self.quantized = quantized
+        if quantized and backend != 'torch':
+            raise ValueError("quantized=True is only supported with backend='torch'")
+        if uncertainty_samples and (backend != 'torch' or quantized):
+            raise ValueError("uncertainty_samples needs backend='torch' without quantization")
+        self.uncertainty_samples = uncertainty_samples
+        self.artifact_paths = {
+            'model_path': model_path, 'scaler_path': scaler_path,
+            'target_scaler_path': target_scaler_path, 'onnx_path': onnx_path,
+            'quantized_path': quantized_path, 'weights_path': weights_path,
+            'metadata_path': metadata_path, 'bundle_path': bundle_path
+        }
+        if isinstance(registry, str):
+            from model_registry import ModelRegistry
+            registry = ModelRegistry(registry)
+        self.registry = registry
+        self.forecast_cache = None
+        self._reload_lock = threading.Lock()
+        self.reload_model(model_version)
+        
+        # Forecast cache (keyed by input window content + model version)
+        if forecast_cache_size:
+            self.forecast_cache = ForecastCache(forecast_cache_size, forecast_cache_ttl)
+            logger.info(f"✓ Forecast cache enabled ({forecast_cache_size} entries"
+                        f"{f', {forecast_cache_ttl:g}s TTL' if forecast_cache_ttl else ''})")
         
         # Initialize CIH API
-        self.cih_api = CIHWalletAPI(demo_mode=demo_mode)
-        logger.info(f"✓ CIH API initialized ({'DEMO MODE' if demo_mode else 'LIVE MODE'})")
-        
-        # Config
-        self.SEQ_LENGTH = 8
-        self.FEATURE_COLS = [
-            'season_type', 'distributers', 'fixed_pay',
-            'cost_of_raw_materials', 'other_expenditure', 'cash_out',
-            'net_profit_margin', 'week_of_year', 'cash_flow',
-            'profit_trend_4w', 'cash_in_lag1', 'cash_out_lag1'
-        ]
+        if cih_client == 'async':
+            from cih_async import PooledCIHWalletAPI
+            self.cih_api = PooledCIHWalletAPI(cih_base_url, demo_mode=demo_mode, metrics=self.metrics)
+        elif cih_client == 'requests':
+            self.cih_api = CIHWalletAPI(cih_base_url, demo_mode=demo_mode, metrics=self.metrics)
+        else:
+            raise ValueError(f"Unknown cih_client: {cih_client}")
+        logger.info(f"✓ CIH API initialized ({'DEMO MODE' if demo_mode else 'LIVE MODE'}, {cih_client})")
+        
+        # Optional transfer coalescing in front of the CIH client
+        self.reserve_planner = None
+        if reserve_window_seconds is not None:
+            from reserve_planner import ReservePlanner
+            self.reserve_planner = ReservePlanner(self.cih_api, window_seconds=reserve_window_seconds)
+            logger.info(f"✓ Reserve planner enabled ({reserve_window_seconds:g}s netting window)")
+        
+        # Config (SEQ_LENGTH comes from the loaded model's metadata)
+        self.FEATURE_COLS = list(FEATURE_COLS)
         
         logger.info("✅ FLOW Agent ready!\n")
     
+    # ==========================================
+    # MODEL LOADING
+    # ==========================================
+    
+    def reload_model(self, version: Optional[str] = None) -> str:
+        """
+        Loads a model version and atomically swaps it in
+        
+        The new artifacts are fully loaded before the swap (a single
+        reference assignment), so concurrent predictions keep running on
+        the version they started with and nothing is dropped. Call after
+        new artifacts were written to disk, or let a RegistryWatcher call
+        it when the registry's CURRENT moves.
+        
+        Args:
+            version: Registry version to load (default: CURRENT; ignored
+                     without a registry - the *_path artifacts are re-read)
+        
+        Returns:
+            The version now being served
+        """
+        with self._reload_lock:  # One load at a time, serving continues meanwhile
+            if self.registry is not None:
+                version = self.registry.resolve(version)
+                paths = self.registry.artifact_paths(version)
+            else:
+                paths = self.artifact_paths
+            
+            loaded = self._load_model(paths, version)
+            previous = getattr(self, 'loaded', None)
+            self.loaded = loaded
+            
+            # Old-version entries can't be hit any more (keys carry the version)
+            if self.forecast_cache is not None:
+                self.forecast_cache.clear()
+        
+        if previous is None:
+            logger.info(f"✓ Model version {loaded.version}")
+        else:
+            logger.info(f"🔄 Model swapped: {previous.version} → {loaded.version}")
+        return loaded.version
+    
+    def _load_model(self, paths: Dict, version: Optional[str] = None) -> LoadedModel:
+        """
+        Builds a LoadedModel from one artifact set (architecture from its metadata)
+        
+        Weights, scalers and metadata come from the memory-mapped artifact
+        bundle when the set has one; older sets fall back to the .pt /
+        scaler pickles / .npz files.
+        """
+        backend, quantized = self.backend, self.quantized
+        bundle = None
+        if paths.get('bundle_path') and os.path.exists(paths['bundle_path']):
+            from artifact_bundle import ArtifactBundle
+            bundle = ArtifactBundle(paths['bundle_path'])
+        if bundle is not None and not os.path.exists(paths['metadata_path']):
+            metadata = bundle.metadata
+        else:
+            metadata = read_model_metadata(paths['metadata_path'])
+        config = metadata.get('config', {})
+        if config.get('feature_cols', list(FEATURE_COLS)) != list(FEATURE_COLS):
+            raise ValueError(f"Model at {paths['metadata_path']} was trained on different features "
+                             f"than features.FEATURE_COLS")
+        num_businesses = config.get('num_businesses', 0)
+        if num_businesses and bundle is None:
+            raise ValueError(f"Global model at {paths['metadata_path']} needs its artifact bundle "
+                             f"(per-business scalers and embeddings)")
+        scaler = target_scaler = model = business_tables = None
+        
+        # Load scalers (mean / scale vectors, no sklearn needed with a bundle)
+        if bundle is not None:
+            from numpy_lstm import ArrayScaler
+            arrays = bundle.arrays
+            scaler = ArrayScaler(arrays['scaler.mean'], arrays['scaler.scale'])
+            target_scaler = ArrayScaler(arrays['target_scaler.mean'], arrays['target_scaler.scale'])
+            if num_businesses:
+                business_tables = self._business_tables(arrays)
+            logger.info(f"✓ Scalers loaded (bundle, {bundle.nbytes:,} bytes mapped"
+                        f"{f', {num_businesses:,} businesses' if num_businesses else ''})")
+        elif backend != 'numpy':  # Legacy sets: pickles, or the .npz for numpy
+            import joblib
+            scaler = joblib.load(paths['scaler_path'])
+            target_scaler = joblib.load(paths['target_scaler_path'])
+            logger.info("✓ Scalers loaded")
+        
+        # Load LSTM model
+        if backend == 'torch' and quantized:
+            import torch
+            from business_lstm import TorchRunner
+            # TorchScript artifact written by trainLSTM.py (int8 LSTM, fc1, fc2)
+            model = torch.jit.load(paths['quantized_path'], map_location='cpu')
+            model.eval()
+            runner = TorchRunner(model)
+        elif backend == 'torch':
+            import torch
+            from business_lstm import BusinessLSTM, TorchRunner
+            model = BusinessLSTM(num_features=len(FEATURE_COLS),
+                                 hidden=config.get('hidden_size', 64),
+                                 forecast_weeks=config.get('forecast_horizon', 4),
+                                 num_layers=config.get('num_layers', 2),
+                                 dropout=config.get('dropout', 0.3),
+                                 num_businesses=num_businesses,
+                                 embed_dim=config.get('embed_dim', 4))
+            if bundle is not None:
+                # Copied into the parameters (torch needs writable storage)
+                state_dict = {key: torch.from_numpy(np.array(value))
+                              for key, value in bundle.state_dict_arrays().items()}
+            else:
+                state_dict = torch.load(paths['model_path'], map_location='cpu', weights_only=True)
+            model.load_state_dict(state_dict)
+            model.eval()
+            runner = TorchRunner(model)
+        elif backend == 'onnx':
+            runner = OnnxRunner(paths['onnx_path'])
+        elif backend == 'numpy' and bundle is not None:
+            from numpy_lstm import NumpyBusinessLSTM
+            # Weights stay views of the mapping: workers share the pages
+            runner = NumpyBusinessLSTM(bundle.state_dict_arrays(), copy=False)
+        elif backend == 'numpy':
+            from numpy_lstm import load_numpy_model
+            runner, scaler, target_scaler = load_numpy_model(paths['weights_path'])
+            logger.info("✓ Scalers loaded")
+        else:
+            raise ValueError(f"Unknown backend: {backend}")
+        logger.info(f"✓ LSTM model loaded ({backend}{', int8' if quantized else ''})")
+        
+        loaded = LoadedModel(version or model_version_label(metadata), metadata, runner, model, scaler,
+                             target_scaler, business_tables)
+        if self.uncertainty_samples:
+            loaded.build_mc_runner()  # Ready before the swap (reload_model holds the reload lock)
+        return loaded
+    
+    @staticmethod
+    def _business_tables(arrays: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        Per-business lookup tables of a global model, from its bundle arrays
+        
+        Row b holds business b's feature / target scaling and embedding; the
+        appended last row serves unseen businesses with the global scalers
+        and the mean embedding.
+        """
+        embedding = np.asarray(arrays['embedding.weight'], dtype=np.float32)
+        return {
+            'feature_mean': np.vstack([arrays['business_scaler.mean'], arrays['scaler.mean']]),
+            'feature_scale': np.vstack([arrays['business_scaler.scale'], arrays['scaler.scale']]),
+            'target_mean': np.concatenate([arrays['business_target_scaler.mean'], arrays['target_scaler.mean']]),
+            'target_scale': np.concatenate([arrays['business_target_scaler.scale'], arrays['target_scaler.scale']]),
+            'embedding': np.vstack([embedding, embedding.mean(axis=0, keepdims=True)])
+        }
+    
+    # The serving model's parts (read-only views of self.loaded)
+    model_version = property(lambda self: self.loaded.version)
+    runner = property(lambda self: self.loaded.runner)
+    model = property(lambda self: self.loaded.model)
+    scaler = property(lambda self: self.loaded.scaler)
+    target_scaler = property(lambda self: self.loaded.target_scaler)
+    SEQ_LENGTH = property(lambda self: self.loaded.seq_length)
+    
     # ==========================================
     # PREDICTION
     # ==========================================
     
-    def predict_cashflow(self, recent_data: pd.DataFrame) -> np.ndarray:
+    def predict_cashflow(self, recent_data: 'pd.DataFrame', loaded: Optional[LoadedModel] = None,
+                         business_id: Optional[str] = None) -> np.ndarray:
         """
         Predicts next 4 weeks of cash inflow
         
         Args:
-            recent_data: Last 8+ weeks of business data
+            recent_data: Last 8+ weeks of business data (DataFrame or {column: array})
+            loaded: Model version to use (default: the one being served)
+            business_id: Business the data belongs to (selects its scaling and
+                         embedding in a global model; unknown / None uses the
+                         global fallback)
             
         Returns:
             predictions: [4] array of weekly cash_in predictions
         """
-        if len(recent_data) < self.SEQ_LENGTH:
-            raise ValueError(f"Need at least {self.SEQ_LENGTH} weeks of data")
+        loaded = loaded or self.loaded
+        # Feature engineering + scale + predict (batch of one, cached)
+        return self.predict_arrays([self._recent_arrays(recent_data, loaded)], loaded=loaded,
+                                   business_ids=[business_id])[0]
+    
+    def _recent_arrays(self, recent_data: 'pd.DataFrame', loaded: LoadedModel):
+        """(raw, dates) of the last history_span(seq_length) weeks of one business' history"""
+        raw, dates = frame_to_arrays(recent_data)
+        if len(raw) < loaded.seq_length:
+            raise ValueError(f"Need at least {loaded.seq_length} weeks of data")
+        span = history_span(loaded.seq_length)
+        return raw[-span:], dates[-span:]
+    
+    def predict_cashflow_batch(self, histories, business_id_col: str = 'business_id',
+                               batch_size: int = 1024) -> 'pd.DataFrame':
+        """
+        Predicts next 4 weeks of cash inflow for many businesses at once
+        
+        Args:
+            histories: {business_id: DataFrame or {column: array}} of 8+ weeks per
+                       business, or one long-format DataFrame with a `business_id_col` column
+            business_id_col: Business id column of a long-format frame
+            batch_size: Max businesses per LSTM forward pass
+            
+        Returns:
+            [N, 4] DataFrame of weekly cash_in predictions indexed by business id
+        """
+        loaded = self.loaded
+        business_ids, arrays = self._history_arrays(histories, business_id_col, loaded.seq_length)
+        if not business_ids:
+            raise ValueError("No business histories to forecast")
+        
+        for business_id, (raw, _) in zip(business_ids, arrays):
+            if len(raw) < loaded.seq_length:
+                raise ValueError(f"Business {business_id}: need at least {loaded.seq_length} weeks of data")
+        
+        predictions = self.predict_arrays(arrays, batch_size=batch_size, loaded=loaded, business_ids=business_ids)
+        
+        import pandas as pd
+        return pd.DataFrame(
+            predictions,
+            index=pd.Index(business_ids, name=business_id_col),
+            columns=[f'week_{i}' for i in range(1, predictions.shape[1] + 1)]
+        )
+    
+    def predict_from_store(self, store, business_ids=None, batch_size: int = 1024) -> 'pd.DataFrame':
+        """
+        Predicts next 4 weeks for businesses kept in a streaming HistoryStore
+        
+        Args:
+            store: history_store.HistoryStore fed one week at a time
+            business_ids: Businesses to forecast (default: all with 8+ weeks)
+            batch_size: Max businesses per LSTM forward pass
+            
+        Returns:
+            [N, 4] DataFrame of weekly cash_in predictions indexed by business id
+        """
+        loaded = self.loaded
+        if store.seq_length != loaded.seq_length:
+            raise ValueError(f"Store keeps {store.seq_length}-week windows, model {loaded.version} "
+                             f"expects {loaded.seq_length}")
+        with self.metrics.timer('features'):
+            business_ids, windows = store.windows(business_ids)
+        if not business_ids:
+            raise ValueError("No business in the store has enough weeks to forecast")
+        self.metrics.inc('flow_predictions_total', amount=len(business_ids))
+        predictions = self.predict_windows(windows, batch_size=batch_size, loaded=loaded, business_ids=business_ids)
+        
+        import pandas as pd
+        return pd.DataFrame(
+            predictions,
+            index=pd.Index(business_ids, name='business_id'),
+            columns=[f'week_{i}' for i in range(1, predictions.shape[1] + 1)]
+        )
+    
+    def predict_windows(self, windows: np.ndarray, batch_size: int = 1024,
+                        loaded: Optional[LoadedModel] = None, business_ids: Optional[List] = None) -> np.ndarray:
+        """
+        Runs the LSTM on already engineered feature windows
+        
+        Args:
+            windows: [N, 8, 12] unscaled feature windows (FEATURE_COLS order)
+            batch_size: Max windows per forward pass
+            loaded: Model version to use (default: the one being served)
+            business_ids: [N] business of each window (global model: selects
+                          its scaling + embedding; ignored otherwise)
+            
+        Returns:
+            predictions: [N, 4] weekly cash_in predictions in MAD
+        """
+        loaded = loaded or self.loaded
+        rows = loaded.business_rows(business_ids, len(windows))
+        return self._forward(self._scaled_windows(windows, loaded, rows), loaded, rows, batch_size)
+    
+    def _forward(self, X: np.ndarray, loaded: LoadedModel, rows: Optional[np.ndarray],
+                 batch_size: int = 1024) -> np.ndarray:
+        """Point forecasts [N, 4] in MAD from scaled model input"""
+        with self.metrics.timer('forward'):
+            predictions_scaled = [loaded.runner(X[start:start + batch_size]) for start in range(0, len(X), batch_size)]
+            return self._inverse_transform(np.concatenate(predictions_scaled), loaded, rows)
+    
+    def _scaled_windows(self, windows: np.ndarray, loaded: LoadedModel, rows: Optional[np.ndarray]) -> np.ndarray:
+        """[N, 8, 12] feature windows → float32 model input (plus the embedding for a global model)"""
+        n, seq_len, num_features = windows.shape
+        with self.metrics.timer('scale'):
+            if rows is None:
+                # One scaler call for the whole block
+                flat = windows.reshape(-1, num_features)
+                if hasattr(loaded.scaler, 'feature_names_in_'):
+                    import pandas as pd  # sklearn scaler fitted on a named frame
+                    flat = pd.DataFrame(flat, columns=self.FEATURE_COLS)
+                features_scaled = loaded.scaler.transform(flat).reshape(n, seq_len, num_features)
+                X = features_scaled.astype(np.float32)
+            else:
+                # Each window scaled by its own business, embedding appended to every week
+                tables = loaded.business_tables
+                features_scaled = (windows - tables['feature_mean'][rows, None]) / tables['feature_scale'][rows, None]
+                embedded = tables['embedding'][rows, None]
+                X = np.concatenate([features_scaled.astype(np.float32),
+                                    np.broadcast_to(embedded, (n, seq_len, embedded.shape[-1]))], axis=2)
+        return X
+    
+    def predict_arrays(self, arrays: List, batch_size: int = 1024,
+                       loaded: Optional[LoadedModel] = None, business_ids: Optional[List] = None) -> np.ndarray:
+        """
+        Forecasts per-business (raw, dates) histories, answering repeats from
+        the forecast cache and running the LSTM only on the misses
+        
+        Args:
+            arrays: [(raw [T, 8], dates [T]), ...] with 8 <= T <= 11 weeks each
+                    (features.history_span)
+                    (see features.frame_to_arrays)
+            batch_size: Max windows per forward pass
+            loaded: Model version to use (default: the one being served)
+            business_ids: [N] business of each history (see predict_windows)
+            
+        Returns:
+            predictions: [N, 4] weekly cash_in predictions in MAD
+        """
+        loaded = loaded or self.loaded
+        self.metrics.inc('flow_predictions_total', amount=len(arrays))
+        if self.forecast_cache is None:
+            return self.predict_windows(self._feature_windows(arrays, loaded.seq_length),
+                                        batch_size=batch_size, loaded=loaded, business_ids=business_ids)
+        
+        # A global model forecasts the same window differently per business
+        if loaded.business_index is None or business_ids is None:
+            keys = [window_key(raw, dates, loaded.version) for raw, dates in arrays]
+        else:
+            keys = [window_key(raw, dates, loaded.version, bid) for (raw, dates), bid in zip(arrays, business_ids)]
+        predictions = [self.forecast_cache.get(key) for key in keys]
+        
+        missing = [i for i, cached in enumerate(predictions) if cached is None]
+        self.metrics.inc('flow_forecast_cache_total', 'hit', len(arrays) - len(missing))
+        self.metrics.inc('flow_forecast_cache_total', 'miss', len(missing))
+        if missing:
+            windows = self._feature_windows([arrays[i] for i in missing], loaded.seq_length)
+            missing_ids = None if business_ids is None else [business_ids[i] for i in missing]
+            fresh_predictions = self.predict_windows(windows, batch_size=batch_size, loaded=loaded,
+                                                     business_ids=missing_ids)
+            for i, fresh in zip(missing, fresh_predictions):
+                self.forecast_cache.put(keys[i], fresh)
+                predictions[i] = fresh
+        
+        return np.stack(predictions)
+    
+    def predict_windows_mc(self, windows: np.ndarray, samples: int = MC_SAMPLES, batch_size: int = 64,
+                           loaded: Optional[LoadedModel] = None, business_ids: Optional[List] = None,
+                           seed: Optional[int] = None) -> np.ndarray:
+        """
+        MC-dropout forecast samples for already engineered feature windows
         
-        # Take last 8 weeks
-        data = recent_data.tail(self.SEQ_LENGTH).copy()
+        Each chunk of windows runs as a single [samples * chunk, 8, F] forward
+        with dropout on (see business_lstm.MCDropoutRunner), not as `samples`
+        separate calls. Results are random, so the forecast cache is bypassed.
+        Needs the fp32 PyTorch model (backend='torch', quantized=False).
         
-        # Feature engineering
-        data = self._engineer_features(data)
+        Args:
+            windows: [N, 8, 12] unscaled feature windows (FEATURE_COLS order)
+            samples: Stochastic passes K per window
+            batch_size: Max windows per forward pass (each forward is K x this)
+            loaded: Model version to use (default: the one being served)
+            business_ids: [N] business of each window (see predict_windows)
+            seed: Seeds the dropout masks (reproducible samples); None = random
+            
+        Returns:
+            samples: [K, N, 4] weekly cash_in forecasts in MAD
+        """
+        loaded = loaded or self.loaded
+        rows = loaded.business_rows(business_ids, len(windows))
+        return self._forward_mc(self._scaled_windows(windows, loaded, rows), loaded, rows, samples, batch_size, seed)
+    
+    def _forward_mc(self, X: np.ndarray, loaded: LoadedModel, rows: Optional[np.ndarray], samples: int,
+                    batch_size: int = 64, seed: Optional[int] = None) -> np.ndarray:
+        """MC-dropout samples [K, N, 4] in MAD from scaled model input"""
+        runner = loaded.mc_runner
+        if runner is None:
+            with self._reload_lock:  # One build per version, never concurrent with a reload
+                runner = loaded.build_mc_runner()
+        with self.metrics.timer('forward_mc'):
+            chunks = [runner(X[start:start + batch_size], samples, None if seed is None else seed + start)
+                      for start in range(0, len(X), batch_size)]
+            return self._inverse_transform(np.concatenate(chunks, axis=1), loaded, rows)
+    
+    def _forecast_with_uncertainty(self, arrays: List, business_ids: List, loaded: LoadedModel,
+                                   samples: int, batch_size: int = 1024):
+        """
+        Point forecasts + forecast distribution from one feature / scaling pass
         
-        # Scale
-        features_scaled = self.scaler.transform(data[self.FEATURE_COLS])
+        The point forecast runs on the same scaled windows as the MC passes,
+        so it skips the forecast cache (whose hit would still need the
+        windows for the MC passes).
         
-        # Predict
-        with torch.no_grad():
-            X = torch.FloatTensor(features_scaled).unsqueeze(0)
-            predictions_scaled = self.model(X).numpy()[0]
+        Returns:
+            (predictions [N, 4], forecast_distribution result)
+        """
+        self.metrics.inc('flow_predictions_total', amount=len(arrays))
+        rows = loaded.business_rows(business_ids, len(arrays))
+        X = self._scaled_windows(self._feature_windows(arrays, loaded.seq_length), loaded, rows)
+        predictions = self._forward(X, loaded, rows, batch_size)
+        return predictions, self.forecast_distribution(self._forward_mc(X, loaded, rows, samples))
+    
+    @staticmethod
+    def forecast_distribution(samples: np.ndarray, thresholds=LOW_CASHFLOW_THRESHOLD,
+                              quantiles=MC_QUANTILES) -> Dict:
+        """
+        Summarizes [K, N, 4] forecast samples per business and week
         
-        # Inverse transform
-        predictions_real = self._inverse_transform(predictions_scaled)
+        Args:
+            samples: [K, N, 4] forecasts (see predict_windows_mc)
+            thresholds: Low cashflow threshold, scalar or [N] per business
+            quantiles: Quantile levels to report
+            
+        Returns:
+            Columnar distribution: {'mean', 'std'} as [N, 4], 'quantiles'
+            as {level: [N, 4]}, 'p_shortfall' [N] (share of samples whose
+            lowest week is below the threshold), 'p_shortfall_by_week'
+            [N, 4], 'thresholds' [N] and 'samples' (K). See uncertainty_at
+            for one business.
+        """
+        samples = np.asarray(samples, dtype=np.float64)
+        thresholds = np.broadcast_to(np.asarray(thresholds, dtype=np.float64), samples.shape[1:2])
+        below = samples < thresholds[:, None]
+        return {
+            'mean': samples.mean(axis=0),
+            'std': samples.std(axis=0),
+            'quantiles': dict(zip(quantiles, np.quantile(samples, quantiles, axis=0))),
+            'p_shortfall': below.any(axis=2).mean(axis=0),
+            'p_shortfall_by_week': below.mean(axis=0),
+            'thresholds': thresholds,
+            'samples': len(samples)
+        }
+    
+    @staticmethod
+    def uncertainty_at(distribution: Dict, i: int) -> Dict:
+        """Business i of a forecast_distribution result as plain floats / lists (JSON-ready)"""
+        return {
+            'samples': int(distribution['samples']),
+            'threshold': float(distribution['thresholds'][i]),
+            'mean': distribution['mean'][i].tolist(),
+            'std': distribution['std'][i].tolist(),
+            'quantiles': {f"p{level * 100:g}": values[i].tolist()
+                          for level, values in distribution['quantiles'].items()},
+            'p_shortfall': float(distribution['p_shortfall'][i]),
+            'p_shortfall_by_week': distribution['p_shortfall_by_week'][i].tolist()
+        }
+    
+    def predict_cashflow_distribution(self, recent_data: 'pd.DataFrame', business_id: Optional[str] = None,
+                                      samples: int = MC_SAMPLES, threshold: float = LOW_CASHFLOW_THRESHOLD,
+                                      quantiles=MC_QUANTILES, seed: Optional[int] = None,
+                                      loaded: Optional[LoadedModel] = None) -> Dict:
+        """
+        Forecast distribution of the next 4 weeks for one business (MC dropout)
         
-        return predictions_real
+        Args:
+            recent_data: Last 8+ weeks of business data (DataFrame or {column: array})
+            business_id: Business the data belongs to (see predict_cashflow)
+            samples: Stochastic forward passes K
+            threshold: Low cashflow threshold for the shortfall probability
+            quantiles: Quantile levels to report
+            seed: Seeds the dropout masks; None = random
+            loaded: Model version to use (default: the one being served)
+            
+        Returns:
+            {'samples', 'threshold', 'mean', 'std', 'quantiles' {'p5': [4], ...},
+             'p_shortfall', 'p_shortfall_by_week'} (see uncertainty_at)
+        """
+        loaded = loaded or self.loaded
+        windows = self._feature_windows([self._recent_arrays(recent_data, loaded)], loaded.seq_length)
+        forecasts = self.predict_windows_mc(windows, samples, loaded=loaded, business_ids=[business_id], seed=seed)
+        return self.uncertainty_at(self.forecast_distribution(forecasts, threshold, quantiles), 0)
     
-    def _engineer_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Apply feature engineering"""
-        df = df.copy()
+    def predict_distribution_batch(self, histories, business_id_col: str = 'business_id',
+                                   samples: int = MC_SAMPLES, thresholds=LOW_CASHFLOW_THRESHOLD,
+                                   quantiles=MC_QUANTILES, seed: Optional[int] = None,
+                                   batch_size: int = 64) -> Dict:
+        """
+        Forecast distributions for many businesses (MC dropout, batched)
         
-        # Temporal
-        if 'date' not in df.columns and 'date of week start' in df.columns:
-            df['date'] = pd.to_datetime(df['date of week start'])
-        df['week_of_year'] = pd.to_datetime(df['date']).dt.isocalendar().week
+        Args:
+            histories: {business_id: DataFrame} or long-format DataFrame
+                       (see predict_cashflow_batch)
+            thresholds: Low cashflow threshold, scalar or [N] per business
+            batch_size: Max businesses per forward pass (each forward is
+                        samples x this many windows)
+            (other args as predict_cashflow_distribution)
+            
+        Returns:
+            forecast_distribution result plus 'business_ids' (row order)
+        """
+        loaded = self.loaded
+        business_ids, arrays = self._history_arrays(histories, business_id_col, loaded.seq_length)
+        if not business_ids:
+            raise ValueError("No business histories to forecast")
+        for business_id, (raw, _) in zip(business_ids, arrays):
+            if len(raw) < loaded.seq_length:
+                raise ValueError(f"Business {business_id}: need at least {loaded.seq_length} weeks of data")
         
-        # Financial
-        if 'cash_flow' not in df.columns:
-            df['cash_flow'] = df['cash_in'] - df['cash_out']
+        windows = self._feature_windows(arrays, loaded.seq_length)
+        forecasts = self.predict_windows_mc(windows, samples, batch_size=batch_size, loaded=loaded,
+                                            business_ids=business_ids, seed=seed)
+        return dict(self.forecast_distribution(forecasts, thresholds, quantiles), business_ids=business_ids)
+    
+    def _history_arrays(self, histories, business_id_col: str, seq_length: Optional[int] = None):
+        """
+        Normalize batch input to business ids + per-business (raw, dates) arrays
         
-        # Rolling
-        df['profit_trend_4w'] = df['net_profit_margin'].rolling(4, min_periods=1).mean()
+        Only the last 11 weeks of each history are kept (8-week window plus
+        the 3 previous weeks the 4-week trend and the lags read, see
+        features.history_span).
+        """
+        span = history_span(seq_length or self.SEQ_LENGTH)
         
-        # Lags
-        df['cash_in_lag1'] = df['cash_in'].shift(1).fillna(df['cash_in'].mean())
-        df['cash_out_lag1'] = df['cash_out'].shift(1).fillna(df['cash_out'].mean())
+        if isinstance(histories, Mapping):
+            business_ids = list(histories)
+            arrays = []
+            for bid in business_ids:
+                raw, dates = frame_to_arrays(histories[bid])
+                arrays.append((raw[-span:], dates[-span:]))
+        else:
+            if business_id_col not in histories.columns:
+                raise ValueError(f"Long-format data needs a '{business_id_col}' column")
+            raw, dates = frame_to_arrays(histories)
+            groups = histories.groupby(business_id_col, sort=False).indices
+            business_ids = list(groups)
+            arrays = [(raw[groups[bid][-span:]], dates[groups[bid][-span:]]) for bid in business_ids]
         
-        return df
+        return business_ids, arrays
     
-    def _inverse_transform(self, scaled_values: np.ndarray) -> np.ndarray:
-        """Convert scaled predictions to real currency"""
-        return scaled_values * self.target_scaler.scale_[0] + self.target_scaler.mean_[0]
+    def _feature_windows(self, arrays: List, seq_length: Optional[int] = None) -> np.ndarray:
+        """
+        Engineers [N, 8, 12] feature windows for many histories in one pass
+        
+        Histories are left-padded with NaN to a common 11-week span so the
+        shared feature engine can process them as a single block.
+        """
+        seq_length = seq_length or self.SEQ_LENGTH
+        span = history_span(seq_length)
+        with self.metrics.timer('features'):
+            raw_block = np.full((len(arrays), span, len(RAW_COLS)), np.nan)
+            date_block = np.full((len(arrays), span), np.datetime64('NaT'), dtype='datetime64[D]')
+            
+            for i, (raw, dates) in enumerate(arrays):
+                raw_block[i, span - len(raw):] = raw
+                date_block[i, span - len(dates):] = dates
+            
+            return engineer_features(raw_block, date_block)[:, -seq_length:]
+    
+    def _inverse_transform(self, scaled_values: np.ndarray, loaded: Optional[LoadedModel] = None,
+                           rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Convert scaled predictions to real currency (per business for a global model)"""
+        loaded = loaded or self.loaded
+        if rows is not None:
+            tables = loaded.business_tables
+            return scaled_values * tables['target_scale'][rows, None] + tables['target_mean'][rows, None]
+        target_scaler = loaded.target_scaler
+        return scaled_values * target_scaler.scale_[0] + target_scaler.mean_[0]
     
     # ==========================================
     # RISK DETECTION
     # ==========================================
     
-    def detect_risks(self, predictions: np.ndarray, threshold: float = 2000000) -> Dict:
+    def detect_risks(self, predictions: np.ndarray, threshold: float = LOW_CASHFLOW_THRESHOLD,
+                     p_shortfall: Optional[float] = None,
+                     shortfall_probability: float = SHORTFALL_PROBABILITY) -> Dict:
         """
         Detect cashflow risks
         
         Args:
             predictions: [4] weekly predictions
             threshold: Low cashflow threshold (default 2M MAD)
+            p_shortfall: Probability that some week falls below the threshold
+                         (forecast_distribution); if given, low_cashflow is
+                         flagged at p_shortfall >= shortfall_probability (high
+                         severity from 0.5) instead of on the point forecast
+            shortfall_probability: Probability that flags low_cashflow
             
         Returns:
             Risk analysis dict
@@ -314,7 +1123,18 @@ class FlowAgent:
         severity = 'low'
         
         # Check for low cashflow
-        if min_val < threshold:
+        if p_shortfall is not None:
+            if p_shortfall >= shortfall_probability:
+                risks.append({
+                    'type': 'low_cashflow',
+                    'week': min_week,
+                    'amount': float(min_val),
+                    'probability': float(p_shortfall),
+                    'message': f'⚠️ Low cash inflow risk: {p_shortfall:.0%} chance of a week below '
+                               f'{threshold:,.0f} MAD (forecast low {min_val:,.0f} MAD in week {min_week})'
+                })
+                severity = 'high' if p_shortfall >= 0.5 else 'medium'
+        elif min_val < threshold:
             risks.append({
                 'type': 'low_cashflow',
                 'week': min_week,
@@ -333,7 +1153,7 @@ class FlowAgent:
             })
             severity = max(severity, 'medium', key=['low', 'medium', 'high'].index)
         
-        return {
+        risk_analysis = {
             'has_risk': len(risks) > 0,
             'severity': severity,
             'risks': risks,
@@ -341,6 +1161,114 @@ class FlowAgent:
             'avg_predicted': float(avg_val),
             'worst_week': int(min_week)
         }
+        if p_shortfall is not None:
+            risk_analysis['p_shortfall'] = float(p_shortfall)
+        return risk_analysis
+    
+    def detect_risks_batch(self, predictions: np.ndarray, thresholds=LOW_CASHFLOW_THRESHOLD,
+                           p_shortfall: Optional[np.ndarray] = None,
+                           shortfall_probability: float = SHORTFALL_PROBABILITY) -> Dict:
+        """
+        Vectorized detect_risks for a whole portfolio
+        
+        Args:
+            predictions: [N, 4] weekly predictions
+            thresholds: Low cashflow threshold, scalar or [N] per business
+            p_shortfall: Optional [N] shortfall probabilities (see detect_risks)
+            shortfall_probability: Probability that flags low_cashflow
+            
+        Returns:
+            Columnar risk analysis: {'has_risk', 'low_cashflow', 'declining_trend',
+            'severity', 'worst_week', 'min_predicted', 'avg_predicted',
+            'drop_percent', 'thresholds'} as [N] arrays (severity as
+            'low' / 'medium' / 'high' strings), plus 'p_shortfall' when
+            given. Messages are built per business only on demand, see
+            risk_analysis_at.
+        """
+        predictions = np.asarray(predictions, dtype=np.float64)
+        thresholds = np.broadcast_to(np.asarray(thresholds, dtype=np.float64), predictions.shape[:1])
+        
+        min_val = predictions.min(axis=1)
+        avg_val = predictions.mean(axis=1)
+        first, last = predictions[:, 0], predictions[:, -1]
+        
+        declining = last < first * 0.85
+        
+        # 0 = low, 1 = medium, 2 = high
+        if p_shortfall is not None:
+            p_shortfall = np.asarray(p_shortfall, dtype=np.float64)
+            low = p_shortfall >= shortfall_probability
+            severity = np.where(low, np.where(p_shortfall >= 0.5, 2, 1), 0)
+        else:
+            low = min_val < thresholds
+            severity = np.where(low, np.where(min_val < thresholds * 0.75, 2, 1), 0)
+        severity = np.where(declining, np.maximum(severity, 1), severity)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drop_pct = np.where(declining, (first - last) / first * 100, np.nan)
+        
+        risk_batch = {
+            'has_risk': low | declining,
+            'low_cashflow': low,
+            'declining_trend': declining,
+            'severity': np.array(['low', 'medium', 'high'])[severity],
+            'worst_week': predictions.argmin(axis=1) + 1,
+            'min_predicted': min_val,
+            'avg_predicted': avg_val,
+            'drop_percent': drop_pct,
+            'thresholds': thresholds
+        }
+        if p_shortfall is not None:
+            risk_batch['p_shortfall'] = p_shortfall
+        return risk_batch
+    
+    def risk_analysis_at(self, risk_batch: Dict, i: int) -> Dict:
+        """
+        Per-business risk analysis dict (same shape as detect_risks) from a
+        detect_risks_batch result - messages are only built for flagged rows
+        """
+        min_val = float(risk_batch['min_predicted'][i])
+        worst_week = int(risk_batch['worst_week'][i])
+        p_shortfall = float(risk_batch['p_shortfall'][i]) if 'p_shortfall' in risk_batch else None
+        
+        risks = []
+        if risk_batch['has_risk'][i]:
+            if risk_batch['low_cashflow'][i] and p_shortfall is not None:
+                threshold = float(risk_batch['thresholds'][i])
+                risks.append({
+                    'type': 'low_cashflow',
+                    'week': worst_week,
+                    'amount': min_val,
+                    'probability': p_shortfall,
+                    'message': f'⚠️ Low cash inflow risk: {p_shortfall:.0%} chance of a week below '
+                               f'{threshold:,.0f} MAD (forecast low {min_val:,.0f} MAD in week {worst_week})'
+                })
+            elif risk_batch['low_cashflow'][i]:
+                risks.append({
+                    'type': 'low_cashflow',
+                    'week': worst_week,
+                    'amount': min_val,
+                    'message': f'⚠️ Low cash inflow predicted: {min_val:,.0f} MAD in week {worst_week}'
+                })
+            if risk_batch['declining_trend'][i]:
+                drop_pct = float(risk_batch['drop_percent'][i])
+                risks.append({
+                    'type': 'declining_trend',
+                    'drop_percent': drop_pct,
+                    'message': f'📉 Declining trend: {drop_pct:.1f}% drop expected over 4 weeks'
+                })
+        
+        risk_analysis = {
+            'has_risk': bool(risk_batch['has_risk'][i]),
+            'severity': str(risk_batch['severity'][i]),
+            'risks': risks,
+            'min_predicted': min_val,
+            'avg_predicted': float(risk_batch['avg_predicted'][i]),
+            'worst_week': worst_week
+        }
+        if p_shortfall is not None:
+            risk_analysis['p_shortfall'] = p_shortfall
+        return risk_analysis
     
     # ==========================================
     # AUTO-RESERVE LOGIC
@@ -348,7 +1276,8 @@ class FlowAgent:
     
     def check_and_reserve(self, current_cash_in: float, desired_salary: float,
                           user_contract_id: str, user_phone: str, 
-                          pot_phone: str) -> Dict:
+                          pot_phone: str, business_id: Optional[str] = None,
+                          reserve_key: Optional[str] = None) -> Dict:
         """
         Checks if current cash exceeds desired salary and reserves excess
         
@@ -358,6 +1287,9 @@ class FlowAgent:
             user_contract_id: CIH contract ID
             user_phone: User's phone number
             pot_phone: Emergency pot phone number
+            business_id: Business id for the reserve planner audit trail
+            reserve_key: Planner dedup key (e.g. ISO week) - a re-run with the
+                         same key replaces the earlier queued amount
             
         Returns:
             Reservation result
@@ -366,13 +1298,12 @@ class FlowAgent:
         excess = current_cash_in - desired_salary
         
         if excess <= 0:
-            return {
-                'action': 'no_reserve',
-                'current_cash_in': current_cash_in,
-                'desired_salary': desired_salary,
-                'excess': 0,
-                'message': f'✓ No excess - current inflow ({current_cash_in:,.0f} MAD) ≤ desired salary ({desired_salary:,.0f} MAD)'
-            }
+            return self._reserve_outcome(current_cash_in, desired_salary)
+        
+        if self.reserve_planner is not None:
+            intent = self.reserve_planner.add_intent(user_contract_id, user_phone, pot_phone, excess,
+                                                     business_id=business_id, intent_key=reserve_key)
+            return self._queued_outcome(current_cash_in, desired_salary, intent)
         
         logger.info(f"\n💰 Excess detected: {excess:,.2f} MAD")
         logger.info(f"   Current cash in: {current_cash_in:,.2f} MAD")
@@ -387,6 +1318,60 @@ class FlowAgent:
             amount=excess
         )
         
+        return self._reserve_outcome(current_cash_in, desired_salary, transfer_result)
+    
+    def _queued_outcome(self, current_cash_in: float, desired_salary: float, intent: Dict) -> Dict:
+        """Auto-reserve result for an intent handed to the reserve planner"""
+        excess = current_cash_in - desired_salary
+        if intent.get('status') == 'duplicate':
+            return {
+                'action': 'already_reserved',
+                'current_cash_in': current_cash_in,
+                'desired_salary': desired_salary,
+                'excess': excess,
+                'intent_id': intent['intent_id'],
+                'transaction_ref': intent['transaction_ref'],
+                'previous_status': intent['previous_status'],
+                'message': (f'⚠️ Reserve for key {intent["intent_key"]!r} awaits reconciliation '
+                            f'(transaction {intent["transaction_ref"]})'
+                            if intent['previous_status'] == 'needs_reconciliation' else
+                            f'✓ Already reserved for reserve key {intent["intent_key"]!r} '
+                            f'(transaction {intent["transaction_ref"]})')
+            }
+        return {
+            'action': 'queued',
+            'current_cash_in': current_cash_in,
+            'desired_salary': desired_salary,
+            'excess': excess,
+            'intent_id': intent['intent_id'],
+            'message': f'🕒 Queued {excess:,.2f} MAD for the next netted reserve (intent {intent["intent_id"]})'
+        }
+    
+    def flush_reserves(self, force: bool = False) -> List[Dict]:
+        """
+        Sends the netted transfers of every wallet whose window has closed
+        
+        Returns:
+            Per-intent audit records (see ReservePlanner.flush)
+        """
+        if self.reserve_planner is None:
+            return []
+        return self.reserve_planner.flush(force=force)
+    
+    def _reserve_outcome(self, current_cash_in: float, desired_salary: float,
+                         transfer_result: Optional[Dict] = None) -> Dict:
+        """Builds the auto-reserve result dict (no transfer_result = nothing to reserve)"""
+        excess = current_cash_in - desired_salary
+        
+        if transfer_result is None:
+            return {
+                'action': 'no_reserve',
+                'current_cash_in': current_cash_in,
+                'desired_salary': desired_salary,
+                'excess': 0,
+                'message': f'✓ No excess - current inflow ({current_cash_in:,.0f} MAD) ≤ desired salary ({desired_salary:,.0f} MAD)'
+            }
+        
         if transfer_result['success']:
             return {
                 'action': 'reserved',
@@ -410,130 +1395,277 @@ class FlowAgent:
     # MAIN ANALYSIS INTERFACE
     # ==========================================
     
-    def analyze(self, recent_data: pd.DataFrame, user_config: Dict) -> Dict:
+    def analyze(self, recent_data: Optional['pd.DataFrame'], user_config: Dict,
+                predictions: Optional[np.ndarray] = None,
+                reserve_result: Optional[Dict] = None,
+                risk_analysis: Optional[Dict] = None, verbose: bool = True,
+                model_version: Optional[str] = None, uncertainty: Optional[Dict] = None) -> Dict:
         """
         Complete analysis: predict → detect risks → auto-reserve
         
         Args:
-            recent_data: Last 8+ weeks of business data
+            recent_data: Last 8+ weeks of business data (unused if predictions given)
             user_config: {
                 'business_name': str,
                 'desired_weekly_salary': float,
                 'current_week_cash_in': float,
                 'contract_id': str,
                 'phone': str,
-                'pot_phone': str
+                'pot_phone': str,
+                'business_id': str (optional, reserve planner audit id and
+                                    the business a global model forecasts for),
+                'reserve_key': str (optional, reserve planner dedup key)
             }
+            predictions: Optional precomputed [4] forecast (skips the LSTM call)
+            reserve_result: Optional precomputed auto-reserve result (skips the CIH call)
+            risk_analysis: Optional precomputed risk analysis (see risk_analysis_at)
+            verbose: Log the step-by-step banners (skipped anyway when INFO is off)
+            model_version: Version that produced precomputed predictions
+                           (default: the version being served)
+            uncertainty: Optional precomputed forecast distribution (see
+                         uncertainty_at); drawn here when the agent has
+                         uncertainty_samples and predictions aren't given
             
         Returns:
             Complete analysis with predictions, risks, and auto-reserve result
+            (an AnalysisResult - the text 'report' is rendered on first access)
         """
+        started = time.perf_counter()
+        log = verbose and logger.isEnabledFor(logging.INFO)
         
-        logger.info(f"\n{'='*70}")
-        logger.info(f"🔍 Analyzing cashflow for {user_config.get('business_name', 'Business')}")
-        logger.info(f"{'='*70}\n")
+        if log:
+            logger.info(f"\n{'='*70}")
+            logger.info(f"🔍 Analyzing cashflow for {user_config.get('business_name', 'Business')}")
+            logger.info(f"{'='*70}\n")
         
         # 1. PREDICT CASHFLOW
-        logger.info("📊 Step 1/3: Predicting next 4 weeks...")
-        predictions = self.predict_cashflow(recent_data)
-        logger.info(f"✓ Predictions: {[f'{p:,.0f}' for p in predictions]}")
+        if log:
+            logger.info("📊 Step 1/3: Predicting next 4 weeks...")
+        if predictions is None:
+            loaded = self.loaded
+            business_id = user_config.get('business_id')
+            if uncertainty is None and self.uncertainty_samples:
+                predictions, distribution = self._forecast_with_uncertainty(
+                    [self._recent_arrays(recent_data, loaded)], [business_id], loaded, self.uncertainty_samples)
+                predictions, uncertainty = predictions[0], self.uncertainty_at(distribution, 0)
+            else:
+                predictions = self.predict_cashflow(recent_data, loaded, business_id)
+            model_version = loaded.version
+        elif model_version is None:
+            model_version = self.model_version
+        if log:
+            logger.info(f"✓ Predictions: {[f'{p:,.0f}' for p in predictions]}")
         
         # 2. DETECT RISKS
-        logger.info("\n🔍 Step 2/3: Detecting risks...")
-        risk_analysis = self.detect_risks(predictions)
+        if risk_analysis is None:
+            with self.metrics.timer('risk'):
+                if uncertainty is None:
+                    risk_analysis = self.detect_risks(predictions)
+                else:
+                    risk_analysis = self.detect_risks(predictions, uncertainty['threshold'], uncertainty['p_shortfall'])
         
-        if risk_analysis['has_risk']:
-            logger.info(f"⚠️  {len(risk_analysis['risks'])} risk(s) detected ({risk_analysis['severity']} severity)")
-            for risk in risk_analysis['risks']:
-                logger.info(f"   • {risk['message']}")
-        else:
-            logger.info("✅ No significant risks detected")
+        if log:
+            logger.info("\n🔍 Step 2/3: Detecting risks...")
+            if risk_analysis['has_risk']:
+                logger.info(f"⚠️  {len(risk_analysis['risks'])} risk(s) detected ({risk_analysis['severity']} severity)")
+                for risk in risk_analysis['risks']:
+                    logger.info(f"   • {risk['message']}")
+            else:
+                logger.info("✅ No significant risks detected")
         
         # 3. AUTO-RESERVE CHECK
-        logger.info("\n💰 Step 3/3: Checking for excess cash...")
-        reserve_result = self.check_and_reserve(
-            current_cash_in=user_config['current_week_cash_in'],
-            desired_salary=user_config['desired_weekly_salary'],
-            user_contract_id=user_config['contract_id'],
-            user_phone=user_config['phone'],
-            pot_phone=user_config['pot_phone']
-        )
+        if log:
+            logger.info("\n💰 Step 3/3: Checking for excess cash...")
+        if reserve_result is None:
+            with self.metrics.timer('reserve'):
+                reserve_result = self.check_and_reserve(
+                    current_cash_in=user_config['current_week_cash_in'],
+                    desired_salary=user_config['desired_weekly_salary'],
+                    user_contract_id=user_config['contract_id'],
+                    user_phone=user_config['phone'],
+                    pot_phone=user_config['pot_phone'],
+                    business_id=user_config.get('business_id', user_config.get('business_name')),
+                    reserve_key=user_config.get('reserve_key')
+                )
         
-        logger.info(f"   {reserve_result['message']}")
+        if log:
+            logger.info(f"   {reserve_result['message']}")
+            logger.info(f"\n{'='*70}")
+            logger.info("✅ Analysis complete!")
+            logger.info(f"{'='*70}\n")
         
-        # 4. GENERATE REPORT
-        report = self._generate_report(
-            business_name=user_config.get('business_name', 'Business'),
-            predictions=predictions,
-            risk_analysis=risk_analysis,
-            reserve_result=reserve_result
-        )
+        # 4. REPORT (rendered lazily, see AnalysisResult)
+        now = datetime.now()
+        report = partial(self.metrics.timed, 'report', render_report, user_config.get('business_name', 'Business'),
+                         predictions, risk_analysis, reserve_result, now, uncertainty=uncertainty)
         
-        logger.info(f"\n{'='*70}")
-        logger.info("✅ Analysis complete!")
-        logger.info(f"{'='*70}\n")
+        for risk in risk_analysis['risks']:
+            self.metrics.inc('flow_risks_total', risk['type'])
+        self.metrics.inc('flow_risk_severity_total', risk_analysis['severity'] if risk_analysis['has_risk'] else 'none')
+        self.metrics.inc('flow_reserve_outcomes_total', reserve_result['action'])
+        self.metrics.observe('analyze', time.perf_counter() - started)
         
-        return {
-            'timestamp': datetime.now().isoformat(),
+        return AnalysisResult({
+            'timestamp': now.isoformat(),
             'business_name': user_config.get('business_name'),
+            'model_version': model_version,
             'predictions': {
                 'weekly_values': predictions.tolist(),
                 'min': float(predictions.min()),
                 'max': float(predictions.max()),
                 'avg': float(predictions.mean()),
-                'trend': 'declining' if predictions[-1] < predictions[0] else 'growing'
+                'trend': 'declining' if predictions[-1] < predictions[0] else 'growing',
+                **({} if uncertainty is None else {'uncertainty': uncertainty})
             },
             'risk_analysis': risk_analysis,
-            'auto_reserve': reserve_result,
-            'report': report
-        }
+            'auto_reserve': reserve_result
+        }, render=report)
     
-    def _generate_report(self, business_name: str, predictions: np.ndarray,
-                        risk_analysis: Dict, reserve_result: Dict) -> str:
-        """Generate formatted text report"""
+    def analyze_many(self, histories, user_configs: Dict, business_id_col: str = 'business_id',
+                     batch_size: int = 1024, verbose: bool = True) -> Dict:
+        """
+        Complete analysis for many businesses with one batched forecast
         
-        report = f"\n{'='*70}\n"
-        report += f"📊 FLOW AI CASHFLOW REPORT - {business_name}\n"
-        report += f"{'='*70}\n\n"
-        
-        # Predictions
-        report += "📈 4-WEEK FORECAST:\n"
-        for i, pred in enumerate(predictions, 1):
-            report += f"   Week {i}: {pred:>12,.2f} MAD\n"
-        report += f"\n   Average:  {predictions.mean():>12,.2f} MAD\n"
-        report += f"   Trend:    {'📉 Declining' if predictions[-1] < predictions[0] else '📈 Growing'}\n\n"
-        
-        # Risks
-        if risk_analysis['has_risk']:
-            severity_emoji = {'low': '⚠️', 'medium': '🔶', 'high': '🔴'}
-            report += f"{severity_emoji[risk_analysis['severity']]} RISKS DETECTED ({risk_analysis['severity'].upper()}):\n\n"
-            for risk in risk_analysis['risks']:
-                report += f"   • {risk['message']}\n"
-            report += "\n"
+        Args:
+            histories: {business_id: DataFrame} or long-format DataFrame
+                       (see predict_cashflow_batch)
+            user_configs: {business_id: user_config} (see analyze)
+            business_id_col: Business id column of a long-format frame
+            batch_size: Max businesses per LSTM forward pass
+            verbose: Log the per-business banners
+            
+        Returns:
+            {business_id: analysis result} in forecast order
+        """
+        return dict(self.iter_analyses(histories, user_configs, business_id_col, batch_size,
+                                       chunk_size=None, verbose=verbose))
+    
+    def iter_analyses(self, histories, user_configs: Dict, business_id_col: str = 'business_id',
+                      batch_size: int = 1024, chunk_size: Optional[int] = 4096, verbose: bool = False):
+        """
+        Streams (business_id, analysis result) for a portfolio, chunk by chunk
+        
+        Each chunk is forecast, risk-checked and auto-reserved as a block,
+        then yielded and released, so memory stays flat for bulk runs
+        (see bulk_output.write_jsonl). The reserve planner is flushed once
+        the generator is exhausted.
+        
+        Args:
+            chunk_size: Businesses per chunk (None = whole portfolio at once,
+                        i.e. one reserve_many call)
+            (other args as analyze_many)
+        """
+        # Per-business inputs are converted chunk by chunk, a long-format
+        # frame in one vectorized pass
+        loaded = self.loaded  # One model version for the whole run
+        if isinstance(histories, Mapping):
+            business_ids, arrays = list(histories), None
         else:
-            report += "✅ NO RISKS DETECTED\n\n"
-        
-        # Auto-reserve
-        report += "💰 AUTO-RESERVE STATUS:\n\n"
-        if reserve_result['action'] == 'reserved':
-            report += f"   ✅ Successfully reserved {reserve_result['excess']:,.2f} MAD\n"
-            report += f"   📍 Current inflow:  {reserve_result['current_cash_in']:,.2f} MAD\n"
-            report += f"   🎯 Desired salary:  {reserve_result['desired_salary']:,.2f} MAD\n"
-            report += f"   💼 Reserved amount: {reserve_result['excess']:,.2f} MAD\n"
-            if 'transaction' in reserve_result and 'transaction_ref' in reserve_result['transaction']:
-                report += f"   🔖 Transaction ID:  {reserve_result['transaction']['transaction_ref']}\n"
-        elif reserve_result['action'] == 'no_reserve':
-            report += f"   ℹ️  No excess to reserve\n"
-            report += f"   📍 Current inflow: {reserve_result['current_cash_in']:,.2f} MAD\n"
-            report += f"   🎯 Desired salary: {reserve_result['desired_salary']:,.2f} MAD\n"
+            business_ids, arrays = self._history_arrays(histories, business_id_col, loaded.seq_length)
+        if not business_ids:
+            raise ValueError("No business histories to forecast")
+        
+        chunk_size = chunk_size or len(business_ids)
+        for start in range(0, len(business_ids), chunk_size):
+            chunk_ids = business_ids[start:start + chunk_size]
+            if arrays is None:
+                _, chunk_arrays = self._history_arrays({bid: histories[bid] for bid in chunk_ids}, business_id_col,
+                                                       loaded.seq_length)
+            else:
+                chunk_arrays = arrays[start:start + chunk_size]
+            for business_id, (raw, _) in zip(chunk_ids, chunk_arrays):
+                if len(raw) < loaded.seq_length:
+                    raise ValueError(f"Business {business_id}: need at least {loaded.seq_length} weeks of data")
+            
+            predictions, risk_batch, distribution = self.forecast_risks(chunk_arrays, chunk_ids, loaded, batch_size)
+            with self.metrics.timer('reserve'):
+                reserve_results = self.reserve_portfolio(chunk_ids, user_configs)
+            
+            for i, business_id in enumerate(chunk_ids):
+                uncertainty = None if distribution is None else self.uncertainty_at(distribution, i)
+                yield business_id, self.analyze(None, user_configs[business_id], predictions=predictions[i],
+                                                reserve_result=reserve_results[business_id],
+                                                risk_analysis=self.risk_analysis_at(risk_batch, i),
+                                                verbose=verbose, model_version=loaded.version,
+                                                uncertainty=uncertainty)
+        
+        if self.reserve_planner is not None:
+            self.reserve_planner.flush()
+    
+    def forecast_risks(self, arrays: List, business_ids: List, loaded: LoadedModel, batch_size: int = 1024):
+        """
+        Point forecasts + columnar risk analysis for a block of histories
+        
+        With uncertainty_samples set, the block's MC-dropout distribution is
+        drawn too and its shortfall probabilities drive low_cashflow.
+        
+        Returns:
+            (predictions [N, 4], detect_risks_batch result,
+             forecast_distribution result or None)
+        """
+        distribution = p_shortfall = None
+        if self.uncertainty_samples:
+            predictions, distribution = self._forecast_with_uncertainty(arrays, business_ids, loaded,
+                                                                        self.uncertainty_samples, batch_size)
+            p_shortfall = distribution['p_shortfall']
         else:
-            report += f"   ❌ Reserve failed: {reserve_result.get('error', 'Unknown error')}\n"
+            predictions = self.predict_arrays(arrays, batch_size=batch_size, loaded=loaded,
+                                              business_ids=business_ids)
+        with self.metrics.timer('risk'):
+            risk_batch = self.detect_risks_batch(predictions, p_shortfall=p_shortfall)
+        return predictions, risk_batch, distribution
+    
+    def reserve_portfolio(self, business_ids: List, user_configs: Dict) -> Dict:
+        """
+        Auto-reserve step for many businesses
         
-        report += f"\n{'='*70}\n"
-        report += f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-        report += f"{'='*70}\n"
+        Queues into the reserve planner when enabled (the caller flushes),
+        else sends all transfers in one reserve_many call (concurrent with
+        cih_client='async').
         
-        return report
+        Returns:
+            {business_id: auto-reserve result} (see check_and_reserve)
+        """
+        if self.reserve_planner is not None:
+            results = {}
+            for business_id in business_ids:
+                config = user_configs[business_id]
+                results[business_id] = self.check_and_reserve(
+                    current_cash_in=config['current_week_cash_in'],
+                    desired_salary=config['desired_weekly_salary'],
+                    user_contract_id=config['contract_id'],
+                    user_phone=config['phone'],
+                    pot_phone=config['pot_phone'],
+                    business_id=business_id,
+                    reserve_key=config.get('reserve_key')
+                )
+            return results
+        
+        transfers = {}
+        for business_id in business_ids:
+            config = user_configs[business_id]
+            excess = config['current_week_cash_in'] - config['desired_weekly_salary']
+            if excess > 0:
+                transfers[business_id] = {
+                    'user_contract_id': config['contract_id'],
+                    'user_phone': config['phone'],
+                    'pot_phone': config['pot_phone'],
+                    'amount': excess
+                }
+        transfer_results = dict(zip(transfers, self.cih_api.reserve_many(list(transfers.values()))))
+        
+        results = {}
+        for business_id in business_ids:
+            config = user_configs[business_id]
+            results[business_id] = self._reserve_outcome(config['current_week_cash_in'],
+                                                         config['desired_weekly_salary'],
+                                                         transfer_results.get(business_id))
+        return results
+    
+    def _generate_report(self, business_name: str, predictions: np.ndarray,
+                        risk_analysis: Dict, reserve_result: Dict) -> str:
+        """Generate formatted text report"""
+        return render_report(business_name, predictions, risk_analysis, reserve_result)
 
 
 # ==========================================
@@ -550,6 +1682,8 @@ if __name__ == "__main__":
     print("🚀 FLOW AI CASHFLOW AGENT - HACKATHON DEMO")
     print("="*70 + "\n")
     
+    import pandas as pd
+    
     # Initialize agent (DEMO MODE for hackathon)
     agent = FlowAgent(demo_mode=True)
     
@@ -0,0 +1,211 @@
+"""
+artifact_bundle.py - FLOW Model Artifact Bundle
+One memory-mappable file holding the LSTM weights, both scalers' mean /
+scale vectors (plus per-business rows for a global model) and the model
+metadata
+
+Replaces business_scaler.pkl, business_target_scaler.pkl and
+business_lstm.npz: no pickle (safe to load from untrusted storage), no
+sklearn import, and arrays are zero-copy views of a read-only mmap, so
+every worker process serving the same bundle shares its physical pages.
+
+Layout (little-endian):
+    magic      8 bytes   b'FLOWBNDL'
+    version    uint32    FORMAT_VERSION
+    header_len uint32    length of the JSON header
+    header     JSON      {'metadata': {...},
+                          'arrays': {name: {'dtype', 'shape', 'offset'}}}
+    arrays     raw C-order data, each starting on a 64-byte boundary
+
+Usage:
+    write_bundle('models/business_lstm.bundle', arrays, metadata)
+    bundle = ArtifactBundle('models/business_lstm.bundle')
+    bundle.arrays['fc2.bias'], bundle.metadata['config']
+
+Convert an existing models/ directory (.pt + scaler pickles + metadata):
+    python artifact_bundle.py convert models
+"""
+
+import json
+import mmap
+import os
+import struct
+from typing import Dict, Optional
+
+import numpy as np
+
+BUNDLE_MAGIC = b'FLOWBNDL'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+PREAMBLE = struct.Struct('<8sII')
+
+# Plain numeric dtypes only - nothing in a bundle can execute code on load
+ALLOWED_DTYPES = ('<f4', '<f8', '<i4', '<i8')
+
+SCALER_PREFIXES = ('scaler.', 'target_scaler.', 'business_scaler.', 'business_target_scaler.')
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_bundle(path: str, arrays: Dict[str, np.ndarray], metadata: Dict):
+    """
+    Writes arrays + metadata as one bundle (atomically, via a temp file)
+
+    Args:
+        path: Output bundle path
+        arrays: {name: numeric array} (stored little-endian, C order)
+        metadata: JSON-serializable model metadata
+    """
+    arrays = {name: np.ascontiguousarray(value, dtype=np.asarray(value).dtype.newbyteorder('<'))
+              for name, value in arrays.items()}
+    for name, value in arrays.items():
+        if value.dtype.str not in ALLOWED_DTYPES:
+            raise ValueError(f"Array {name}: dtype {value.dtype} not allowed in a bundle")
+
+    # Offsets are relative to the aligned start of the data section
+    layout, offset = {}, 0
+    for name, value in arrays.items():
+        layout[name] = {'dtype': value.dtype.str, 'shape': list(value.shape), 'offset': offset}
+        offset = _aligned(offset + value.nbytes)
+    header = json.dumps({'metadata': metadata, 'arrays': layout}, separators=(',', ':')).encode()
+    data_start = _aligned(PREAMBLE.size + len(header))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(PREAMBLE.pack(BUNDLE_MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        for name, value in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(value.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def export_bundle(state_dict, scaler, target_scaler, metadata: Dict, path: str,
+                  business_scalers: Optional[Dict[str, np.ndarray]] = None):
+    """
+    Writes a BusinessLSTM state_dict + fitted scalers as a bundle
+
+    Array names follow numpy_lstm.export_weights (state_dict keys plus
+    scaler.mean / scaler.scale / target_scaler.mean / target_scaler.scale).
+
+    Args:
+        business_scalers: Global model only - per-business scaling rows in
+                          metadata['businesses'] order, {'feature_mean' [B, F],
+                          'feature_scale' [B, F], 'target_mean' [B],
+                          'target_scale' [B]}; stored as business_scaler.mean /
+                          .scale and business_target_scaler.mean / .scale
+    """
+    arrays = {
+        key: np.asarray(value.detach().cpu().numpy() if hasattr(value, 'detach') else value, dtype=np.float32)
+        for key, value in state_dict.items()
+    }
+    arrays['scaler.mean'] = np.asarray(scaler.mean_, dtype=np.float64)
+    arrays['scaler.scale'] = np.asarray(scaler.scale_, dtype=np.float64)
+    arrays['target_scaler.mean'] = np.asarray(target_scaler.mean_, dtype=np.float64)
+    arrays['target_scaler.scale'] = np.asarray(target_scaler.scale_, dtype=np.float64)
+    if business_scalers is not None:
+        arrays['business_scaler.mean'] = np.asarray(business_scalers['feature_mean'], dtype=np.float64)
+        arrays['business_scaler.scale'] = np.asarray(business_scalers['feature_scale'], dtype=np.float64)
+        arrays['business_target_scaler.mean'] = np.asarray(business_scalers['target_mean'], dtype=np.float64)
+        arrays['business_target_scaler.scale'] = np.asarray(business_scalers['target_scale'], dtype=np.float64)
+    write_bundle(path, arrays, metadata)
+
+
+class ArtifactBundle:
+    """
+    Read-only, memory-mapped view of a bundle file
+
+    Attributes:
+        metadata: Model metadata dict from the header
+        arrays: {name: read-only ndarray view into the mapping}
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.metadata, self.arrays = self._parse()
+        except Exception:
+            self._mmap.close()
+            raise
+
+    def __repr__(self):
+        return f"ArtifactBundle({self.path!r}, {len(self.arrays)} arrays, {self.nbytes:,} bytes)"
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._mmap)
+
+    def _parse(self):
+        size = len(self._mmap)
+        if size < PREAMBLE.size:
+            raise ValueError(f"{self.path}: truncated bundle")
+        magic, version, header_len = PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != BUNDLE_MAGIC:
+            raise ValueError(f"{self.path}: not a FLOW artifact bundle")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{self.path}: bundle format {version}, expected {FORMAT_VERSION}")
+        if PREAMBLE.size + header_len > size:
+            raise ValueError(f"{self.path}: truncated header")
+
+        header = json.loads(bytes(self._mmap[PREAMBLE.size:PREAMBLE.size + header_len]))
+        data_start = _aligned(PREAMBLE.size + header_len)
+
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            if spec['dtype'] not in ALLOWED_DTYPES:
+                raise ValueError(f"{self.path}: array {name} has disallowed dtype {spec['dtype']}")
+            dtype = np.dtype(spec['dtype'])
+            shape = tuple(int(dim) for dim in spec['shape'])
+            count = int(np.prod(shape, dtype=np.int64))
+            start = data_start + int(spec['offset'])
+            if start < data_start or start + count * dtype.itemsize > size:
+                raise ValueError(f"{self.path}: array {name} lies outside the file")
+            arrays[name] = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=start).reshape(shape)
+        return header.get('metadata', {}), arrays
+
+    def state_dict_arrays(self) -> Dict[str, np.ndarray]:
+        """Model weights only (scaler vectors left out)"""
+        return {name: value for name, value in self.arrays.items()
+                if not name.startswith(SCALER_PREFIXES)}
+
+
+def convert_directory(models_dir: str = 'models', bundle_name: str = 'business_lstm.bundle') -> str:
+    """Builds a bundle from a legacy .pt + scaler pickles + metadata directory"""
+    import joblib
+    import torch
+
+    with open(os.path.join(models_dir, 'business_metadata.json')) as f:
+        metadata = json.load(f)
+    state_dict = torch.load(os.path.join(models_dir, 'business_lstm.pt'), map_location='cpu', weights_only=True)
+    scaler = joblib.load(os.path.join(models_dir, 'business_scaler.pkl'))
+    target_scaler = joblib.load(os.path.join(models_dir, 'business_target_scaler.pkl'))
+
+    path = os.path.join(models_dir, bundle_name)
+    export_bundle(state_dict, scaler, target_scaler, metadata, path)
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help='build a bundle from .pt + scaler pickles + metadata')
+    convert.add_argument('models_dir', nargs='?', default='models')
+    inspect = commands.add_parser('inspect', help='print a bundle header')
+    inspect.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        path = convert_directory(args.models_dir)
+        print(f"✓ Wrote {path} ({os.path.getsize(path):,} bytes)")
+    else:
+        bundle = ArtifactBundle(args.path)
+        print(bundle)
+        for name, value in bundle.arrays.items():
+            print(f"   {name:<28} {value.dtype.str:<4} {str(value.shape):<14}")
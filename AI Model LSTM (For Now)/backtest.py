@@ -0,0 +1,464 @@
+"""
+backtest.py - FLOW Rolling-Origin Backtest
+Walk-forward evaluation over many cutoffs instead of the single 70/15/15
+split behind business_metadata.json's performance numbers
+
+Fold k has a cutoff week c_k. Its model trains on every business's weeks
+before c_k (the last val_fraction of them for early stopping), with
+per-business scalers fit on those weeks only. It is then scored on the
+windows whose first forecast week falls in [c_k, c_k+1). Input weeks
+before c_k are known history; nothing from c_k on reaches the fit. The
+folds run in parallel worker processes. With warm_start, the first
+(earliest) fold trains from scratch and every later fold fine-tunes its
+weights for warm_epochs instead of retraining.
+
+Features are engineered once and cached as an artifact bundle. The cache
+is keyed on the CSV's path, size and mtime and on the segment. Every fold
+worker maps the same file, so no fold re-runs load_data / add_features,
+and a rerun on an unchanged CSV skips them altogether.
+
+Layout:
+    runs/backtest/
+        features.bundle         ← cached feature matrix, target, business, week
+        folds/fold-00.pt ...    ← each fold's best weights
+        folds.csv               ← one row per fold x forecast week
+        backtest.json           ← per-fold results + per-week MAE / MAPE distribution
+
+Usage:
+    report = run_backtest({'DATA_PATH': 'tsf.csv'}, folds=8, test_weeks=13, processes=4)
+    report['summary']['week_mape'][0]      # week-1 MAPE: mean / std / p10 / p50 / p90 ...
+
+CLI:
+    python backtest.py --data tsf.csv --folds 8 --test-weeks 13
+    python backtest.py --data businesses.csv --warm-start --warm-epochs 10 --set HIDDEN_SIZE=32
+"""
+
+import ast
+import csv
+import json
+import logging
+import multiprocessing as mp
+import os
+import time
+import traceback
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FEATURE_CACHE = 'features.bundle'
+REPORT_FILE = 'backtest.json'
+FOLDS_FILE = 'folds.csv'
+CACHE_VERSION = 1
+
+# Distribution statistics reported per forecast week
+PERCENTILES = (10, 50, 90)
+
+
+# ==========================================
+# FEATURE CACHE
+# ==========================================
+
+def _cache_key(config) -> Dict:
+    stat = os.stat(config.DATA_PATH)
+    return {
+        'version': CACHE_VERSION,
+        'data_path': os.path.abspath(config.DATA_PATH),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'segment': config.SEGMENT,
+        'feature_cols': list(config.FEATURE_COLS),
+        'target_col': config.TARGET_COL,
+        'business_id_col': config.BUSINESS_ID_COL
+    }
+
+
+def build_feature_cache(config, path: str) -> str:
+    """
+    Engineered features of config.DATA_PATH as a bundle (reused when the key matches)
+
+    Arrays: features [T, F] and target [T] (unscaled), business_idx [T],
+    week [T] (days since epoch), rows sorted by business then week.
+    """
+    from artifact_bundle import ArtifactBundle, write_bundle
+
+    key = json.loads(json.dumps(_cache_key(config)))  # As it reads back from the header
+    if os.path.isfile(path):
+        try:
+            if ArtifactBundle(path).metadata.get('key') == key:
+                logger.info(f"✓ Feature cache hit: {path}")
+                return path
+        except ValueError:
+            pass  # Unreadable / old format: rebuild
+
+    import trainLSTM
+    started = time.perf_counter()
+    df, business_ids = trainLSTM.load_data(config)
+    trainLSTM.add_features(df, config)
+    arrays = {
+        'features': df[config.FEATURE_COLS].to_numpy(dtype=np.float64),
+        'target': df[config.TARGET_COL].to_numpy(dtype=np.float64),
+        'business_idx': df['business_idx'].to_numpy(dtype=np.int64),
+        'week': df['date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    }
+    write_bundle(path, arrays, {'key': key, 'businesses': business_ids})
+    logger.info(f"✓ Feature cache built in {time.perf_counter() - started:.1f}s: {path} "
+                f"({len(df):,} weeks, {len(business_ids)} businesses)")
+    return path
+
+
+# ==========================================
+# FOLDS
+# ==========================================
+
+def make_folds(weeks: np.ndarray, folds: int, test_weeks: int, horizon: int,
+               min_train_weeks: int = 104) -> List[Dict]:
+    """
+    Cutoffs for the last folds x test_weeks forecast origins of the history
+
+    Args:
+        weeks: [T] week of every row (days since epoch)
+        folds: Number of cutoffs
+        test_weeks: Forecast origins scored per fold (distance between cutoffs)
+        horizon: Weeks predicted per window (the last origin needs them all)
+        min_train_weeks: Weeks of history the first cutoff must leave
+
+    Returns:
+        [{'index', 'cutoff', 'test_end'}, ...] oldest first; a fold scores the
+        windows whose first forecast week is in [cutoff, test_end) (days)
+    """
+    unique = np.unique(weeks)
+    end = len(unique) - horizon + 1  # Past the last origin with a full horizon
+    first = end - folds * test_weeks
+    if first < min_train_weeks:
+        raise ValueError(f"{folds} folds x {test_weeks} weeks leave {first} weeks of history before the "
+                         f"first cutoff (min_train_weeks={min_train_weeks}); use fewer or shorter folds")
+    boundaries = [first + k * test_weeks for k in range(folds + 1)]
+    day = lambda position: int(unique[position]) if position < len(unique) else int(unique[-1]) + 1
+    return [{'index': k, 'cutoff': day(boundaries[k]), 'test_end': day(boundaries[k + 1])}
+            for k in range(folds)]
+
+
+def fold_datasets(arrays: Dict[str, np.ndarray], fold: Dict, config, num_businesses: int,
+                  val_fraction: float = 0.15):
+    """
+    Train / val / test WindowDatasets of one fold, scaled with scalers fit
+    on the fold's train weeks only
+
+    Returns:
+        (train_set, val_set, test_set, business_scalers)
+    """
+    import pandas as pd
+    from sequences import WindowDataset
+    from trainLSTM import fit_scalers
+
+    features, target = arrays['features'], arrays['target']
+    groups, weeks = arrays['business_idx'], arrays['week']
+
+    # History = weeks before the cutoff; each business's last val_fraction of it validates
+    history = weeks < fold['cutoff']
+    counts = np.bincount(groups[history], minlength=num_businesses)
+    starts = np.concatenate(([0], np.cumsum(np.bincount(groups, minlength=num_businesses))[:-1]))
+    position = np.arange(len(weeks)) - starts[groups]  # Rows are sorted by business then week
+    train_size = counts - (val_fraction * counts).astype(int)
+    train_rows = history & (position < train_size[groups])
+    val_rows = history & ~train_rows
+
+    train_df = pd.DataFrame(features[train_rows], columns=config.FEATURE_COLS)
+    train_df[config.TARGET_COL] = target[train_rows]
+    train_df['business_idx'] = groups[train_rows]
+    _, _, business_scalers = fit_scalers(train_df, config, num_businesses)
+
+    scaled_features = (features - business_scalers['feature_mean'][groups]) / business_scalers['feature_scale'][groups]
+    scaled_target = (target - business_scalers['target_mean'][groups]) / business_scalers['target_scale'][groups]
+
+    def windows(rows, starts=None):
+        return WindowDataset(scaled_features[rows], scaled_target[rows], config.SEQ_LENGTH,
+                             config.FORECAST_HORIZON, starts=starts, groups=groups[rows])
+
+    # Test: windows over all rows whose first forecast week lies in the fold
+    every = slice(None)
+    valid = windows(every).starts
+    origin = weeks[valid + config.SEQ_LENGTH]
+    scored = valid[(origin >= fold['cutoff']) & (origin < fold['test_end'])]
+    return windows(train_rows), windows(val_rows), windows(every, scored), business_scalers
+
+
+def _week_errors(preds: np.ndarray, actuals: np.ndarray):
+    """Per-forecast-week MAE and MAPE (%) of [N, horizon] real-currency arrays"""
+    errors = np.abs(actuals - preds)
+    return errors.mean(axis=0), (errors / np.abs(actuals)).mean(axis=0) * 100
+
+
+# ==========================================
+# WORKER
+# ==========================================
+
+def _init_worker(threads: int, log_level: int):
+    from portfolio_pool import pin_threads
+    pin_threads(threads)  # Env caps first, so torch starts with them
+    import trainLSTM      # Imported once per worker, not per fold
+    pin_threads(threads)
+    logging.getLogger('trainLSTM').setLevel(log_level)
+
+
+def _run_fold(fold: Dict, cache_path: str, overrides: Dict, root: str, val_fraction: float,
+              warm_start_path: Optional[str] = None, warm_epochs: Optional[int] = None) -> Dict:
+    """Trains and scores one fold (never raises: errors come back in the result)"""
+    started = time.perf_counter()
+    result = {'fold': fold['index'], 'cutoff': str(np.datetime64(fold['cutoff'], 'D')),
+              'test_end': str(np.datetime64(fold['test_end'], 'D')), 'error': None}
+    try:
+        import torch
+        from artifact_bundle import ArtifactBundle
+        from sequences import WindowLoader
+        import trainLSTM
+
+        config = trainLSTM.Config(**overrides)
+        bundle = ArtifactBundle(cache_path)
+        num_businesses = len(bundle.metadata['businesses'])
+        train_set, val_set, test_set, business_scalers = fold_datasets(
+            bundle.arrays, fold, config, num_businesses, val_fraction)
+        if not len(train_set) or not len(val_set) or not len(test_set):
+            raise ValueError(f"Fold {fold['index']} has {len(train_set)} train / {len(val_set)} val / "
+                             f"{len(test_set)} test windows")
+
+        torch.manual_seed(config.SEED)
+        model = trainLSTM.build_model(config, num_businesses)
+        if warm_start_path is not None:
+            model.load_state_dict(torch.load(warm_start_path, weights_only=True))
+            config.EPOCHS = warm_epochs or config.EPOCHS
+
+        checkpoint_path = os.path.join(root, 'folds', f"fold-{fold['index']:02d}.pt")
+        if config.FAST_TRAINING:
+            history, best_val_loss = trainLSTM.fit_fast(model, train_set, val_set, config, checkpoint_path)
+        else:
+            train_loader = WindowLoader(train_set, batch_size=config.BATCH_SIZE, shuffle=True)
+            val_loader = WindowLoader(val_set, batch_size=config.BATCH_SIZE)
+            history, best_val_loss = trainLSTM.fit(model, train_loader, val_loader, config, checkpoint_path)
+
+        preds, actuals, rows = trainLSTM.collect_predictions(model, WindowLoader(test_set, batch_size=1024))
+        week_mae, week_mape = _week_errors(trainLSTM.inverse_transform_target(preds, rows, business_scalers),
+                                           trainLSTM.inverse_transform_target(actuals, rows, business_scalers))
+        result.update({
+            'warm_start': warm_start_path is not None,
+            'train_windows': len(train_set), 'val_windows': len(val_set), 'test_windows': len(test_set),
+            'epochs_trained': len(history['train']), 'best_val_loss': float(best_val_loss),
+            'week_mae': week_mae.tolist(), 'week_mape': week_mape.tolist(),
+            'mae': float(week_mae.mean()), 'mape': float(week_mape.mean())
+        })
+    except Exception:
+        result['error'] = traceback.format_exc(limit=3)
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def _run_fold_star(args):
+    return _run_fold(*args)
+
+
+# ==========================================
+# BACKTEST
+# ==========================================
+
+def run_backtest(overrides: Optional[Dict] = None, root: str = 'runs/backtest', folds: int = 8,
+                 test_weeks: int = 13, min_train_weeks: int = 104, val_fraction: float = 0.15,
+                 warm_start: bool = False, warm_epochs: int = 10, processes: Optional[int] = None,
+                 threads_per_fold: int = 1, start_method: Optional[str] = None,
+                 worker_log_level: int = logging.WARNING) -> Dict:
+    """
+    Rolling-origin backtest of one trainLSTM configuration
+
+    Args:
+        overrides: trainLSTM.Config fields (FAST_TRAINING defaults to True here)
+        root: Output directory (feature cache, fold weights, report)
+        folds, test_weeks, min_train_weeks: Cutoff layout (see make_folds)
+        val_fraction: Share of each business's pre-cutoff weeks used for early stopping
+        warm_start: Fine-tune later folds from the first fold's weights
+        warm_epochs: Epoch budget of a warm-started fold
+        processes: Concurrent folds (default: os.cpu_count() // threads_per_fold)
+        threads_per_fold: Intra-op threads per fold process
+        start_method: 'fork' (default where available) or 'spawn'
+        worker_log_level: trainLSTM log level inside workers
+
+    Returns:
+        The backtest.json report: {'config', 'folds': [...], 'summary'}
+    """
+    from trainLSTM import Config
+
+    overrides = dict(overrides or {})
+    overrides.setdefault('FAST_TRAINING', True)
+    config = Config(**overrides)
+    os.makedirs(os.path.join(root, 'folds'), exist_ok=True)
+    started = time.perf_counter()
+
+    cache_path = build_feature_cache(config, os.path.join(root, FEATURE_CACHE))
+    from artifact_bundle import ArtifactBundle
+    fold_list = make_folds(ArtifactBundle(cache_path).arrays['week'], folds, test_weeks,
+                           config.FORECAST_HORIZON, min_train_weeks)
+
+    processes = processes or max(1, (os.cpu_count() or 1) // threads_per_fold)
+    start_method = start_method or ('fork' if 'fork' in mp.get_all_start_methods() else 'spawn')
+    logger.info(f"📐 Backtest: {folds} fold(s) x {test_weeks} weeks, first cutoff "
+                f"{np.datetime64(fold_list[0]['cutoff'], 'D')}, "
+                f"{'warm start' if warm_start else 'retrain'} on {processes} process(es) → {root}")
+
+    tasks = [(fold, cache_path, overrides, root, val_fraction) for fold in fold_list]
+    results = []
+    context = mp.get_context(start_method)
+    with context.Pool(processes, initializer=_init_worker, initargs=(threads_per_fold, worker_log_level)) as pool:
+        def collect(batch):
+            for result in pool.imap_unordered(_run_fold_star, batch):
+                results.append(result)
+                outcome = 'failed' if result['error'] else f"MAPE {result['mape']:.2f}% ({result['seconds']:.1f}s)"
+                logger.info(f"   [{len(results)}/{folds}] fold {result['fold']} @ {result['cutoff']}: {outcome}")
+                if result['error']:
+                    logger.error(result['error'])
+
+        if warm_start:
+            # Earliest fold from scratch; its weights never saw a later fold's weeks
+            collect(tasks[:1])
+            base_path = os.path.join(root, 'folds', 'fold-00.pt')
+            if results[0]['error']:
+                raise RuntimeError(f"Base fold failed, nothing to warm-start from:\n{results[0]['error']}")
+            collect([task + (base_path, warm_epochs) for task in tasks[1:]])
+        else:
+            collect(tasks)
+
+    results.sort(key=lambda result: result['fold'])
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {'overrides': overrides, 'folds': folds, 'test_weeks': test_weeks,
+                   'min_train_weeks': min_train_weeks, 'val_fraction': val_fraction,
+                   'warm_start': warm_start, 'warm_epochs': warm_epochs if warm_start else None},
+        'folds': results,
+        'summary': summarize(results),
+        'seconds': time.perf_counter() - started
+    }
+    write_report(report, root)
+    logger.info(f"✓ Backtest finished in {report['seconds']:.1f}s")
+    return report
+
+
+# ==========================================
+# REPORT
+# ==========================================
+
+def _distribution(values: np.ndarray) -> Dict:
+    stats = {'mean': float(values.mean()), 'std': float(values.std()),
+             'min': float(values.min()), 'max': float(values.max())}
+    stats.update({f'p{q}': float(np.percentile(values, q)) for q in PERCENTILES})
+    return stats
+
+
+def summarize(results: List[Dict]) -> Dict:
+    """
+    Per-forecast-week MAE / MAPE across folds: distribution of the fold
+    values plus the window-weighted pooled value
+    """
+    done = [result for result in results if not result['error']]
+    if not done:
+        return {'folds': 0}
+    mae = np.array([result['week_mae'] for result in done])     # [folds, horizon]
+    mape = np.array([result['week_mape'] for result in done])
+    windows = np.array([result['test_windows'] for result in done], dtype=np.float64)
+    return {
+        'folds': len(done),
+        'failed_folds': len(results) - len(done),
+        'test_windows': int(windows.sum()),
+        'week_mae': [dict(_distribution(mae[:, week]), week=week + 1,
+                          pooled=float(np.average(mae[:, week], weights=windows)))
+                     for week in range(mae.shape[1])],
+        'week_mape': [dict(_distribution(mape[:, week]), week=week + 1,
+                           pooled=float(np.average(mape[:, week], weights=windows)))
+                      for week in range(mape.shape[1])]
+    }
+
+
+def write_report(report: Dict, root: str):
+    with open(os.path.join(root, REPORT_FILE), 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    with open(os.path.join(root, FOLDS_FILE), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['fold', 'cutoff', 'test_end', 'week', 'mae', 'mape', 'test_windows', 'epochs_trained'])
+        for result in report['folds']:
+            if result['error']:
+                continue
+            for week, (mae, mape) in enumerate(zip(result['week_mae'], result['week_mape']), 1):
+                writer.writerow([result['fold'], result['cutoff'], result['test_end'], week, mae, mape,
+                                 result['test_windows'], result['epochs_trained']])
+
+
+def format_report(report: Dict) -> str:
+    lines = [f"   {'fold':>4} {'cutoff':<11} {'windows':>7} {'epochs':>6} "
+             + ''.join(f"{f'W{week + 1} MAPE':>9}" for week in range(len(report['summary'].get('week_mape', []))))
+             + f"{'time':>8}"]
+    for result in report['folds']:
+        if result['error']:
+            lines.append(f"   {result['fold']:>4} {result['cutoff']:<11} "
+                         f"{result['error'].strip().splitlines()[-1]}")
+            continue
+        lines.append(f"   {result['fold']:>4} {result['cutoff']:<11} {result['test_windows']:>7} "
+                     f"{result['epochs_trained']:>6} " + ''.join(f"{v:8.2f}%" for v in result['week_mape'])
+                     + f"{result['seconds']:7.1f}s")
+
+    summary = report['summary']
+    if summary['folds']:
+        lines.append(f"\n   Week-specific accuracy across {summary['folds']} folds "
+                     f"({summary['test_windows']:,} scored windows):")
+        for mae, mape in zip(summary['week_mae'], summary['week_mape']):
+            lines.append(f"   Week {mae['week']}: MAE {mae['mean']:>12,.0f} ± {mae['std']:<10,.0f} "
+                         f"| MAPE {mape['mean']:6.2f}% ± {mape['std']:5.2f}  "
+                         f"(p10 {mape['p10']:.2f} / p50 {mape['p50']:.2f} / p90 {mape['p90']:.2f}, "
+                         f"pooled {mape['pooled']:.2f}%)")
+    return '\n'.join(lines)
+
+
+# ==========================================
+# CLI
+# ==========================================
+
+def _parse_assignments(items: Optional[List[str]]) -> Dict:
+    parsed = {}
+    for item in items or []:
+        field, _, value = item.partition('=')
+        if not value:
+            raise SystemExit(f"Expected FIELD=value, got {item!r}")
+        try:
+            parsed[field] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            parsed[field] = value
+    return parsed
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', help='training CSV (Config.DATA_PATH)')
+    parser.add_argument('--set', nargs='*', metavar='FIELD=value', help='trainLSTM.Config overrides')
+    parser.add_argument('--root', default='runs/backtest')
+    parser.add_argument('--folds', type=int, default=8)
+    parser.add_argument('--test-weeks', type=int, default=13)
+    parser.add_argument('--min-train-weeks', type=int, default=104)
+    parser.add_argument('--val-fraction', type=float, default=0.15)
+    parser.add_argument('--warm-start', action='store_true', help='fine-tune later folds from the first fold')
+    parser.add_argument('--warm-epochs', type=int, default=10)
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--threads-per-fold', type=int, default=1)
+    args = parser.parse_args()
+
+    overrides = _parse_assignments(args.set)
+    if args.data:
+        overrides['DATA_PATH'] = args.data
+    report = run_backtest(overrides, args.root, args.folds, args.test_weeks, args.min_train_weeks,
+                          args.val_fraction, args.warm_start, args.warm_epochs, args.processes,
+                          args.threads_per_fold)
+
+    print(f"\n{'='*70}")
+    print(f"📐 ROLLING-ORIGIN BACKTEST - {args.folds} folds x {args.test_weeks} weeks")
+    print(f"{'='*70}\n")
+    print(format_report(report))
+    print(f"\n{'='*70}\n")
@@ -0,0 +1,154 @@
+"""
+bench_inference.py - FLOW Inference Backend Benchmark
+Checks every FlowAgent backend against the torch path and reports
+latency / throughput per batch size, plus memory per backend
+
+Usage:
+    python bench_inference.py
+    python bench_inference.py --backends torch onnx --batch-sizes 1 64 1024
+    python bench_inference.py --backends torch torch-int8 --rss
+"""
+
+import argparse
+import os
+import logging
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from Flow_agent import FlowAgent
+from features import CSV_COLUMNS, engineer_features, frame_to_arrays
+
+BACKENDS = {
+    'torch': lambda: FlowAgent(backend='torch'),
+    'onnx': lambda: FlowAgent(backend='onnx'),
+    'torch-int8': lambda: FlowAgent(backend='torch', quantized=True),
+    'numpy': lambda: FlowAgent(backend='numpy'),
+}
+
+
+def load_windows(csv_path: str, seq_len: int = 8) -> np.ndarray:
+    """All 8-week feature windows of tsf.csv: [N, 8, 12]"""
+    df = pd.read_csv(csv_path)
+    df['date'] = pd.to_datetime(df['date of week start'])
+    df = df.sort_values('date').reset_index(drop=True)
+    for col, source in CSV_COLUMNS.items():
+        df[col] = df[source]
+
+    features = engineer_features(*frame_to_arrays(df))
+    windows = np.lib.stride_tricks.sliding_window_view(np.arange(len(df)), seq_len)
+    return features[windows]
+
+
+def time_batches(agent: FlowAgent, windows: np.ndarray, batch_size: int, repeats: int):
+    """Median latency (ms) and throughput (windows/s) for one batch size"""
+    reps = -(-batch_size // len(windows))
+    batch = np.concatenate([windows] * reps)[:batch_size]
+
+    agent.predict_windows(batch, batch_size=batch_size)  # Warm up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        agent.predict_windows(batch, batch_size=batch_size)
+        timings.append(time.perf_counter() - start)
+
+    median = float(np.median(timings))
+    return median * 1000, batch_size / median
+
+
+def rss_mb() -> float:
+    """Resident set size of this process in MB (current on Linux, peak elsewhere on Unix)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def child_rss(name: str, csv_path: str):
+    """Subprocess entry: load one backend, predict every window, print RSS"""
+    logging.disable(logging.INFO)
+    warnings.filterwarnings('ignore')
+
+    windows = load_windows(csv_path)
+    baseline = rss_mb()
+    agent = BACKENDS[name]()
+    agent.predict_windows(windows)
+    print(f"{baseline:.1f} {rss_mb():.1f}")
+
+
+def compare_rss(backends, csv_path: str):
+    """RSS per backend, each measured in a fresh interpreter"""
+    print(f"\n💾 RSS (fresh process per backend)")
+    print(f"   {'backend':>12} {'before load':>12} {'after predict':>14} {'model cost':>11}")
+    for name in backends:
+        result = subprocess.run(
+            [sys.executable, __file__, '--child-rss', name, '--csv', csv_path],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print(f"   {name:>12}  failed: {result.stderr.strip().splitlines()[-1:]}")
+            continue
+        before, after = map(float, result.stdout.split()[-2:])
+        print(f"   {name:>12} {before:>10.1f}MB {after:>12.1f}MB {after - before:>9.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default='tsf.csv')
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 16, 64, 256, 1024, 4096])
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--rss', action='store_true', help='Also compare RSS per backend')
+    parser.add_argument('--child-rss', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_rss:
+        child_rss(args.child_rss, args.csv)
+        return
+
+    logging.disable(logging.INFO)
+    warnings.filterwarnings('ignore')
+
+    windows = load_windows(args.csv)
+    reference = BACKENDS['torch']().predict_windows(windows)
+
+    print(f"\n{'='*70}")
+    print(f"📊 INFERENCE BENCHMARK - {len(windows)} windows from {args.csv}")
+    print(f"{'='*70}")
+
+    for name in args.backends:
+        try:
+            agent = BACKENDS[name]()
+        except (ImportError, OSError, RuntimeError) as e:
+            print(f"\n⚠️  {name}: unavailable ({e})")
+            continue
+
+        # Numerical check against the torch path
+        preds = agent.predict_windows(windows)
+        abs_diff = np.abs(preds - reference)
+        rel_diff = abs_diff / np.abs(reference)
+        print(f"\n🔧 Backend: {name}")
+        print(f"   vs torch: max |Δ| = {abs_diff.max():,.2f} MAD | "
+              f"mean |Δ| = {abs_diff.mean():,.2f} MAD | max rel = {rel_diff.max():.2e}")
+
+        print(f"   {'batch':>7} {'p50 ms':>10} {'windows/s':>12}")
+        for batch_size in args.batch_sizes:
+            latency_ms, throughput = time_batches(agent, windows, batch_size, args.repeats)
+            print(f"   {batch_size:>7} {latency_ms:>10.3f} {throughput:>12,.0f}")
+
+    if args.rss:
+        compare_rss(args.backends, args.csv)
+
+    print(f"\n{'='*70}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+bench_serving.py - FLOW Forecast Service Benchmark
+Fires concurrent single-business requests at forecast_server.py and compares
+micro-batching settings (client p50/p99 latency, throughput, batch sizes)
+
+The server runs in-process on its own event loop thread with the forecast
+cache disabled, so every request reaches the model. Histories are the
+8-week windows of tsf.csv.
+
+Usage:
+    python bench_serving.py
+    python bench_serving.py --backend torch --requests 4000 --concurrency 128 \\
+        --configs 1:0 16:2 64:5
+"""
+
+import argparse
+import asyncio
+import csv
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+
+def load_histories(csv_path: str, seq_length: int = 9) -> List[Dict]:
+    with open(csv_path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    return [{col: [row[col] for row in rows[s:s + seq_length]] for col in rows[0]}
+            for s in range(len(rows) - seq_length + 1)]
+
+
+def serve_in_thread(agent, max_batch_size: int, max_wait_ms: float):
+    """Starts the forecast app on a background loop, returns (base_url, stop)"""
+    from aiohttp import web
+    from forecast_server import create_app
+
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(create_app(agent, max_batch_size, max_wait_ms))
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    return f"http://127.0.0.1:{port}", stop
+
+
+async def fire(base_url: str, histories: List[Dict], total: int, concurrency: int) -> Dict:
+    import aiohttp
+
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def one(i: int):
+            async with semaphore:
+                start = time.perf_counter()
+                payload = {'business_id': i, 'history': histories[i % len(histories)]}
+                async with session.post(f"{base_url}/forecast", json=payload) as response:
+                    await response.json()
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(one(i) for i in range(min(concurrency, total))))  # warm-up
+        latencies.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+        async with session.get(f"{base_url}/stats") as response:
+            server = await response.json()
+
+    return {
+        'p50_ms': np.percentile(latencies, 50) * 1000,
+        'p99_ms': np.percentile(latencies, 99) * 1000,
+        'throughput': total / elapsed,
+        'avg_batch_size': server.get('avg_batch_size', 0.0)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default='tsf.csv')
+    parser.add_argument('--backend', default='torch')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--configs', nargs='+', default=['1:0', '16:2', '64:5'],
+                        help='max_batch_size:max_wait_ms pairs')
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+    from Flow_agent import FlowAgent
+
+    agent = FlowAgent(backend=args.backend, forecast_cache_size=0)
+    histories = load_histories(args.csv)
+
+    print(f"\n{'='*70}")
+    print(f"🛰️  FORECAST SERVICE - {args.requests} requests, {args.concurrency} in flight, {args.backend}")
+    print(f"{'='*70}\n")
+    print(f"   {'batch':>6} {'wait ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>9} {'avg batch':>10}")
+
+    for config in args.configs:
+        max_batch_size, max_wait_ms = config.split(':')
+        base_url, stop = serve_in_thread(agent, int(max_batch_size), float(max_wait_ms))
+        try:
+            result = asyncio.run(fire(base_url, histories, args.requests, args.concurrency))
+        finally:
+            stop()
+        print(f"   {max_batch_size:>6} {max_wait_ms:>8} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+              f"{result['throughput']:>9,.0f} {result['avg_batch_size']:>10.1f}")
+
+    print(f"\n{'='*70}\n")
+
+
+if __name__ == "__main__":
+    main()
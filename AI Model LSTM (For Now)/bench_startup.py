@@ -0,0 +1,94 @@
+"""
+bench_startup.py - FLOW Cold Start Benchmark
+Measures time-to-first-prediction of a fresh worker process per backend
+
+Each run starts a new interpreter, imports Flow_agent, builds a FlowAgent
+and forecasts one business read from tsf.csv with the csv module (no
+pandas on the request path). backend='torch' loads torch; scalers (and
+the numpy backend's weights) are mapped from the artifact bundle, so
+neither backend imports sklearn, and backend='numpy' needs only NumPy.
+
+Usage:
+    python bench_startup.py
+    python bench_startup.py --backends torch numpy --runs 5
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+CHILD = r'''
+import csv, json, sys, time
+start = time.perf_counter()
+import logging
+logging.disable(logging.INFO)
+import warnings
+warnings.filterwarnings('ignore')
+from Flow_agent import FlowAgent
+imported = time.perf_counter()
+agent = FlowAgent(backend=sys.argv[1])
+loaded = time.perf_counter()
+
+with open(sys.argv[2], newline='') as f:
+    rows = list(csv.DictReader(f))[-9:]
+history = {col: [row[col] for row in rows] for col in rows[0]}
+predictions = agent.predict_cashflow(history)
+done = time.perf_counter()
+
+heavy = [name for name in ('torch', 'pandas', 'sklearn', 'joblib', 'requests', 'onnxruntime')
+         if name in sys.modules]
+print(json.dumps({
+    'import': imported - start, 'init': loaded - imported,
+    'first_prediction': done - loaded, 'heavy_modules': heavy,
+    'week_1': float(predictions[0])
+}))
+'''
+
+
+def run_once(backend: str, csv_path: str) -> dict:
+    """One fresh interpreter: wall-clock time to first prediction + breakdown"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CHILD, backend, csv_path],
+                            capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    stats['wall'] = wall
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default='tsf.csv')
+    parser.add_argument('--backends', nargs='+', default=['torch', 'numpy'])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"\n{'='*70}")
+    print(f"⏱️  COLD START - time to first prediction ({args.runs} fresh processes each)")
+    print(f"{'='*70}\n")
+    print(f"   {'backend':>8} {'wall s':>8} {'import s':>9} {'init s':>8} {'predict s':>10}  modules loaded")
+
+    for backend in args.backends:
+        try:
+            runs = [run_once(backend, args.csv) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"   {backend:>8}  failed: {e}")
+            continue
+
+        median = {key: statistics.median(run[key] for run in runs)
+                  for key in ('wall', 'import', 'init', 'first_prediction')}
+        print(f"   {backend:>8} {median['wall']:>8.3f} {median['import']:>9.3f} {median['init']:>8.3f} "
+              f"{median['first_prediction']:>10.4f}  {', '.join(runs[0]['heavy_modules']) or '-'}"
+              f"  (week 1: {runs[0]['week_1']:,.0f})")
+
+    print(f"\n{'='*70}\n")
+
+
+if __name__ == "__main__":
+    main()
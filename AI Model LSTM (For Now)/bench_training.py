@@ -0,0 +1,122 @@
+"""
+bench_training.py - FLOW Training Loop Benchmark
+Epochs/sec of trainLSTM.fit (WindowLoader batches, loss.item() per step,
+checkpoint on every improving epoch) against trainLSTM.fit_fast and its
+torch.compile / bf16 autocast variants
+
+Data goes through the same pipeline as trainLSTM.train (features, temporal
+split, per-business scaling, windows). Every mode trains a fresh model
+from the same seed; one untimed warm-up epoch per mode keeps torch.compile's
+graph capture out of the steady-state numbers (it is reported separately).
+Early stopping is disabled so every mode runs the full --epochs.
+
+Usage:
+    python bench_training.py --data tsf.csv
+    python bench_training.py --data tsf.csv --batch-sizes 16 64 256 --epochs 20
+    python bench_training.py --modes fit fast fast+compile
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import torch
+
+import trainLSTM
+from trainLSTM import Config
+
+# mode -> (fast loop, torch.compile, bf16 autocast)
+MODES = {
+    'fit': (False, False, False),
+    'fast': (True, False, False),
+    'fast+compile': (True, True, False),
+    'fast+bf16': (True, False, True),
+    'fast+compile+bf16': (True, True, True)
+}
+
+
+def prepare(config: Config):
+    """Train / val windows and business count, exactly as trainLSTM.train builds them"""
+    df, business_ids = trainLSTM.load_data(config)
+    trainLSTM.add_features(df, config)
+    train_df, val_df, _ = trainLSTM.split_temporal(df)
+    _, _, business_scalers = trainLSTM.fit_scalers(train_df, config, len(business_ids))
+    for frame in (train_df, val_df):
+        trainLSTM.scale_by_business(frame, config, business_scalers)
+    return trainLSTM.create_sequences(train_df, config), trainLSTM.create_sequences(val_df, config), len(business_ids)
+
+
+def run_mode(mode: str, train_set, val_set, num_businesses: int, batch_size: int, epochs: int,
+             checkpoint_path: str) -> dict:
+    """Warm-up epoch + timed epochs of one mode on a fresh model"""
+    fast, compiled, bf16 = MODES[mode]
+    config = Config(BATCH_SIZE=batch_size, EPOCHS=1, EARLY_STOPPING_PATIENCE=epochs + 1,
+                    FAST_TRAINING=fast, COMPILE=compiled, BF16_AUTOCAST=bf16)
+    torch.manual_seed(config.SEED)
+    model = trainLSTM.build_model(config, num_businesses)
+
+    def fit(num_epochs):
+        config.EPOCHS = num_epochs
+        if fast:
+            return trainLSTM.fit_fast(model, train_set, val_set, config, checkpoint_path)
+        train_loader = trainLSTM.WindowLoader(train_set, batch_size=batch_size, shuffle=True)
+        val_loader = trainLSTM.WindowLoader(val_set, batch_size=batch_size)
+        return trainLSTM.fit(model, train_loader, val_loader, config, checkpoint_path)
+
+    start = time.perf_counter()
+    fit(1)
+    warmup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    history, best_val_loss = fit(epochs)
+    elapsed = time.perf_counter() - start
+    return {'epochs_per_sec': epochs / elapsed, 'warmup': warmup, 'best_val_loss': best_val_loss,
+            'final_train_loss': history['train'][-1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=Config.DATA_PATH)
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[Config.BATCH_SIZE])
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--threads', type=int, help='torch intra-op threads (default: torch default)')
+    args = parser.parse_args()
+
+    logging.getLogger('trainLSTM').setLevel(logging.WARNING)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    train_set, val_set, num_businesses = prepare(Config(DATA_PATH=args.data))
+
+    print(f"\n{'='*70}")
+    print(f"🏋️  TRAINING LOOP - {len(train_set):,} train / {len(val_set):,} val windows, "
+          f"{num_businesses} businesses, {args.epochs} epochs, {torch.get_num_threads()} threads")
+    print(f"{'='*70}\n")
+    print(f"   {'batch':>5} {'mode':<18} {'epochs/s':>9} {'speedup':>8} {'warm-up s':>10} "
+          f"{'best val':>9} {'train':>9}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpoint_path = os.path.join(tmp, 'business_lstm.pt')
+        for batch_size in args.batch_sizes:
+            baseline = None
+            for mode in args.modes:
+                try:
+                    stats = run_mode(mode, train_set, val_set, num_businesses, batch_size, args.epochs,
+                                     checkpoint_path)
+                except Exception as e:  # e.g. torch.compile without a working C++ toolchain
+                    print(f"   {batch_size:>5} {mode:<18} failed: {type(e).__name__}: {str(e).splitlines()[0]}")
+                    continue
+                if mode == 'fit':
+                    baseline = stats['epochs_per_sec']
+                speedup = f"{stats['epochs_per_sec'] / baseline:7.2f}x" if baseline else f"{'-':>8}"
+                print(f"   {batch_size:>5} {mode:<18} {stats['epochs_per_sec']:9.2f} {speedup} "
+                      f"{stats['warmup']:10.2f} {stats['best_val_loss']:9.4f} {stats['final_train_loss']:9.4f}")
+
+    print(f"\n{'='*70}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+bulk_output.py - FLOW Bulk Analysis Output
+Streams portfolio analyses to disk one compact line per business
+
+Pair with FlowAgent.iter_analyses: results are written as they are
+produced and dropped, so a 100k-business run keeps flat memory and never
+renders the text reports (unless include_report=True).
+
+Usage:
+    analyses = agent.iter_analyses(histories, user_configs, chunk_size=4096)
+    write_jsonl('outputs/flow_analysis.jsonl', analyses)    # full result per line
+    write_csv('outputs/flow_analysis.csv', analyses)        # flat columns per line
+
+Uses orjson when installed (pip install orjson), else the json module.
+
+Benchmark against analyze_many + json.dump:
+    python bulk_output.py --businesses 100000
+"""
+
+import csv
+import json
+from typing import Dict, Iterable, List, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FLAT_FIELDS = [
+    'business_id', 'business_name', 'model_version', 'week_1', 'week_2', 'week_3', 'week_4', 'min', 'avg', 'trend',
+    'has_risk', 'severity', 'worst_week', 'risk_types', 'reserve_action', 'reserve_excess',
+    'transaction_ref', 'reserve_error', 'timestamp'
+]
+
+
+def _dumps(record: Dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY, default=str)
+    return json.dumps(record, separators=(',', ':'), ensure_ascii=False, default=str).encode()
+
+
+def to_record(business_id, result: Dict, include_report: bool = False) -> Dict:
+    """Analysis result as a JSON-ready record (report only if asked for)"""
+    record = {'business_id': business_id}
+    record.update(result)
+    if include_report:
+        record['report'] = result['report']
+    else:
+        record.pop('report', None)
+    return record
+
+
+def flatten(business_id, result: Dict) -> Dict:
+    """One flat row of FLAT_FIELDS for columnar output"""
+    weeks = result['predictions']['weekly_values']
+    risk = result['risk_analysis']
+    reserve = result['auto_reserve']
+    return {
+        'business_id': business_id,
+        'business_name': result.get('business_name'),
+        'model_version': result.get('model_version'),
+        **{f'week_{i}': value for i, value in enumerate(weeks, 1)},
+        'min': result['predictions']['min'],
+        'avg': result['predictions']['avg'],
+        'trend': result['predictions']['trend'],
+        'has_risk': risk['has_risk'],
+        'severity': risk['severity'],
+        'worst_week': risk['worst_week'],
+        'risk_types': '|'.join(r['type'] for r in risk['risks']),
+        'reserve_action': reserve['action'],
+        'reserve_excess': reserve.get('excess'),
+        'transaction_ref': reserve.get('transaction', {}).get('transaction_ref'),
+        'reserve_error': reserve.get('error'),
+        'timestamp': result['timestamp']
+    }
+
+
+def write_jsonl(path: str, analyses: Iterable[Tuple], include_report: bool = False,
+                buffer_size: int = 1 << 20) -> int:
+    """
+    Writes one compact JSON line per (business_id, result)
+
+    Returns:
+        Number of lines written
+    """
+    count = 0
+    with open(path, 'wb', buffering=buffer_size) as f:
+        for business_id, result in analyses:
+            f.write(_dumps(to_record(business_id, result, include_report)))
+            f.write(b'\n')
+            count += 1
+    return count
+
+
+def write_csv(path: str, analyses: Iterable[Tuple], buffer_size: int = 1 << 20) -> int:
+    """
+    Writes one FLAT_FIELDS row per (business_id, result)
+
+    Returns:
+        Number of rows written
+    """
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8', buffering=buffer_size) as f:
+        writer = csv.DictWriter(f, fieldnames=FLAT_FIELDS)
+        writer.writeheader()
+        for business_id, result in analyses:
+            writer.writerow(flatten(business_id, result))
+            count += 1
+    return count
+
+
+def read_jsonl(path: str) -> List[Dict]:
+    """Loads a write_jsonl file back (for small files / checks)"""
+    with open(path, 'rb') as f:
+        return [json.loads(line) for line in f]
+
+
+# ==========================================
+# BENCHMARK
+# ==========================================
+
+if __name__ == "__main__":
+    import argparse
+    import logging
+    import os
+    import tempfile
+    import time
+    import tracemalloc
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default='tsf.csv')
+    parser.add_argument('--backend', default='numpy')
+    parser.add_argument('--businesses', type=int, default=100_000)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    from Flow_agent import FlowAgent
+
+    with open(args.csv, newline='') as f:
+        rows = list(csv.DictReader(f))
+    windows = [rows[s:s + 9] for s in range(len(rows) - 8)]
+    histories, configs = {}, {}
+    for i in range(args.businesses):
+        window = windows[i % len(windows)]
+        histories[i] = {col: [row[col] for row in window] for col in window[0]}
+        configs[i] = {'business_name': f'biz_{i}', 'desired_weekly_salary': 1e12,  # No transfers
+                      'current_week_cash_in': float(window[-1]['cash in']),
+                      'contract_id': f'LAN{i}', 'phone': f'2126{i:08d}', 'pot_phone': f'2127{i:08d}'}
+
+    agent = FlowAgent(backend=args.backend, forecast_cache_size=0)
+    out_dir = tempfile.mkdtemp()
+
+    def measure(label, run):
+        start = time.perf_counter()
+        path = run()
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()  # Second pass for memory (tracing slows the run down)
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"   {label:<44} {elapsed:7.2f} s  peak {peak / 1e6:8.1f} MB  "
+              f"file {os.path.getsize(path) / 1e6:7.1f} MB")
+
+    def eager_json():
+        path = os.path.join(out_dir, 'eager.json')
+        results = agent.analyze_many(histories, configs, verbose=False)
+        for result in results.values():
+            result['report']  # What the old analyze() always built
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+        return path
+
+    def streamed_jsonl():
+        path = os.path.join(out_dir, 'stream.jsonl')
+        write_jsonl(path, agent.iter_analyses(histories, configs, chunk_size=4096))
+        return path
+
+    def streamed_csv():
+        path = os.path.join(out_dir, 'stream.csv')
+        write_csv(path, agent.iter_analyses(histories, configs, chunk_size=4096))
+        return path
+
+    print(f"\n{'='*70}")
+    print(f"💾 BULK OUTPUT - {args.businesses:,} businesses ({'orjson' if orjson else 'json'})")
+    print(f"{'='*70}\n")
+    measure('analyze_many + reports + json.dump(indent=2)', eager_json)
+    measure('iter_analyses → write_jsonl', streamed_jsonl)
+    measure('iter_analyses → write_csv', streamed_csv)
+    print(f"\n{'='*70}\n")
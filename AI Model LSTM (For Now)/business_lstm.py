@@ -0,0 +1,132 @@
+"""
+business_lstm.py - FLOW LSTM Model Definition
+The PyTorch BusinessLSTM shared by trainLSTM.py and Flow_agent.py
+
+Kept in its own module so the agent only imports torch when a torch
+backend is actually used.
+"""
+
+from typing import Optional
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+
+# ==========================================
+# MODEL DEFINITION
+# ==========================================
+class BusinessLSTM(nn.Module):
+    """
+    LSTM for business cashflow forecasting
+    Predicts next 4 weeks of cash_in based on past 8 weeks
+
+    With num_businesses > 0 it is one global model for many businesses: a
+    learned embed_dim vector per business is appended to every week's
+    features, so the shared weights can tell merchants apart.
+    """
+
+    def __init__(self, num_features, hidden=64, forecast_weeks=4, num_layers=2, dropout=0.3,
+                 num_businesses=0, embed_dim=4):
+        super().__init__()
+
+        self.embedding = nn.Embedding(num_businesses, embed_dim) if num_businesses else None
+        self.lstm = nn.LSTM(
+            input_size=num_features + (embed_dim if num_businesses else 0),
+            hidden_size=hidden,
+            num_layers=num_layers,
+            batch_first=True,
+            dropout=dropout if num_layers > 1 else 0
+        )
+
+        self.fc1 = nn.Linear(hidden, hidden // 2)
+        self.fc2 = nn.Linear(hidden // 2, forecast_weeks)
+        self.dropout = nn.Dropout(dropout)
+        self.relu = nn.ReLU()
+
+    def append_embedding(self, x: torch.Tensor, business_idx: torch.Tensor) -> torch.Tensor:
+        """[batch, seq_len, features] → [batch, seq_len, features + embed_dim] (unchanged without embedding)"""
+        if self.embedding is None:
+            return x
+        embedded = self.embedding(business_idx).unsqueeze(1)  # [batch, 1, embed_dim]
+        return torch.cat([x, embedded.expand(-1, x.shape[1], -1)], dim=2)
+
+    def forward(self, x, business_idx: Optional[torch.Tensor] = None):
+        # x: [batch, seq_len, features]; a global model given no business_idx
+        # expects the embedding columns already appended (how the serving
+        # backends - ONNX, int8, numpy - receive it)
+        if business_idx is not None and self.embedding is not None:
+            x = self.append_embedding(x, business_idx)
+        lstm_out, _ = self.lstm(x)
+        last_hidden = lstm_out[:, -1, :]  # [batch, hidden]
+
+        x = self.relu(self.fc1(self.dropout(last_hidden)))
+        predictions = self.fc2(self.dropout(x))  # [batch, 4 weeks]
+
+        return predictions
+
+
+# ==========================================
+# INFERENCE
+# ==========================================
+class TorchRunner:
+    """Runs BusinessLSTM with PyTorch on scaled float32 windows"""
+
+    def __init__(self, model: nn.Module):
+        self.model = model
+
+    def __call__(self, X: np.ndarray) -> np.ndarray:
+        with torch.no_grad():
+            return self.model(torch.from_numpy(X)).numpy()
+
+
+class MCDropoutRunner:
+    """
+    Monte-Carlo dropout: K stochastic BusinessLSTM passes in one forward
+
+    The N windows are tiled to one [K*N, seq, F] batch, sample-major (rows
+    k*N .. k*N + N - 1 are pass k). The dropout masks - between LSTM layers
+    and before fc1 / fc2, where the model applies dropout in training - are
+    drawn from a per-call torch.Generator, so calls never touch the global
+    RNG: a seeded call is reproducible and concurrent calls are independent.
+    The LSTM runs layer by layer (single-layer copies of its weights) to
+    place the inter-layer masks; the serving model itself is not modified.
+    """
+
+    def __init__(self, model: BusinessLSTM):
+        lstm = model.lstm
+        self.layer_dropout = lstm.dropout
+        self.dropout = model.dropout.p
+        self.layers = []
+        for k in range(lstm.num_layers):
+            layer = nn.LSTM(lstm.input_size if k == 0 else lstm.hidden_size, lstm.hidden_size, batch_first=True)
+            layer.load_state_dict({f'{name}_l0': getattr(lstm, f'{name}_l{k}')
+                                   for name in ('weight_ih', 'weight_hh', 'bias_ih', 'bias_hh')})
+            self.layers.append(layer.eval())
+        self.fc1 = model.fc1
+        self.fc2 = model.fc2
+
+    @staticmethod
+    def _dropout(x: torch.Tensor, p: float, generator: torch.Generator) -> torch.Tensor:
+        if not p:
+            return x
+        return x * (torch.rand(x.shape, generator=generator) >= p) / (1 - p)
+
+    def __call__(self, X: np.ndarray, samples: int, seed: Optional[int] = None) -> np.ndarray:
+        """[N, seq, F] scaled windows → [samples, N, horizon] scaled predictions"""
+        generator = torch.Generator()
+        if seed is None:
+            generator.seed()
+        else:
+            generator.manual_seed(seed)
+
+        n = len(X)
+        x = torch.from_numpy(X).repeat(samples, 1, 1)
+        with torch.no_grad():
+            for k, layer in enumerate(self.layers):
+                if k:
+                    x = self._dropout(x, self.layer_dropout, generator)
+                x, _ = layer(x)
+            x = torch.relu(self.fc1(self._dropout(x[:, -1, :], self.dropout, generator)))
+            predictions = self.fc2(self._dropout(x, self.dropout, generator))
+        return predictions.numpy().reshape(samples, n, -1)
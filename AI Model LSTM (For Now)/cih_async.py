@@ -0,0 +1,246 @@
+"""
+cih_async.py - FLOW Async CIH Wallet Client
+Runs the 3-step W2W reserve flow (simulation → OTP → confirmation) for many
+users concurrently over one pooled keep-alive connection set
+
+Usage:
+    # Async code
+    async with AsyncCIHWalletAPI(base_url, max_concurrency=20) as api:
+        results = await api.reserve_many(transfers)
+
+    # Sync code / FlowAgent (drop-in for CIHWalletAPI)
+    agent = FlowAgent(cih_client='async')
+    api = PooledCIHWalletAPI(base_url)
+    result = api.reserve_to_pot(contract_id, phone, pot_phone, amount)
+
+Requires aiohttp (pip install aiohttp) unless demo_mode=True.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+class CIHRequestError(Exception):
+    """Non-200 answer from a CIH endpoint"""
+
+
+# ==========================================
+# ASYNC CLIENT
+# ==========================================
+class AsyncCIHWalletAPI:
+    """
+    Async CIH wallet client with a shared connection pool
+
+    Simulation and OTP calls are retried with exponential backoff on
+    timeouts and connection errors. The confirmation step moves money, so
+    it is only retried when retry_confirmation=True (a timed-out
+    confirmation may already have been applied on the CIH side).
+    """
+
+    def __init__(self, base_url="https://api.cih.ma", demo_mode=False,
+                 max_concurrency: int = 20, max_connections: int = 100,
+                 timeout: float = 10, retries: int = 3, backoff: float = 0.5,
+                 retry_confirmation: bool = False, metrics=None):
+        self.base_url = base_url
+        self.demo_mode = demo_mode
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_confirmation = retry_confirmation
+        self.metrics = metrics if metrics is not None else REGISTRY
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        """Keep-alive session created on first use (inside the running loop)"""
+        if self._session is None:
+            import aiohttp
+
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def _post(self, path: str, payload: Dict, params: Optional[Dict] = None,
+                    retry: bool = True) -> Dict:
+        """POST with retry/backoff on timeouts and dropped connections"""
+        import aiohttp
+
+        attempts = self.retries + 1 if retry else 1
+        for attempt in range(attempts):
+            try:
+                async with self._get_session().post(f"{self.base_url}{path}", params=params,
+                                                    json=payload) as response:
+                    if response.status != 200:
+                        raise CIHRequestError(await response.text())
+                    return await response.json()
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError):
+                if attempt == attempts - 1:
+                    raise
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                logger.debug(f"Retrying {path} in {delay:.2f}s (attempt {attempt + 2}/{attempts})")
+                await asyncio.sleep(delay)
+
+    async def reserve_to_pot(self, user_contract_id: str, user_phone: str,
+                             pot_phone: str, amount: float) -> Dict:
+        """
+        Move money to emergency pot (same contract as CIHWalletAPI.reserve_to_pot)
+
+        Returns:
+            Transaction result dict (failures carry 'stage' and transaction_ref)
+        """
+        if self.demo_mode:
+            logger.info(f"[DEMO MODE] Simulating transfer of {amount:.2f} MAD to pot")
+            await asyncio.sleep(1)  # Simulate API delay
+            return {
+                'success': True,
+                'amount': amount,
+                'transaction_ref': f'DEMO_{int(time.time())}',
+                'balance_after': 0,
+                'message': f'Successfully reserved {amount:.2f} MAD to Emergency Pot'
+            }
+
+        import aiohttp
+
+        stage, reference_id = 'simulation', None
+        try:
+            # STEP 1: Simulate W2W Transfer
+            with self.metrics.timer('cih_simulation'):
+                simulation = await self._post(
+                    '/wallet/transfer/wallet',
+                    params={'step': 'simulation'},
+                    payload={
+                        'clentNote': 'Auto-reserve by FLOW AI',
+                        'contractId': user_contract_id,
+                        'amout': str(amount),
+                        'fees': '0',
+                        'destinationPhone': pot_phone,
+                        'mobileNumber': user_phone
+                    }
+                )
+            reference_id = simulation['result']['referenceId']
+            total_fees = simulation['result']['totalFrai']
+            logger.debug(f"✓ Simulation successful - Reference: {reference_id}")
+
+            # STEP 2: Get OTP
+            stage = 'otp'
+            with self.metrics.timer('cih_otp'):
+                otp_response = await self._post('/wallet/transfer/wallet/otp',
+                                                payload={'phoneNumber': user_phone})
+            otp = otp_response['result'][0]['codeOtp']
+
+            # STEP 3: Confirm Transfer
+            stage = 'confirmation'
+            with self.metrics.timer('cih_confirmation'):
+                confirmation = await self._post(
+                    '/wallet/transfer/wallet',
+                    params={'step': 'confirmation'},
+                    payload={
+                        'mobileNumber': user_phone,
+                        'contractId': user_contract_id,
+                        'otp': otp,
+                        'referenceId': reference_id,
+                        'destinationPhone': pot_phone,
+                        'fees': total_fees
+                    },
+                    retry=self.retry_confirmation
+                )
+            new_balance = float(confirmation['result']['item1']['value'])
+            logger.info(f"✓ Transfer {reference_id} successful! New balance: {new_balance:.2f} MAD")
+
+            return {
+                'success': True,
+                'amount': amount,
+                'fees': float(total_fees),
+                'transaction_ref': reference_id,
+                'balance_after': new_balance,
+                'message': f'Successfully reserved {amount:.2f} MAD to Emergency Pot'
+            }
+
+        except asyncio.TimeoutError:
+            logger.error("API request timed out")
+            return {'success': False, 'error': 'API timeout', 'stage': stage, 'transaction_ref': reference_id}
+        except aiohttp.ClientError as e:
+            logger.error(f"API request failed: {str(e)}")
+            return {'success': False, 'error': str(e), 'stage': stage, 'transaction_ref': reference_id}
+        except Exception as e:
+            logger.error(f"Transfer failed: {str(e)}")
+            return {'success': False, 'error': str(e), 'stage': stage, 'transaction_ref': reference_id}
+
+    async def reserve_many(self, transfers: List[Dict],
+                           max_concurrency: Optional[int] = None) -> List[Dict]:
+        """
+        Runs many reserve_to_pot flows concurrently
+
+        Args:
+            transfers: [{user_contract_id, user_phone, pot_phone, amount}, ...]
+            max_concurrency: Max flows in flight (defaults to the client setting)
+
+        Returns:
+            Transaction result dicts in the same order as transfers
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+
+        async def reserve(transfer: Dict) -> Dict:
+            async with semaphore:
+                return await self.reserve_to_pot(**transfer)
+
+        return list(await asyncio.gather(*(reserve(transfer) for transfer in transfers)))
+
+
+# ==========================================
+# SYNC WRAPPER
+# ==========================================
+class PooledCIHWalletAPI:
+    """
+    Blocking facade over AsyncCIHWalletAPI (drop-in for CIHWalletAPI)
+
+    Owns a private event loop on a daemon thread so the connection pool
+    survives across calls from synchronous code like FlowAgent.
+    """
+
+    def __init__(self, base_url="https://api.cih.ma", demo_mode=False, **client_options):
+        self.base_url = base_url
+        self.demo_mode = demo_mode
+        self.client = AsyncCIHWalletAPI(base_url, demo_mode=demo_mode, **client_options)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='cih-pool', daemon=True)
+        self._thread.start()
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def reserve_to_pot(self, user_contract_id: str, user_phone: str,
+                       pot_phone: str, amount: float) -> Dict:
+        return self._run(self.client.reserve_to_pot(user_contract_id, user_phone, pot_phone, amount))
+
+    def reserve_many(self, transfers: List[Dict], max_concurrency: Optional[int] = None) -> List[Dict]:
+        return self._run(self.client.reserve_many(transfers, max_concurrency))
+
+    def close(self):
+        if self._loop.is_running():
+            self._run(self.client.close())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+        self._loop.close()
@@ -0,0 +1,237 @@
+"""
+cih_stub_server.py - FLOW Local CIH API Stand-In
+Serves the W2W wallet endpoints locally with configurable latency, error
+and timeout injection, for load tests that exercise real HTTP parsing
+
+Endpoints (same payloads as api.cih.ma):
+    POST /wallet/transfer/wallet?step=simulation   → result.referenceId, result.totalFrai
+    POST /wallet/transfer/wallet/otp               → result[0].codeOtp
+    POST /wallet/transfer/wallet?step=confirmation → result.item1.value
+    GET  /stats                                    → request / error / timeout counters
+
+Usage:
+    python cih_stub_server.py --port 8765 --latency lognormal:30:0.5 --error-rate 0.01
+
+    with CIHStubServer(latency='uniform:5:20', timeout_rate=0.001) as stub:
+        agent = FlowAgent(demo_mode=False, cih_base_url=stub.base_url)
+
+Latency specs: fixed:MS | uniform:LOW_MS:HIGH_MS | normal:MEAN_MS:STD_MS |
+               lognormal:MEDIAN_MS:SIGMA
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+FEE_RATE = 0.001
+
+
+# ==========================================
+# LATENCY MODEL
+# ==========================================
+class LatencyModel:
+    """Samples per-request latency in seconds from a parsed spec string"""
+
+    def __init__(self, spec: str = 'fixed:0', rng: Optional[random.Random] = None):
+        kind, *params = spec.split(':')
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        self.rng = rng or random.Random()
+
+        expected = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}
+        if kind not in expected or len(self.params) != expected[kind]:
+            raise ValueError(f"Bad latency spec '{spec}' (see module docstring)")
+
+    def sample(self) -> float:
+        p = self.params
+        if self.kind == 'fixed':
+            ms = p[0]
+        elif self.kind == 'uniform':
+            ms = self.rng.uniform(p[0], p[1])
+        elif self.kind == 'normal':
+            ms = self.rng.gauss(p[0], p[1])
+        else:
+            ms = p[0] * self.rng.lognormvariate(0.0, p[1])
+        return max(ms, 0.0) / 1000
+
+
+# ==========================================
+# SERVER
+# ==========================================
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # Default backlog of 5 adds 1s SYN retries under load
+
+
+class CIHStubServer:
+    """
+    Threaded local stand-in for the CIH wallet API
+
+    Args:
+        latency: Latency spec applied to every request
+        error_rate: Fraction of requests answered with HTTP 500
+        timeout_rate: Fraction of requests that hang for hang_seconds
+                      (longer than the client timeout)
+        hang_seconds: How long a "timed out" request hangs
+        initial_balance: Starting balance of every wallet (MAD)
+        seed: RNG seed for reproducible runs
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: str = 'fixed:0',
+                 error_rate: float = 0.0, timeout_rate: float = 0.0, hang_seconds: float = 15.0,
+                 initial_balance: float = 100_000_000.0, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+        self.latency = LatencyModel(latency, self.rng)
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.initial_balance = initial_balance
+
+        self.simulations: Dict[str, Dict] = {}
+        self.otps: Dict[str, str] = {}
+        self.balances: Dict[str, float] = {}
+        self.stats = {'requests': {}, 'errors': 0, 'timeouts': 0, 'confirmed': 0}
+        self._lock = threading.Lock()
+
+        self.httpd = _StubHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'CIHStubServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='cih-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ==========================================
+    # ENDPOINTS
+    # ==========================================
+
+    def simulate(self, body: Dict):
+        amount = float(body['amout'])  # Field name as spelled by the CIH API
+        reference_id = uuid.uuid4().hex[:16].upper()
+        fees = round(amount * FEE_RATE, 2)
+        with self._lock:
+            self.simulations[reference_id] = {
+                'contract_id': body['contractId'], 'phone': body['mobileNumber'],
+                'destination': body['destinationPhone'], 'amount': amount, 'fees': fees
+            }
+        return 200, {'result': {'referenceId': reference_id, 'totalFrai': f"{fees:.2f}"}}
+
+    def otp(self, body: Dict):
+        code = f"{self.rng.randrange(10**6):06d}"
+        with self._lock:
+            self.otps[body['phoneNumber']] = code
+        return 200, {'result': [{'codeOtp': code}]}
+
+    def confirm(self, body: Dict):
+        with self._lock:
+            simulation = self.simulations.pop(body.get('referenceId'), None)
+            if simulation is None:
+                return 400, {'error': 'Unknown or already confirmed referenceId'}
+            if self.otps.pop(body.get('mobileNumber'), None) != body.get('otp'):
+                return 400, {'error': 'Invalid OTP'}
+
+            phone = simulation['phone']
+            balance = self.balances.get(phone, self.initial_balance)
+            balance -= simulation['amount'] + simulation['fees']
+            self.balances[phone] = balance
+            self.stats['confirmed'] += 1
+        return 200, {'result': {'item1': {'value': f"{balance:.2f}"}}}
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive so pooled clients reuse connections
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, payload: Dict):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if urlparse(self.path).path == '/stats':
+                    with stub._lock:
+                        self._send(200, stub.stats)
+                else:
+                    self._send(404, {'error': 'Not found'})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                step = parse_qs(url.query).get('step', [''])[0]
+                route = f"{url.path}?step={step}" if step else url.path
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+
+                with stub._lock:
+                    stub.stats['requests'][route] = stub.stats['requests'].get(route, 0) + 1
+                    roll = stub.rng.random()
+
+                time.sleep(stub.latency.sample())
+                if roll < stub.timeout_rate:
+                    with stub._lock:
+                        stub.stats['timeouts'] += 1
+                    time.sleep(stub.hang_seconds)
+                elif roll < stub.timeout_rate + stub.error_rate:
+                    with stub._lock:
+                        stub.stats['errors'] += 1
+                    self._send(500, {'error': 'Injected server error'})
+                    return
+
+                if url.path == '/wallet/transfer/wallet' and step == 'simulation':
+                    status, payload = stub.simulate(body)
+                elif url.path == '/wallet/transfer/wallet' and step == 'confirmation':
+                    status, payload = stub.confirm(body)
+                elif url.path == '/wallet/transfer/wallet/otp':
+                    status, payload = stub.otp(body)
+                else:
+                    status, payload = 404, {'error': 'Not found'}
+                self._send(status, payload)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', default='fixed:0')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--timeout-rate', type=float, default=0.0)
+    parser.add_argument('--hang-seconds', type=float, default=15.0)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    server = CIHStubServer(args.host, args.port, args.latency, args.error_rate,
+                           args.timeout_rate, args.hang_seconds, seed=args.seed)
+    print(f"🧪 CIH stand-in listening on {server.base_url} (latency {args.latency}, "
+          f"errors {args.error_rate:.1%}, timeouts {args.timeout_rate:.1%})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
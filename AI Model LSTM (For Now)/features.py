@@ -0,0 +1,268 @@
+"""
+features.py - FLOW Shared Feature Engine
+Computes the 12 LSTM input features with NumPy for training and serving
+
+Both trainLSTM.py and Flow_agent.py import this module so the model is
+always served with exactly the features it was trained on.
+
+Usage:
+    from features import frame_to_arrays, engineer_features
+
+    raw, dates = frame_to_arrays(df)           # [T, 8], [T]
+    feats = engineer_features(raw, dates)      # [T, 12] in FEATURE_COLS order
+
+    # Many businesses at once: [N, T, 8] + [N, T] -> [N, T, 12]
+    feats = engineer_features(raw_block, date_block)
+
+Self-check against the pandas implementation:
+    python features.py tsf.csv
+"""
+
+import numpy as np
+from typing import Tuple
+
+# ==========================================
+# COLUMN LAYOUT
+# ==========================================
+
+# Raw weekly columns the engine reads (last axis of the raw block)
+RAW_COLS = [
+    'season_type',
+    'distributers',
+    'fixed_pay',
+    'cost_of_raw_materials',
+    'other_expenditure',
+    'cash_out',
+    'net_profit_margin',
+    'cash_in'
+]
+
+# Model inputs, in the order the scaler and LSTM expect
+FEATURE_COLS = [
+    'season_type',           # 0, 1, 2 (categorical but works as numeric)
+    'distributers',          # Number of distributors
+    'fixed_pay',             # Fixed payments
+    'cost_of_raw_materials', # Variable costs
+    'other_expenditure',     # Other expenses
+    'cash_out',              # Total expenditure
+    'net_profit_margin',     # Profitability indicator
+    'week_of_year',          # Temporal feature
+    'cash_flow',             # Derived: cash_in - cash_out
+    'profit_trend_4w',       # Rolling 4-week profit trend
+    'cash_in_lag1',          # Previous week's cash_in
+    'cash_out_lag1'          # Previous week's cash_out
+]
+
+# tsf.csv header names (note the CSV typo in raw materials)
+CSV_COLUMNS = {
+    'season_type': 'season type',
+    'distributers': 'distributers',
+    'fixed_pay': 'fixed pay',
+    'cost_of_raw_materials': 'cost of raw materails',
+    'other_expenditure': 'other expenditure',
+    'cash_out': 'cash out',
+    'net_profit_margin': 'net profit margin',
+    'cash_in': 'cash in'
+}
+
+TREND_WINDOW = 4
+
+# Weeks before a window that its features read: the 4-week trend looks back
+# TREND_WINDOW - 1 weeks, the lags one week. Serving keeps them so every row
+# of the window gets the same features as in training.
+CONTEXT_WEEKS = max(TREND_WINDOW - 1, 1)
+
+_RAW = {col: i for i, col in enumerate(RAW_COLS)}
+
+
+# ==========================================
+# INPUT CONVERSION
+# ==========================================
+
+def frame_to_arrays(df) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pulls the raw columns and week dates out of a DataFrame
+
+    Accepts either the snake_case names or the original tsf.csv headers,
+    and either a 'date' or a 'date of week start' column. A plain
+    {column: array} mapping works too (no pandas needed).
+
+    Returns:
+        raw: [T, 8] float64 array in RAW_COLS order
+        dates: [T] datetime64[D] array
+    """
+    columns = set(df.columns) if hasattr(df, 'columns') else set(df)
+    date_col = 'date' if 'date' in columns else 'date of week start'
+    dates = np.asarray(df[date_col], dtype='datetime64[D]')
+
+    raw = np.empty((len(dates), len(RAW_COLS)), dtype=np.float64)
+    for i, col in enumerate(RAW_COLS):
+        source = col if col in columns else CSV_COLUMNS[col]
+        raw[:, i] = np.asarray(df[source], dtype=np.float64)
+
+    return raw, dates
+
+
+def history_span(seq_length: int) -> int:
+    """Raw weeks to keep for one seq_length-week serving window (11 for 8 weeks)"""
+    return seq_length + CONTEXT_WEEKS
+
+
+# ==========================================
+# FEATURE ENGINEERING
+# ==========================================
+
+def iso_week(dates: np.ndarray) -> np.ndarray:
+    """ISO-8601 week number (same as pandas .dt.isocalendar().week)"""
+    days = dates.astype('datetime64[D]').astype(np.int64)
+    weekday = (days + 3) % 7                    # Monday = 0 (1970-01-01 was a Thursday)
+    thursday = (days - weekday + 3).astype('datetime64[D]')
+    year_start = thursday.astype('datetime64[Y]').astype('datetime64[D]')
+    return (thursday - year_start).astype(np.int64) // 7 + 1
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing rolling mean along the last axis with min_periods=1
+
+    NaN entries (left padding of short histories) are skipped, matching
+    pandas .rolling(window, min_periods=1).mean().
+    """
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+
+    pad = [(0, 0)] * (values.ndim - 1) + [(window - 1, 0)]
+    sums = np.lib.stride_tricks.sliding_window_view(np.pad(filled, pad), window, axis=-1).sum(axis=-1)
+    counts = np.lib.stride_tricks.sliding_window_view(np.pad(valid, pad), window, axis=-1).sum(axis=-1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+
+def lag1(values: np.ndarray) -> np.ndarray:
+    """
+    Previous week's value along the last axis
+
+    The first week of each history has no previous week; like training,
+    it is filled with the mean of that business' history.
+    """
+    lagged = np.full_like(values, np.nan)
+    lagged[..., 1:] = values[..., :-1]
+
+    valid = ~np.isnan(values)
+    mean = np.where(valid, values, 0.0).sum(axis=-1, keepdims=True) / valid.sum(axis=-1, keepdims=True)
+
+    return np.where(np.isnan(lagged), mean, lagged)
+
+
+def engineer_features(raw: np.ndarray, dates: np.ndarray) -> np.ndarray:
+    """
+    Computes all FEATURE_COLS in one vectorized pass
+
+    Args:
+        raw: [T, 8] or [N, T, 8] raw weekly values in RAW_COLS order.
+             Shorter histories may be left-padded with NaN rows.
+        dates: [T] or [N, T] week start dates (NaT for padded rows)
+
+    Returns:
+        features: [T, 12] or [N, T, 12] in FEATURE_COLS order
+                  (padded rows stay NaN)
+    """
+    single = raw.ndim == 2
+    if single:
+        raw, dates = raw[np.newaxis], dates[np.newaxis]
+
+    raw = raw.astype(np.float64, copy=False)
+    cash_in = raw[..., _RAW['cash_in']]
+    cash_out = raw[..., _RAW['cash_out']]
+    padded = np.isnan(cash_in)
+
+    features = np.empty(raw.shape[:-1] + (len(FEATURE_COLS),), dtype=np.float64)
+    features[..., :7] = raw[..., :7]            # First 7 features are raw columns
+    features[..., 7] = iso_week(dates)
+    features[..., 8] = cash_in - cash_out
+    features[..., 9] = rolling_mean(raw[..., _RAW['net_profit_margin']], TREND_WINDOW)
+    features[..., 10] = lag1(cash_in)
+    features[..., 11] = lag1(cash_out)
+    features[padded] = np.nan
+
+    return features[0] if single else features
+
+
+def engineer_features_pandas(df):
+    """
+    Reference pandas implementation of the training feature pipeline
+
+    Kept only for the parity self-check below.
+    """
+    df = df.copy()
+    df['week_of_year'] = df['date'].dt.isocalendar().week.astype(np.float64)
+    df['cash_flow'] = df['cash_in'] - df['cash_out']
+    df['profit_trend_4w'] = df['net_profit_margin'].rolling(TREND_WINDOW, min_periods=1).mean()
+    df['cash_in_lag1'] = df['cash_in'].shift(1).fillna(df['cash_in'].mean())
+    df['cash_out_lag1'] = df['cash_out'].shift(1).fillna(df['cash_out'].mean())
+    return df[FEATURE_COLS].to_numpy(dtype=np.float64)
+
+
+# ==========================================
+# PARITY SELF-CHECK
+# ==========================================
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import pandas as pd
+
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else 'tsf.csv'
+    df = pd.read_csv(csv_path)
+    df['date'] = pd.to_datetime(df['date of week start'])
+    df = df.sort_values('date').reset_index(drop=True)
+    for col, source in CSV_COLUMNS.items():
+        df[col] = df[source]
+
+    # Full series (training path)
+    raw, dates = frame_to_arrays(df)
+    expected = engineer_features_pandas(df)
+    actual = engineer_features(raw, dates)
+    np.testing.assert_allclose(actual, expected, rtol=1e-12, atol=1e-9)
+    print(f"✓ Full series parity: {len(df)} weeks x {len(FEATURE_COLS)} features")
+
+    # Every 8-week window as its own business (same rows through pandas)
+    seq_len = 8
+    starts = range(len(df) - seq_len + 1)
+    expected = np.stack([engineer_features_pandas(df.iloc[s:s + seq_len]) for s in starts])
+    windows = np.lib.stride_tricks.sliding_window_view(np.arange(len(df)), seq_len)
+    actual = engineer_features(raw[windows], dates[windows])
+    np.testing.assert_allclose(actual, expected, rtol=1e-12, atol=1e-9)
+    print(f"✓ Window block parity: {actual.shape}")
+
+    # Serving windows (last history_span weeks) against the full-series
+    # training features. From the second week on: the series' first week has
+    # no previous week and training fills its lags with the full-series mean.
+    span = history_span(seq_len)
+    full = engineer_features(raw, dates)
+    ends = range(seq_len + 1, len(df) + 1)
+    padded_raw = np.concatenate([np.full((span, raw.shape[1]), np.nan), raw])
+    padded_dates = np.concatenate([np.full(span, np.datetime64('NaT'), dtype='datetime64[D]'), dates])
+    served = engineer_features(np.stack([padded_raw[e:e + span] for e in ends]),
+                               np.stack([padded_dates[e:e + span] for e in ends]))[:, -seq_len:]
+    np.testing.assert_allclose(served, np.stack([full[e - seq_len:e] for e in ends]), rtol=1e-12, atol=1e-9)
+    print(f"✓ Serving window ({span} weeks) matches training features at {len(ends)} end points")
+
+    # Left-padded short histories match the unpadded result
+    padded_raw = np.concatenate([np.full((1, raw.shape[1]), np.nan), raw[:seq_len]])
+    padded_dates = np.concatenate([np.array(['NaT'], dtype='datetime64[D]'), dates[:seq_len]])
+    np.testing.assert_allclose(engineer_features(padded_raw, padded_dates)[1:],
+                               engineer_features(raw[:seq_len], dates[:seq_len]), rtol=1e-12)
+    print("✓ NaN left-padding parity")
+
+    # Speed: pandas per window vs one vectorized block
+    start = time.perf_counter()
+    for s in starts:
+        engineer_features_pandas(df.iloc[s:s + seq_len])
+    pandas_time = time.perf_counter() - start
+    start = time.perf_counter()
+    engineer_features(raw[windows], dates[windows])
+    numpy_time = time.perf_counter() - start
+    print(f"  pandas: {pandas_time * 1000:.1f} ms | numpy: {numpy_time * 1000:.2f} ms "
+          f"for {len(windows)} windows ({pandas_time / numpy_time:.0f}x)")
@@ -0,0 +1,315 @@
+"""
+finetune.py - FLOW Incremental Model Update
+Warm-starts the serving model on the weeks that arrived since it was
+trained, instead of a from-scratch trainLSTM.py run
+
+The current weights (business_lstm.pt) and scalers (artifact bundle) are
+loaded as they are: the scalers are not refit, so the update stays in the
+units the serving agents use. The windows are:
+
+    holdout   the last VAL_WINDOWS windows of every business - never trained
+              on, scored for both the current and the fine-tuned model
+    new       windows ending after metadata['training']['trained_through']
+              (outside the holdout)
+    replay    a random sample of the older windows (REPLAY_RATIO x new), so
+              a few epochs on recent weeks don't make the model forget
+
+The model fine-tunes for a fixed number of epochs (trainLSTM.fast_epoch,
+no early stopping or best-epoch selection), so the holdout is used for
+nothing but the publish gate: a new version is written and published
+only if its holdout loss is no worse than the current model's, within a
+tolerance. Each week one more window per business leaves the holdout
+and becomes "new".
+
+The new version's metadata 'performance' is measured on the holdout
+windows and says so ('split': 'finetune_holdout'); the test metrics of
+the last full trainLSTM.py training are kept alongside as
+'base_performance'.
+
+Businesses missing from metadata['businesses'] have no embedding row and
+are left out (retrain with trainLSTM.py to add them).
+
+Usage:
+    result = finetune('tsf.csv')                  # CURRENT registry version → v+1
+    result['published'], result['version']
+
+CLI:
+    python finetune.py --data tsf.csv
+    python finetune.py --data tsf.csv --source models --epochs 5 --no-publish
+    python finetune.py --data tsf.csv --since 2018-09-10   # model without trained_through
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+import numpy as np
+import torch
+
+import trainLSTM
+from artifact_bundle import ArtifactBundle
+from model_registry import ARTIFACT_FILES, ModelRegistry
+from sequences import WindowDataset, WindowLoader
+
+logger = logging.getLogger(__name__)
+
+# Defaults
+EPOCHS = 5
+LEARNING_RATE = 3e-4
+VAL_WINDOWS = 8  # Holdout windows per business
+REPLAY_RATIO = 2.0  # Older windows replayed per new window
+MIN_REPLAY = 64
+TOLERANCE = 0.0  # Accepted relative holdout-loss increase
+
+
+def config_from_metadata(metadata: Dict, **overrides) -> trainLSTM.Config:
+    """trainLSTM.Config describing a trained model's architecture (plus overrides)"""
+    config = metadata.get('config', {})
+    training = metadata.get('training', {})
+    fields = {
+        'SEQ_LENGTH': config.get('seq_length'),
+        'FORECAST_HORIZON': config.get('forecast_horizon'),
+        'HIDDEN_SIZE': config.get('hidden_size'),
+        'NUM_LSTM_LAYERS': config.get('num_layers'),
+        'DROPOUT': config.get('dropout'),
+        'EMBED_DIM': config.get('embed_dim'),
+        'FEATURE_COLS': config.get('feature_cols'),
+        'TARGET_COL': config.get('target_col'),
+        'BUSINESS_ID_COL': config.get('business_id_col'),
+        'BATCH_SIZE': training.get('batch_size'),
+        'SEED': training.get('seed')
+    }
+    fields = {name: value for name, value in fields.items() if value is not None}
+    fields.update(overrides)
+    return trainLSTM.Config(**fields)
+
+
+def load_source(source_dir: str):
+    """(metadata, state_dict, bundle) of one artifact directory"""
+    path = lambda arg: os.path.join(source_dir, ARTIFACT_FILES[arg])
+    if not os.path.isfile(path('bundle_path')):
+        raise FileNotFoundError(f"{source_dir} has no {ARTIFACT_FILES['bundle_path']} "
+                                f"(convert it first: python artifact_bundle.py convert {source_dir})")
+    with open(path('metadata_path')) as f:
+        metadata = json.load(f)
+    state_dict = torch.load(path('model_path'), map_location='cpu', weights_only=True)
+    return metadata, state_dict, ArtifactBundle(path('bundle_path'))
+
+
+def business_scalers_from_bundle(bundle: ArtifactBundle, num_businesses: int) -> Dict:
+    """Per-business scaling rows; a single-series model's global scalers repeated per business"""
+    arrays = bundle.arrays
+    if 'business_scaler.mean' in arrays:
+        return {
+            'feature_mean': np.array(arrays['business_scaler.mean']),
+            'feature_scale': np.array(arrays['business_scaler.scale']),
+            'target_mean': np.array(arrays['business_target_scaler.mean']),
+            'target_scale': np.array(arrays['business_target_scaler.scale'])
+        }
+    repeat = lambda name: np.repeat(np.asarray(arrays[name])[None], num_businesses, axis=0)
+    return {
+        'feature_mean': repeat('scaler.mean'), 'feature_scale': repeat('scaler.scale'),
+        'target_mean': repeat('target_scaler.mean')[:, 0], 'target_scale': repeat('target_scaler.scale')[:, 0]
+    }
+
+
+def finetune(data_path: str, source_dir: Optional[str] = None, registry_dir: str = 'models/registry',
+             output_dir: str = 'models/incremental', epochs: int = EPOCHS, learning_rate: float = LEARNING_RATE,
+             val_windows: int = VAL_WINDOWS, replay_ratio: float = REPLAY_RATIO, min_replay: int = MIN_REPLAY,
+             tolerance: float = TOLERANCE, since: Optional[str] = None, publish: bool = True) -> Dict:
+    """
+    One incremental update
+
+    Args:
+        data_path: Full history CSV (same format as trainLSTM.py's)
+        source_dir: Artifacts to start from (default: the registry's CURRENT
+                    version, else trainLSTM's models/ directory)
+        registry_dir: Registry to read CURRENT from and publish to
+        output_dir: Where the candidate's artifact set is written
+        epochs, learning_rate: Fine-tuning budget
+        val_windows, replay_ratio, min_replay: Window selection (see module docstring)
+        tolerance: Publish if candidate loss <= current loss x (1 + tolerance)
+        since: Treat windows ending after this date as new (for models whose
+               metadata has no training.trained_through)
+        publish: Publish an accepted candidate to the registry
+
+    Returns:
+        {'accepted', 'published', 'version', 'baseline_val_loss', 'val_loss',
+        'new_windows', 'replay_windows', 'holdout_windows', 'seconds', ...}
+    """
+    started = time.perf_counter()
+    registry = ModelRegistry(registry_dir)
+    base_version = None
+    if source_dir is None:
+        base_version = registry.current()
+        source_dir = (os.path.dirname(registry.artifact_paths(base_version)['metadata_path'])
+                      if base_version else trainLSTM.Config.OUTPUT_DIR)
+    metadata, state_dict, bundle = load_source(source_dir)
+    trained_through = since or metadata.get('training', {}).get('trained_through')
+    if trained_through is None:
+        raise ValueError(f"{source_dir} metadata has no training.trained_through - pass since=YYYY-MM-DD "
+                         f"(the last week the model was trained on)")
+
+    config = config_from_metadata(metadata, DATA_PATH=data_path, EPOCHS=epochs, LEARNING_RATE=learning_rate,
+                                  FAST_TRAINING=True)
+    torch.manual_seed(config.SEED)
+    global_model = 'businesses' in metadata
+    businesses = metadata['businesses'] if global_model else None
+    logger.info(f"🔁 Incremental update of {base_version or source_dir} "
+                f"(trained through {trained_through}) on {data_path}")
+
+    # History, scaled with the model's own scalers
+    df, csv_businesses = trainLSTM.load_data(config)
+    trainLSTM.add_features(df, config)
+    if global_model:
+        index = {str(bid): row for row, bid in enumerate(businesses)}
+        unknown = sorted(set(csv_businesses) - set(index))
+        if unknown:
+            logger.warning(f"Skipping {len(unknown)} business(es) the model has no embedding for "
+                           f"(retrain to add them): {unknown[:5]}")
+        df = df[df[config.BUSINESS_ID_COL].isin(index)].reset_index(drop=True)
+        df['business_idx'] = df[config.BUSINESS_ID_COL].map(index).to_numpy()
+        num_businesses = len(businesses)
+    else:
+        num_businesses = len(csv_businesses)  # One series per business, shared global scalers
+    if df.empty:
+        raise ValueError(f"No rows of {data_path} belong to a business the model knows")
+    business_scalers = business_scalers_from_bundle(bundle, num_businesses)
+    trainLSTM.scale_by_business(df, config, business_scalers)
+
+    features = df[config.FEATURE_COLS].to_numpy()
+    targets = df[config.TARGET_COL].to_numpy()
+    groups = df['business_idx'].to_numpy()
+    weeks = df['date'].to_numpy()
+    windows = lambda starts: WindowDataset(features, targets, config.SEQ_LENGTH, config.FORECAST_HORIZON,
+                                           starts=starts, groups=groups)
+
+    # Holdout = each business's last val_windows windows; new = ending after trained_through
+    valid = windows(None).starts
+    window_end = weeks[valid + config.SEQ_LENGTH + config.FORECAST_HORIZON - 1]
+    window_group = groups[valid]
+    from_end = np.zeros(len(valid), dtype=np.int64)
+    for business in np.unique(window_group):
+        members = np.flatnonzero(window_group == business)
+        from_end[members] = np.arange(len(members))[::-1]
+    holdout = from_end < val_windows
+    new = ~holdout & (window_end > np.datetime64(trained_through))
+    older = np.flatnonzero(~holdout & ~new)
+    rng = np.random.default_rng(config.SEED)
+    replay_size = min(len(older), max(min_replay, int(replay_ratio * new.sum()))) if new.any() else 0
+    replay = np.sort(rng.choice(older, size=replay_size, replace=False))
+
+    result = {'base': base_version or source_dir, 'trained_through': trained_through,
+              'new_windows': int(new.sum()), 'replay_windows': int(replay_size),
+              'holdout_windows': int(holdout.sum()), 'accepted': False, 'published': False, 'version': None}
+    if not new.any():
+        logger.info("✓ No windows after trained_through outside the holdout - nothing to fine-tune")
+        result['seconds'] = time.perf_counter() - started
+        return result
+
+    train_set = windows(np.sort(np.concatenate((valid[new], valid[replay]))))
+    holdout_set = windows(valid[holdout])
+    logger.info(f"   {result['new_windows']} new + {result['replay_windows']} replayed windows, "
+                f"{result['holdout_windows']} holdout")
+
+    model = trainLSTM.build_model(config, num_businesses if global_model else 0)
+    model.load_state_dict(state_dict)
+    holdout_tensors = holdout_set.tensors()
+    baseline = trainLSTM.fast_validation_loss(model, model, holdout_tensors)
+
+    # Fixed epochs: the holdout must not pick the weights it then judges
+    optimizer, _ = trainLSTM.make_optimizer(model, config)
+    train_tensors = train_set.tensors()
+    train_losses = [float(trainLSTM.fast_epoch(model, model, optimizer, train_tensors, config.BATCH_SIZE))
+                    for _ in range(epochs)]
+    val_loss = trainLSTM.fast_validation_loss(model, model, holdout_tensors)
+    accepted = val_loss <= baseline * (1 + tolerance)
+    result.update(baseline_val_loss=baseline, val_loss=float(val_loss), epochs_trained=epochs,
+                  final_train_loss=train_losses[-1] if train_losses else None, accepted=bool(accepted))
+    logger.info(f"   Holdout loss {baseline:.6f} → {val_loss:.6f} "
+                f"({'accepted' if accepted else 'regressed - not published'})")
+
+    if accepted:
+        os.makedirs(output_dir, exist_ok=True)
+        torch.save(model.state_dict(), os.path.join(output_dir, ARTIFACT_FILES['model_path']))
+        holdout_loader = WindowLoader(holdout_set, batch_size=config.BATCH_SIZE)
+        performance, preds_real, actuals_real, rows = trainLSTM.evaluate(model, holdout_loader, config,
+                                                                          business_scalers)
+        quantized_model, quantized_metrics = trainLSTM.quantize(model, holdout_loader, config, business_scalers,
+                                                                performance, preds_real, actuals_real, rows)
+        new_metadata = dict(metadata)
+        new_metadata.pop('registry', None)
+        new_metadata['trained_at'] = datetime.now().isoformat()
+        new_metadata['training'] = dict(metadata.get('training', {}), **{
+            'data_path': data_path,
+            'data_end': str(weeks.max().astype('datetime64[D]')),
+            'trained_through': str(window_end[~holdout].max().astype('datetime64[D]')),
+            'finetune': {
+                'base': result['base'], 'epochs': epochs, 'learning_rate': learning_rate,
+                'new_windows': result['new_windows'], 'replay_windows': result['replay_windows'],
+                'holdout_windows': result['holdout_windows'], 'baseline_val_loss': baseline,
+                'seconds': time.perf_counter() - started
+            }
+        })
+        # Holdout metrics, labelled as such - not comparable to a trainLSTM test split
+        scope = {'split': 'finetune_holdout', 'windows': result['holdout_windows']}
+        new_metadata.update(performance=dict(performance, **scope), quantized_int8=dict(quantized_metrics, **scope),
+                            base_performance=metadata.get('base_performance', metadata.get('performance')),
+                            best_val_loss=float(val_loss),
+                            epochs_trained=metadata.get('epochs_trained', 0) + epochs)
+
+        global_scaler = SimpleNamespace(mean_=bundle.arrays['scaler.mean'], scale_=bundle.arrays['scaler.scale'])
+        target_scaler = SimpleNamespace(mean_=bundle.arrays['target_scaler.mean'],
+                                        scale_=bundle.arrays['target_scaler.scale'])
+        X_example, _, b_example = holdout_set.tensors()
+        onnx_exported = trainLSTM.save_artifacts(model, quantized_model, new_metadata, global_scaler, target_scaler,
+                                                 business_scalers if global_model else None, X_example, b_example,
+                                                 output_dir)
+        if publish and not onnx_exported:
+            raise RuntimeError(f"ONNX export failed - {output_dir} was not published (see the log above)")
+        if publish:
+            result['version'] = registry.publish(output_dir)
+            result['published'] = True
+
+    result['seconds'] = time.perf_counter() - started
+    logger.info(f"✓ Incremental update finished in {result['seconds']:.1f}s")
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=trainLSTM.Config.DATA_PATH)
+    parser.add_argument('--source', help='artifact directory (default: registry CURRENT, else models/)')
+    parser.add_argument('--registry', default='models/registry')
+    parser.add_argument('--output', default='models/incremental')
+    parser.add_argument('--epochs', type=int, default=EPOCHS)
+    parser.add_argument('--lr', type=float, default=LEARNING_RATE)
+    parser.add_argument('--val-windows', type=int, default=VAL_WINDOWS)
+    parser.add_argument('--replay-ratio', type=float, default=REPLAY_RATIO)
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--since', help='last trained week, for metadata without trained_through')
+    parser.add_argument('--no-publish', action='store_true')
+    args = parser.parse_args()
+
+    result = finetune(args.data, args.source, args.registry, args.output, args.epochs, args.lr,
+                      args.val_windows, args.replay_ratio, tolerance=args.tolerance, since=args.since,
+                      publish=not args.no_publish)
+
+    print(f"\n{'='*70}")
+    print(f"🔁 INCREMENTAL UPDATE - {result['base']}")
+    print(f"{'='*70}\n")
+    print(f"   windows: {result['new_windows']} new, {result['replay_windows']} replayed, "
+          f"{result['holdout_windows']} holdout")
+    if 'val_loss' in result:
+        print(f"   holdout loss: {result['baseline_val_loss']:.6f} → {result['val_loss']:.6f} "
+              f"({'accepted' if result['accepted'] else 'regressed'})")
+    print(f"   published: {result['version'] if result['published'] else 'no'}")
+    print(f"   time: {result['seconds']:.1f}s")
+    print(f"\n{'='*70}\n")
@@ -0,0 +1,119 @@
+"""
+forecast_cache.py - FLOW Forecast Cache
+Bounded LRU/TTL cache of 4-week forecasts keyed by the input window content
+
+Dashboards and the app's flow tab re-run the analysis for businesses whose
+weekly data has not changed. The key is a hash of the exact rows the model
+sees (raw values + week dates) plus the model version, so any data edit or
+new model gives a new key and stale entries simply age out.
+
+Usage:
+    cache = ForecastCache(max_entries=4096, ttl_seconds=3600)
+    key = window_key(raw, dates, model_version)
+    predictions = cache.get(key)
+    if predictions is None:
+        predictions = model(...)
+        cache.put(key, predictions)
+    cache.stats()   # {'hits': ..., 'misses': ..., 'evictions': ..., ...}
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+import numpy as np
+
+
+def window_key(raw: np.ndarray, dates: np.ndarray, model_version: str,
+               business_id: Optional[Hashable] = None) -> tuple:
+    """
+    Content hash of one forecast input
+
+    Args:
+        raw: [T, 8] raw weekly values feeding the window
+        dates: [T] week start dates
+        model_version: Version of the model that will produce the forecast
+        business_id: Business the forecast is for (global models only - their
+                     forecast depends on the business, not just the window)
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(raw, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(dates, dtype='datetime64[D]').tobytes())
+    if business_id is None:
+        return model_version, digest.hexdigest()
+    return model_version, str(business_id), digest.hexdigest()
+
+
+class ForecastCache:
+    """
+    Thread-safe LRU cache with an optional time-to-live
+
+    Args:
+        max_entries: Entries kept before the least recently used is evicted
+        ttl_seconds: Entry lifetime (None = until evicted)
+        clock: Time source (seconds)
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: Optional[float] = None,
+                 clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        """Cached forecast (a copy) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds is not None \
+                    and self.clock() - entry[1] > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0].copy()
+
+    def put(self, key: Hashable, value: np.ndarray):
+        with self._lock:
+            self._entries[key] = (np.array(value, copy=True), self.clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drops every entry (e.g. after a model reload)"""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
@@ -0,0 +1,258 @@
+"""
+forecast_server.py - FLOW Forecast Service
+Serves FlowAgent forecasts over HTTP with dynamic micro-batching
+
+Concurrent single-business requests are queued and coalesced: the batcher
+takes whatever is waiting, keeps collecting until max_batch_size requests
+or max_wait_ms have passed, runs ONE stacked feature + LSTM pass on a
+worker thread, and scatters the rows back to the waiting requests. If
+the stacked pass fails, its requests are re-run one by one so only the
+bad ones get the error.
+
+Endpoints:
+    POST /forecast  {"business_id": "...", "history": {column: [...]}}
+                    → {"business_id", "predictions": [4], "model_version", "batch_size"}
+    GET  /stats     → request / batch counters, p50/p99 latency, throughput
+    GET  /metrics   → agent stage timings + counters (Prometheus text format)
+    GET  /health
+
+Usage:
+    python forecast_server.py --port 8080 --backend numpy --max-batch-size 64 --max-wait-ms 5
+    python forecast_server.py --registry models/registry --watch-interval 30   # hot-swaps on publish
+
+Requires aiohttp (pip install aiohttp).
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from features import frame_to_arrays, history_span
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================
+# STATS
+# ==========================================
+class BatchStats:
+    """Request latency / batch size counters over a sliding window"""
+
+    def __init__(self, window: int = 10_000):
+        self.latencies = deque(maxlen=window)     # (finished_at, seconds)
+        self.batch_sizes = deque(maxlen=window)
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+
+    def record_batch(self, size: int):
+        self.batches += 1
+        self.batch_sizes.append(size)
+
+    def record_request(self, latency: float):
+        self.requests += 1
+        self.latencies.append((time.perf_counter(), latency))
+
+    def snapshot(self) -> Dict:
+        stats = {'requests': self.requests, 'batches': self.batches, 'errors': self.errors}
+        if self.latencies:
+            finished, latencies = np.array(self.latencies).T
+            span = finished[-1] - (finished[0] - latencies[0])
+            stats.update({
+                'avg_batch_size': float(np.mean(self.batch_sizes)),
+                'p50_ms': float(np.percentile(latencies, 50) * 1000),
+                'p99_ms': float(np.percentile(latencies, 99) * 1000),
+                'throughput_rps': float(len(latencies) / span) if span > 0 else 0.0
+            })
+        return stats
+
+
+# ==========================================
+# MICRO-BATCHER
+# ==========================================
+class MicroBatcher:
+    """
+    Coalesces concurrent forecast requests into stacked forward passes
+
+    Args:
+        agent: FlowAgent (any backend)
+        max_batch_size: Max requests per forward pass
+        max_wait_ms: Max time the first request of a batch waits for company
+    """
+
+    def __init__(self, agent, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self.agent = agent
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stats = BatchStats()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # One forward pass at a time; the next batch fills up while it runs
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='forecast-batch')
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+        self._executor.shutdown(wait=True)
+
+    async def predict(self, raw: np.ndarray, dates: np.ndarray, business_id: Optional[str] = None) -> Dict:
+        """Queues one history, resolves with its [4] forecast, model version and batch size"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((raw, dates, business_id, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> List:
+        """First waiting request, then more until the size or time limit"""
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            arrays = [(raw, dates) for raw, dates, _, _, _ in batch]
+            business_ids = [business_id for _, _, business_id, _, _ in batch]
+            loaded = self.agent.loaded  # A hot swap mid-batch doesn't change this batch's answer
+            try:
+                predictions = await loop.run_in_executor(self._executor, partial(self.agent.predict_arrays, arrays,
+                                                                                 loaded=loaded,
+                                                                                 business_ids=business_ids))
+            except Exception as e:
+                if len(batch) == 1:
+                    predictions = [e]
+                else:
+                    # One bad request must not fail the others: isolate it
+                    logger.warning(f"Batch of {len(batch)} failed ({e}) - retrying its requests one by one")
+                    predictions = await loop.run_in_executor(self._executor, self._predict_each, arrays,
+                                                             business_ids, loaded)
+
+            self.stats.record_batch(len(batch))
+            now = time.perf_counter()
+            for (*_, future, queued_at), row in zip(batch, predictions):
+                if isinstance(row, Exception):
+                    logger.error(f"Forecast failed: {row}")
+                    self.stats.errors += 1
+                    if not future.done():
+                        future.set_exception(row)
+                    continue
+                if not future.done():  # Client may have gone away
+                    future.set_result({'predictions': row, 'model_version': loaded.version,
+                                       'batch_size': len(batch)})
+                self.stats.record_request(now - queued_at)
+
+    def _predict_each(self, arrays: List, business_ids: List, loaded) -> List:
+        """Per-request forecasts of a failed batch: a [4] row or the request's exception"""
+        results = []
+        for history, business_id in zip(arrays, business_ids):
+            try:
+                results.append(self.agent.predict_arrays([history], loaded=loaded, business_ids=[business_id])[0])
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+# ==========================================
+# HTTP APP
+# ==========================================
+def create_app(agent, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+    """aiohttp application serving agent forecasts through a MicroBatcher"""
+    from aiohttp import web
+
+    batcher = MicroBatcher(agent, max_batch_size, max_wait_ms)
+
+    async def forecast(request):
+        try:
+            body = await request.json()
+            raw, dates = frame_to_arrays(body['history'])
+        except (ValueError, KeyError, TypeError) as e:
+            return web.json_response({'error': f'Bad request: {e}'}, status=400)
+        seq_length = agent.SEQ_LENGTH
+        if len(raw) < seq_length:
+            return web.json_response({'error': f'Need at least {seq_length} weeks of data'}, status=400)
+
+        order = np.argsort(dates, kind='stable')[-history_span(seq_length):]
+        try:
+            result = await batcher.predict(raw[order], dates[order], body.get('business_id'))
+        except ValueError as e:
+            return web.json_response({'error': f'Bad request: {e}'}, status=400)
+        except Exception as e:
+            return web.json_response({'error': f'Forecast failed: {e}'}, status=500)
+        return web.json_response({
+            'business_id': body.get('business_id'),
+            'predictions': result['predictions'].tolist(),
+            'model_version': result['model_version'],
+            'batch_size': result['batch_size']
+        })
+
+    async def stats(request):
+        return web.json_response(dict(batcher.stats.snapshot(), max_batch_size=batcher.max_batch_size,
+                                      max_wait_ms=batcher.max_wait * 1000))
+
+    async def metrics(request):
+        return web.Response(text=agent.metrics.to_prometheus(), content_type='text/plain', charset='utf-8')
+
+    async def health(request):
+        return web.json_response({'status': 'ok', 'backend': agent.backend, 'model_version': agent.model_version})
+
+    async def on_startup(app):
+        await batcher.start()
+
+    async def on_cleanup(app):
+        await batcher.stop()
+
+    app = web.Application()
+    app['batcher'] = batcher
+    app.router.add_post('/forecast', forecast)
+    app.router.add_get('/stats', stats)
+    app.router.add_get('/metrics', metrics)
+    app.router.add_get('/health', health)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--backend', default='torch')
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--registry', help='model registry root (default: the models/ artifacts)')
+    parser.add_argument('--watch-interval', type=float, default=30.0,
+                        help='seconds between registry CURRENT checks')
+    args = parser.parse_args()
+
+    from aiohttp import web
+    from Flow_agent import FlowAgent
+
+    agent = FlowAgent(backend=args.backend, registry=args.registry)
+    if args.registry:
+        from model_registry import RegistryWatcher
+        RegistryWatcher(agent, interval=args.watch_interval).start()
+    web.run_app(create_app(agent, args.max_batch_size, args.max_wait_ms), host=args.host, port=args.port)
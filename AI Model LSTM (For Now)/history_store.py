@@ -0,0 +1,327 @@
+"""
+history_store.py - FLOW Streaming Business History
+Keeps the last 8 engineered feature rows of many businesses in ring buffers
+
+Instead of handing the agent a DataFrame of 8+ weeks per call, push one
+new week per business as it closes. Each push computes that week's 12
+features in O(1) from running state (previous week for the lags, a 4-week
+ring of net_profit_margin for the trend) and writes them into a shared
+[capacity, 8, 12] block, so forecasting many businesses is one gather.
+
+The features follow the training pipeline over the whole pushed history:
+the lags read the real previous week and the 4-week trend spans weeks
+before the window. The very first week pushed has no previous week and
+uses its own cash_in / cash_out as lag (training fills it with the series
+mean); it leaves the window after 8 more pushes.
+
+Usage:
+    store = HistoryStore()
+    store.extend('shop_a', df_a)                 # backfill from a DataFrame
+    store.push('shop_a', week_row, '2025-12-01')  # then one week at a time
+    window = store.window('shop_a')              # [8, 12] unscaled features
+    ids, windows = store.windows()               # every ready business
+    forecast = agent.predict_windows(windows, business_ids=ids)
+
+Self-check + timing:
+    python history_store.py tsf.csv
+"""
+
+from datetime import date as Date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from features import (CSV_COLUMNS, FEATURE_COLS, RAW_COLS, TREND_WINDOW, engineer_features, frame_to_arrays,
+                      history_span)
+
+_CASH_IN = RAW_COLS.index('cash_in')
+_CASH_OUT = RAW_COLS.index('cash_out')
+_MARGIN = RAW_COLS.index('net_profit_margin')
+
+
+def _week_of_year(day) -> int:
+    return Date.fromordinal(int(np.datetime64(day, 'D').astype(np.int64)) + 719163).isocalendar()[1]
+
+
+class BusinessHistory:
+    """
+    Lightweight handle on one business in a HistoryStore
+
+    The slot is looked up on every access: HistoryStore.remove moves
+    another business into the freed slot, so a cached index would point
+    at the wrong ring buffer.
+    """
+
+    __slots__ = ('store', 'business_id')
+
+    def __init__(self, store: 'HistoryStore', business_id):
+        self.store = store
+        self.business_id = business_id
+
+    @property
+    def slot(self) -> int:
+        try:
+            return self.store._slots[self.business_id]
+        except KeyError:
+            raise KeyError(f"Business {self.business_id!r} was removed from the store") from None
+
+    @property
+    def weeks(self) -> int:
+        return int(self.store._count[self.slot])
+
+    @property
+    def ready(self) -> bool:
+        return self.weeks >= self.store.seq_length
+
+    def push(self, row, day):
+        self.store.push(self.business_id, row, day)
+
+    def window(self) -> np.ndarray:
+        return self.store.window(self.business_id)
+
+
+class HistoryStore:
+    """
+    Array-backed ring buffers of engineered weekly features, one slot per business
+
+    Args:
+        seq_length: Feature rows kept per business (the LSTM window)
+        capacity: Initial number of business slots (grows by doubling)
+        dtype: Storage dtype of the feature block (float32 halves memory)
+    """
+
+    __slots__ = ('seq_length', 'dtype', '_slots', '_ids', '_features', '_margins', '_count',
+                 '_last_day', '_last_cash')
+
+    def __init__(self, seq_length: int = 8, capacity: int = 1024, dtype=np.float64):
+        self.seq_length = seq_length
+        self.dtype = np.dtype(dtype)
+        self._slots: Dict = {}                                # business_id -> slot
+        self._ids: List = []                                  # slot -> business_id
+        self._features = np.zeros((capacity, seq_length, len(FEATURE_COLS)), dtype=self.dtype)
+        self._margins = np.zeros((capacity, TREND_WINDOW))
+        self._count = np.zeros(capacity, dtype=np.int64)
+        self._last_day = np.zeros(capacity, dtype=np.int64)
+        self._last_cash = np.zeros((capacity, 2))            # previous week's cash_in, cash_out
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, business_id) -> bool:
+        return business_id in self._slots
+
+    def __getitem__(self, business_id) -> BusinessHistory:
+        if business_id not in self._slots:
+            raise KeyError(business_id)
+        return BusinessHistory(self, business_id)
+
+    @property
+    def capacity(self) -> int:
+        return len(self._count)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the ring buffers (excluding the id → slot dict)"""
+        return sum(a.nbytes for a in (self._features, self._margins, self._count,
+                                      self._last_day, self._last_cash))
+
+    # ==========================================
+    # SLOTS
+    # ==========================================
+
+    def _slot(self, business_id) -> int:
+        slot = self._slots.get(business_id)
+        if slot is None:
+            slot = len(self._slots)
+            if slot == len(self._count):
+                self._grow()
+            self._slots[business_id] = slot
+            self._ids.append(business_id)
+        return slot
+
+    def _grow(self):
+        for name in ('_features', '_margins', '_count', '_last_day', '_last_cash'):
+            old = getattr(self, name)
+            setattr(self, name, np.concatenate([old, np.zeros_like(old)]))
+
+    def remove(self, business_id):
+        """Frees a business' slot (the last slot is moved into the hole)"""
+        slot = self._slots.pop(business_id)
+        moved = self._ids.pop()
+        last = len(self._ids)
+        if slot != last:
+            for array in (self._features, self._margins, self._count, self._last_day, self._last_cash):
+                array[slot] = array[last]
+            self._slots[moved] = slot
+            self._ids[slot] = moved
+        self._count[last] = 0
+
+    # ==========================================
+    # UPDATES
+    # ==========================================
+
+    def push(self, business_id, row, day):
+        """
+        Appends one week to a business' history in O(1)
+
+        Args:
+            business_id: Business key (created on first push)
+            row: The week's raw values - a mapping with RAW_COLS (or tsf.csv
+                 header) keys, or a sequence in RAW_COLS order
+            day: Week start date (str, date or datetime64); weeks must be
+                 pushed in date order
+        """
+        if hasattr(row, 'get'):
+            row = [row[col] if col in row else row[CSV_COLUMNS[col]] for col in RAW_COLS]
+        raw = np.asarray(row, dtype=np.float64)
+        day = np.datetime64(day, 'D')
+
+        slot = self._slot(business_id)
+        count = self._count[slot]
+        day_number = day.astype(np.int64)
+        if count and day_number <= self._last_day[slot]:
+            raise ValueError(f"Business {business_id}: week {day} is not after the last pushed week")
+
+        cash_in, cash_out = raw[_CASH_IN], raw[_CASH_OUT]
+        lag_in, lag_out = self._last_cash[slot] if count else (cash_in, cash_out)
+
+        margins = self._margins[slot]
+        margins[count % TREND_WINDOW] = raw[_MARGIN]
+        seen = min(count + 1, TREND_WINDOW)
+
+        features = self._features[slot, count % self.seq_length]
+        features[:7] = raw[:7]
+        features[7] = _week_of_year(day)
+        features[8] = cash_in - cash_out
+        features[9] = margins[:seen].sum() / seen
+        features[10] = lag_in
+        features[11] = lag_out
+
+        self._last_cash[slot] = (cash_in, cash_out)
+        self._last_day[slot] = day_number
+        self._count[slot] = count + 1
+
+    def extend(self, business_id, history):
+        """Pushes every week of a DataFrame / {column: array} history (oldest first)"""
+        raw, dates = frame_to_arrays(history)
+        for i in np.argsort(dates, kind='stable'):
+            self.push(business_id, raw[i], dates[i])
+
+    # ==========================================
+    # WINDOWS
+    # ==========================================
+
+    def _order(self, counts: np.ndarray) -> np.ndarray:
+        """Ring positions of each slot's rows, oldest first"""
+        return (counts[:, np.newaxis] + np.arange(self.seq_length)) % self.seq_length
+
+    def window(self, business_id) -> np.ndarray:
+        """[8, 12] unscaled feature window (oldest week first)"""
+        slot = self._slots[business_id]
+        count = self._count[slot]
+        if count < self.seq_length:
+            raise ValueError(f"Business {business_id}: {count} week(s) pushed, need {self.seq_length}")
+        return self._features[slot, self._order(self._count[[slot]])[0]].astype(np.float64)
+
+    def windows(self, business_ids: Optional[Iterable] = None) -> Tuple[List, np.ndarray]:
+        """
+        Feature windows of many businesses in one gather
+
+        Args:
+            business_ids: Businesses to return (default: every business with
+                          at least seq_length weeks)
+
+        Returns:
+            (business_ids, [N, 8, 12] float64 windows)
+        """
+        if business_ids is None:
+            business_ids = [bid for bid, slot in self._slots.items() if self._count[slot] >= self.seq_length]
+        else:
+            business_ids = list(business_ids)
+            short = [bid for bid in business_ids if self._count[self._slots[bid]] < self.seq_length]
+            if short:
+                raise ValueError(f"{len(short)} business(es) have fewer than {self.seq_length} weeks "
+                                 f"(e.g. {short[0]})")
+
+        slots = np.fromiter((self._slots[bid] for bid in business_ids), dtype=np.int64, count=len(business_ids))
+        block = self._features[slots[:, np.newaxis], self._order(self._count[slots])]
+        return business_ids, block.astype(np.float64, copy=False)
+
+
+# ==========================================
+# PARITY SELF-CHECK
+# ==========================================
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import pandas as pd
+
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else 'tsf.csv'
+    df = pd.read_csv(csv_path)
+    df['date'] = pd.to_datetime(df['date of week start'])
+    df = df.sort_values('date').reset_index(drop=True)
+    raw, dates = frame_to_arrays(df)
+    seq_len = 8
+
+    # After every push, the window equals the training features of the same weeks
+    store = HistoryStore(seq_len, capacity=1)
+    reference = engineer_features(raw, dates)
+    for t in range(len(raw)):
+        store.push('biz', raw[t], dates[t])
+        if t >= seq_len:  # Past the first week's lag fill
+            np.testing.assert_allclose(store.window('biz'), reference[t - seq_len + 1:t + 1], rtol=1e-12)
+    print(f"✓ Streaming parity with training features over {len(raw) - seq_len} windows")
+
+    # Same history, same window + forecast as the DataFrame serving path
+    # (FlowAgent keeps the last history_span weeks; 9+ weeks so the first
+    # window week has a real previous week on both paths)
+    span = history_span(seq_len)
+    for weeks in range(seq_len + 1, 3 * span):
+        tail = df.tail(weeks)
+        store = HistoryStore(seq_len, capacity=1)
+        store.extend('biz', tail)
+        served = engineer_features(*(column[-span:] for column in frame_to_arrays(tail)))[-seq_len:]
+        np.testing.assert_allclose(store.window('biz'), served, rtol=1e-12)
+    print(f"✓ Store window matches the serving window for {seq_len + 1}-{3 * span - 1} week histories")
+    try:
+        from Flow_agent import FlowAgent
+        agent = FlowAgent(backend='numpy')
+    except (ImportError, OSError) as e:
+        print(f"  (forecast parity skipped: {e})")
+    else:
+        for weeks in (seq_len + 1, span, 20, 52):
+            store = HistoryStore(seq_len, capacity=1)
+            store.extend('biz', df.tail(weeks))
+            np.testing.assert_allclose(agent.predict_from_store(store).to_numpy()[0],
+                                       agent.predict_cashflow(df.tail(weeks)), rtol=1e-9)
+        print("✓ predict_from_store == predict_cashflow for the same history")
+
+    # Handles follow their business when remove() moves the last slot into a hole
+    store = HistoryStore(seq_len, capacity=4)
+    for b in range(3):
+        store.extend(b, df.iloc[b * 10:b * 10 + seq_len])
+    handle, expected = store[2], store.window(2)
+    store.remove(0)
+    assert handle.slot == 0 and np.array_equal(handle.window(), expected)
+    print("✓ Handles stay valid across remove()")
+
+    # Many businesses: pushed offsets of the same series, gathered in one call
+    n_businesses, weeks = 20_000, 12
+    store = HistoryStore(seq_len)
+    start = time.perf_counter()
+    for b in range(n_businesses):
+        offset = b % (len(raw) - weeks)
+        for t in range(offset, offset + weeks):
+            store.push(b, raw[t], dates[t])
+    push_time = (time.perf_counter() - start) / (n_businesses * weeks)
+
+    start = time.perf_counter()
+    ids, block = store.windows()
+    gather_time = time.perf_counter() - start
+    offset = 7 % (len(raw) - weeks)
+    np.testing.assert_allclose(block[7], reference[offset + weeks - seq_len:offset + weeks], rtol=1e-12)
+
+    print(f"✓ {len(ids):,} businesses resident: {store.nbytes / 1e6:.1f} MB of ring buffers "
+          f"for {store.capacity:,} slots ({store.nbytes / store.capacity:.0f} B/business)")
+    print(f"  push: {push_time * 1e6:.1f} µs/week | windows(): {gather_time * 1000:.1f} ms for {block.shape}")
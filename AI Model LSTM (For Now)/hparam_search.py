@@ -0,0 +1,316 @@
+"""
+hparam_search.py - FLOW Hyperparameter Search
+Successive halving over trainLSTM configurations under a CPU-time budget,
+then one full training of the winner
+
+Random configurations from SEARCH_SPACE (plus the Config defaults) each
+train min_epochs epochs, which is rung 0. The best 1/eta by validation
+loss so far move on to eta times as many epochs, and so on until one
+remains or max_epochs is reached. Trials resume where they stopped: the
+model, Adam and LR-schedule state stay in memory, so a promoted
+configuration never repeats epochs. The data pipeline runs once, and
+windows are built once per SEQ_LENGTH. Every trial is scored on the same
+validation target weeks: only val windows whose first forecast week is at
+least max(SEQ_LENGTH) weeks into a business's val split count, so a longer
+window does not mean a different (smaller) validation set.
+
+Every trial epoch's CPU time (time.process_time, all threads) counts
+against the budget. The budget is checked before every epoch, so the
+search overshoots it by at most one epoch. Before each rung the
+projected cost is checked: each survivor's measured CPU per epoch times
+its remaining epochs. If it does not fit, fewer configurations are
+promoted; the search stops when not even the leader can be. The final training of the winner (trainLSTM.train
+with its normal epochs and early stopping) is outside the budget. Its
+business_metadata.json, the file FlowAgent reads the model config from,
+carries the winning config plus an 'hparam_search' section with the
+budget used and every rung's results. Its plots go to OUTPUT_DIR/plots
+unless base sets PLOTS_DIR.
+
+Usage:
+    result = search({'DATA_PATH': 'tsf.csv'}, budget_seconds=600)
+    result['winner']               # {'SEQ_LENGTH': 12, 'HIDDEN_SIZE': 32, ...}
+
+CLI:
+    python hparam_search.py --data tsf.csv --budget 600 --configs 27
+    python hparam_search.py --data tsf.csv --budget 120 --no-final       # search only
+    python hparam_search.py --data tsf.csv --smoke                       # end-to-end check, temp dir
+"""
+
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+
+import trainLSTM
+from trainLSTM import Config
+
+logger = logging.getLogger(__name__)
+
+SEARCH_SPACE = {
+    'SEQ_LENGTH': [4, 8, 12, 16],
+    'HIDDEN_SIZE': [16, 32, 64, 128],
+    'NUM_LSTM_LAYERS': [1, 2, 3],
+    'DROPOUT': [0.1, 0.2, 0.3, 0.4],
+    'LEARNING_RATE': [3e-4, 1e-3, 3e-3]
+}
+
+REPORT_FILE = 'hparam_search.json'
+
+
+def sample_configs(space: Dict[str, List], n: int, seed: int = 42) -> List[Dict]:
+    """The Config defaults followed by n - 1 distinct random points of the space"""
+    defaults = {field: getattr(Config, field) for field in space}
+    grid = [dict(zip(space, values)) for values in itertools.product(*space.values())]
+    grid = [point for point in grid if point != defaults]
+    random.Random(seed).shuffle(grid)
+    return [defaults] + grid[:n - 1]
+
+
+class Trial:
+    """One configuration being trained rung by rung (resumable)"""
+
+    def __init__(self, trial_id: int, overrides: Dict, base: Dict, num_businesses: int):
+        self.id = trial_id
+        self.overrides = overrides
+        self.config = Config(**dict(base, **overrides))
+        torch.manual_seed(self.config.SEED)
+        self.model = trainLSTM.build_model(self.config, num_businesses)
+        self.optimizer, self.scheduler = trainLSTM.make_optimizer(self.model, self.config)
+        self.val_curve: List[float] = []
+        self.cpu_seconds = 0.0
+
+    @property
+    def epochs(self) -> int:
+        return len(self.val_curve)
+
+    @property
+    def best_val_loss(self) -> float:
+        return min(self.val_curve, default=float('inf'))
+
+    @property
+    def cpu_per_epoch(self) -> Optional[float]:
+        return self.cpu_seconds / self.epochs if self.epochs else None
+
+    def train_epoch(self, train_tensors, val_tensors):
+        started = time.process_time()
+        trainLSTM.fast_epoch(self.model, self.model, self.optimizer, train_tensors, self.config.BATCH_SIZE)
+        val_loss = trainLSTM.fast_validation_loss(self.model, self.model, val_tensors)
+        self.scheduler.step(val_loss)
+        self.val_curve.append(val_loss)
+        self.cpu_seconds += time.process_time() - started
+
+    def summary(self) -> Dict:
+        return {'id': self.id, 'overrides': self.overrides, 'epochs': self.epochs,
+                'best_val_loss': self.best_val_loss, 'cpu_seconds': self.cpu_seconds}
+
+
+def prepare_windows(base: Dict, seq_lengths: List[int]):
+    """
+    Train / val tensors per SEQ_LENGTH from one pass of the trainLSTM data pipeline
+
+    The val windows of every SEQ_LENGTH forecast the same target weeks (see
+    the module docstring), so validation losses compare across lengths.
+    """
+    config = Config(**base)
+    df, business_ids = trainLSTM.load_data(config)
+    trainLSTM.add_features(df, config)
+    train_df, val_df, _ = trainLSTM.split_temporal(df)
+    _, _, business_scalers = trainLSTM.fit_scalers(train_df, config, len(business_ids))
+    for frame in (train_df, val_df):
+        trainLSTM.scale_by_business(frame, config, business_scalers)
+
+    position = val_df.groupby('business_idx', sort=False).cumcount().to_numpy()
+    windows = {}
+    for seq_length in seq_lengths:
+        config.SEQ_LENGTH = seq_length
+        val_set = trainLSTM.create_sequences(val_df, config)
+        aligned = np.flatnonzero(position[val_set.starts] + seq_length >= max(seq_lengths))
+        windows[seq_length] = (trainLSTM.create_sequences(train_df, config).tensors(), val_set.batch(aligned))
+    return windows, len(business_ids)
+
+
+def search(base: Optional[Dict] = None, budget_seconds: float = 600.0, configs: int = 27, eta: int = 3,
+           min_epochs: int = 3, max_epochs: Optional[int] = None, space: Optional[Dict[str, List]] = None,
+           seed: int = 42, final: bool = True) -> Dict:
+    """
+    Successive-halving search, then (final=True) trainLSTM.train of the winner
+
+    Args:
+        base: Config overrides shared by every trial and the final training
+              (DATA_PATH, OUTPUT_DIR, PUBLISH_TO_REGISTRY, ...)
+        budget_seconds: Total CPU seconds for the search trials
+        configs: Configurations in rung 0 (the Config defaults included)
+        eta: Keep 1/eta of the survivors per rung, train them eta x longer
+        min_epochs: Epochs per configuration in rung 0
+        max_epochs: Epoch cap of the last rung (default: Config.EPOCHS)
+        space: {Config field: candidate values} (default: SEARCH_SPACE)
+        seed: Sampling seed
+        final: Train the winner with trainLSTM.train and record the search
+               in its metadata
+
+    Returns:
+        The search record ('winner', 'rungs', 'cpu_seconds', ...), plus
+        'metadata' of the final training when final=True
+    """
+    base = dict(base or {})
+    base.setdefault('PLOTS_DIR', os.path.join(Config(**base).OUTPUT_DIR, 'plots'))
+    space = space or SEARCH_SPACE
+    max_epochs = max_epochs or Config(**base).EPOCHS
+    points = sample_configs(space, configs, seed)
+    seq_lengths = sorted({point.get('SEQ_LENGTH', Config(**base).SEQ_LENGTH) for point in points})
+
+    train_logger = logging.getLogger('trainLSTM')
+    level = train_logger.level
+    train_logger.setLevel(logging.WARNING)  # build_model / data pipeline chatter, per trial
+    try:
+        windows, num_businesses = prepare_windows(base, seq_lengths)
+        trials = [Trial(i, point, base, num_businesses) for i, point in enumerate(points)]
+    finally:
+        train_logger.setLevel(level)
+
+    logger.info(f"🔎 Successive halving: {len(trials)} configs, eta={eta}, {min_epochs}→{max_epochs} epochs, "
+                f"budget {budget_seconds:.0f} CPU s")
+    spent = lambda: sum(trial.cpu_seconds for trial in trials)
+    rungs, survivors, target, exhausted = [], trials, min_epochs, False
+
+    while True:
+        for trial in survivors:
+            while trial.epochs < target and not exhausted:
+                if spent() >= budget_seconds:
+                    exhausted = True
+                    break
+                trial.train_epoch(*windows[trial.config.SEQ_LENGTH])
+
+        # Rank on the best point of each validation curve (trials cut short by the budget included)
+        ranked = sorted((trial for trial in survivors if trial.epochs), key=lambda trial: trial.best_val_loss)
+        if not ranked:
+            # Only possible in rung 0: the budget ran out before the first epoch
+            logger.error(f"❌ Budget of {budget_seconds:g} CPU s ran out before any trial finished an epoch - "
+                         f"falling back to the Config defaults (trial 0), untested")
+            ranked = [trials[0]]
+            break
+        rungs.append({'epochs': target, 'trials': [trial.summary() for trial in ranked]})
+        logger.info(f"   rung {len(rungs) - 1}: {len(ranked)} config(s) x {target} epochs, best val "
+                    f"{ranked[0].best_val_loss:.5f} (trial {ranked[0].id}), {spent():.0f}/{budget_seconds:.0f} CPU s")
+        if exhausted or len(ranked) <= 1 or target >= max_epochs:
+            break
+
+        # Promote the top 1/eta - fewer if their projected cost exceeds what's left
+        next_target = min(target * eta, max_epochs)
+        keep = max(1, len(ranked) // eta)
+        projected = lambda group: sum(trial.cpu_per_epoch * (next_target - trial.epochs) for trial in group)
+        while keep and projected(ranked[:keep]) > budget_seconds - spent():
+            keep -= 1
+        if not keep:
+            logger.info(f"   budget left ({budget_seconds - spent():.0f} CPU s) can't take the leader "
+                        f"to {next_target} epochs - stopping")
+            break
+        survivors, target = ranked[:keep], next_target
+
+    winner = ranked[0]
+    record = {
+        'finished_at': datetime.now().isoformat(),
+        'method': 'successive_halving',
+        'space': space, 'configs': len(trials), 'eta': eta,
+        'min_epochs': min_epochs, 'max_epochs': max_epochs,
+        'budget_seconds': budget_seconds, 'cpu_seconds': spent(), 'budget_exhausted': exhausted,
+        'val_windows': len(windows[seq_lengths[0]][1][0]), 'val_target_weeks_from': max(seq_lengths),
+        'winner': winner.overrides, 'winner_val_loss': winner.best_val_loss if winner.epochs else None,
+        'winner_epochs': winner.epochs, 'fallback_to_defaults': not winner.epochs,
+        'rungs': rungs
+    }
+    logger.info(f"🏆 Winner (trial {winner.id}, val {winner.best_val_loss:.5f} after {winner.epochs} epochs): "
+                f"{winner.overrides}")
+
+    if final:
+        logger.info("\n=== Training the winner (trainLSTM.train) ===")
+        metadata = trainLSTM.train(**dict(base, **winner.overrides), extra_metadata={'hparam_search': record})
+        output_dir = Config(**base).OUTPUT_DIR
+        with open(os.path.join(output_dir, REPORT_FILE), 'w') as f:
+            json.dump(record, f, indent=2)
+        record = dict(record, metadata=metadata)
+    return record
+
+
+def smoke_test(data_path: str) -> Dict:
+    """
+    Tiny search + final training in a temporary directory; checks that the
+    winner reaches business_metadata.json and hparam_search.json is written
+    (also with a zero budget, which falls back to the Config defaults)
+    """
+    import tempfile
+
+    for budget in (5.0, 0.0):
+        with tempfile.TemporaryDirectory() as output_dir:
+            base = {'DATA_PATH': data_path, 'OUTPUT_DIR': output_dir, 'PUBLISH_TO_REGISTRY': False, 'EPOCHS': 2,
+                    'SAVE_PLOTS': False}
+            record = search(base, budget_seconds=budget, configs=3, min_epochs=1, max_epochs=2)
+            with open(os.path.join(output_dir, 'business_metadata.json')) as f:
+                metadata = json.load(f)
+            assert metadata['hparam_search']['winner'] == record['winner'], 'winner missing from the metadata'
+            assert os.path.exists(os.path.join(output_dir, REPORT_FILE)), f'{REPORT_FILE} not written'
+            assert record['fallback_to_defaults'] == (budget == 0.0)
+            logger.info(f"✓ Smoke test (budget {budget:g} CPU s): winner {record['winner']}, "
+                        f"test MAPE {metadata['performance']['test_mape']:.2f}%")
+    return record
+
+
+def format_rungs(record: Dict, top: int = 5) -> str:
+    lines = []
+    for number, rung in enumerate(record['rungs']):
+        lines.append(f"   rung {number}: {len(rung['trials'])} config(s) x {rung['epochs']} epochs")
+        for trial in rung['trials'][:top]:
+            settings = ' '.join(f"{field.lower()}={value}" for field, value in trial['overrides'].items())
+            lines.append(f"      #{trial['id']:<3} val {trial['best_val_loss']:.5f}  "
+                         f"{trial['cpu_seconds']:6.1f} CPU s  {settings}")
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=Config.DATA_PATH)
+    parser.add_argument('--budget', type=float, default=600.0, help='CPU seconds for the search')
+    parser.add_argument('--configs', type=int, default=27)
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--min-epochs', type=int, default=3)
+    parser.add_argument('--max-epochs', type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=Config.OUTPUT_DIR)
+    parser.add_argument('--no-final', action='store_true', help='search only, no training of the winner')
+    parser.add_argument('--no-publish', action='store_true', help='do not publish the winner to the registry')
+    parser.add_argument('--smoke', action='store_true',
+                        help='tiny search + final training in a temp dir, check the metadata, exit')
+    args = parser.parse_args()
+
+    if args.smoke:
+        smoke_test(args.data)
+        raise SystemExit(0)
+
+    base = {'DATA_PATH': args.data, 'OUTPUT_DIR': args.output}
+    if args.no_publish:
+        base['PUBLISH_TO_REGISTRY'] = False
+    record = search(base, args.budget, args.configs, args.eta, args.min_epochs, args.max_epochs,
+                    seed=args.seed, final=not args.no_final)
+
+    print(f"\n{'='*70}")
+    print(f"🔎 HYPERPARAMETER SEARCH - {record['configs']} configs, "
+          f"{record['cpu_seconds']:.0f}/{record['budget_seconds']:.0f} CPU s")
+    print(f"{'='*70}\n")
+    print(format_rungs(record))
+    if record['fallback_to_defaults']:
+        print(f"\n   ❌ No trial finished an epoch within the budget - Config defaults used: {record['winner']}")
+    else:
+        print(f"\n   Winner: {record['winner']} (val {record['winner_val_loss']:.5f})")
+    if 'metadata' in record:
+        print(f"   Final model: test MAPE {record['metadata']['performance']['test_mape']:.2f}% → {args.output}")
+    print(f"\n{'='*70}\n")
@@ -0,0 +1,159 @@
+"""
+load_test.py - FLOW Auto-Reserve Load Test
+Drives FlowAgent.analyze against a local CIH stand-in and reports reserves/sec
+
+Every simulated business gets an 8-week window from tsf.csv and a desired
+salary below its current inflow, so each analysis performs one real HTTP
+reserve (simulation → OTP → confirmation) against cih_stub_server.py.
+
+Modes:
+    analyze       one FlowAgent.analyze per business, --workers threads
+    analyze_many  one FlowAgent.analyze_many call (batched forecast +
+                  reserve_many; concurrent with --cih-client async)
+
+Usage:
+    python load_test.py --businesses 200 --workers 16 --latency lognormal:30:0.5
+    python load_test.py --mode analyze_many --cih-client async --error-rate 0.02
+    python load_test.py --base-url http://127.0.0.1:8765   # external stand-in
+"""
+
+import argparse
+import csv
+import json
+import logging
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from cih_stub_server import CIHStubServer
+
+
+def load_businesses(csv_path: str, count: int, seq_length: int = 9) -> Dict[str, Dict]:
+    """Slices tsf.csv into `count` overlapping per-business histories ({column: list})"""
+    with open(csv_path, newline='') as f:
+        rows = list(csv.DictReader(f))
+
+    starts = range(len(rows) - seq_length + 1)
+    histories = {}
+    for i in range(count):
+        window = rows[starts[i % len(starts)]:][:seq_length]
+        histories[f"biz_{i:05d}"] = {col: [row[col] for row in window] for col in window[0]}
+    return histories
+
+
+def build_configs(histories: Dict[str, Dict]) -> Dict[str, Dict]:
+    """User configs whose desired salary is 80% of the latest inflow (always a reserve)"""
+    configs = {}
+    for i, (business_id, history) in enumerate(histories.items()):
+        cash_in = float(history['cash in'][-1])
+        configs[business_id] = {
+            'business_name': business_id,
+            'desired_weekly_salary': 0.8 * cash_in,
+            'current_week_cash_in': cash_in,
+            'contract_id': f"LAN{i:012d}",
+            'phone': f"2126{i:08d}",
+            'pot_phone': f"2127{i:08d}"
+        }
+    return configs
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def run(agent, histories: Dict, configs: Dict, mode: str, workers: int) -> Dict:
+    """Runs one load pass, returns timings and reserve outcomes"""
+    latencies = []
+
+    def analyze_one(business_id: str) -> Dict:
+        start = time.perf_counter()
+        result = agent.analyze(histories[business_id], configs[business_id])
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    start = time.perf_counter()
+    if mode == 'analyze':
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(analyze_one, histories))
+    else:
+        results = list(agent.analyze_many(histories, configs).values())
+    elapsed = time.perf_counter() - start
+
+    actions = [result['auto_reserve']['action'] for result in results]
+    return {
+        'elapsed': elapsed,
+        'latencies': latencies,
+        'reserved': actions.count('reserved'),
+        'failed': actions.count('failed'),
+        'errors': sorted({result['auto_reserve'].get('error') for result in results
+                          if result['auto_reserve']['action'] == 'failed'})
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default='tsf.csv')
+    parser.add_argument('--businesses', type=int, default=200)
+    parser.add_argument('--mode', choices=['analyze', 'analyze_many'], default='analyze')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--backend', default='numpy')
+    parser.add_argument('--cih-client', choices=['requests', 'async'], default='requests')
+    parser.add_argument('--base-url', help='Use a running stand-in instead of starting one')
+    parser.add_argument('--latency', default='lognormal:20:0.5')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--timeout-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    from Flow_agent import FlowAgent
+
+    stub = None
+    base_url = args.base_url
+    if base_url is None:
+        stub = CIHStubServer(latency=args.latency, error_rate=args.error_rate,
+                             timeout_rate=args.timeout_rate, seed=args.seed).start()
+        base_url = stub.base_url
+
+    histories = load_businesses(args.csv, args.businesses)
+    configs = build_configs(histories)
+    agent = FlowAgent(backend=args.backend, demo_mode=False, cih_client=args.cih_client,
+                      cih_base_url=base_url)
+
+    try:
+        stats = run(agent, histories, configs, args.mode, args.workers)
+        with urllib.request.urlopen(f"{base_url}/stats") as response:
+            server_stats = json.load(response)
+    finally:
+        if hasattr(agent.cih_api, 'close'):
+            agent.cih_api.close()
+        if stub is not None:
+            stub.stop()
+
+    print(f"\n{'='*70}")
+    print(f"🏋️  AUTO-RESERVE LOAD TEST - {args.mode}, {args.cih_client} client, "
+          f"{args.workers if args.mode == 'analyze' else 1} worker(s)")
+    print(f"{'='*70}\n")
+    print(f"   CIH stand-in:   {base_url} (latency {args.latency}, errors {args.error_rate:.1%}, "
+          f"timeouts {args.timeout_rate:.1%})")
+    print(f"   Businesses:     {args.businesses}")
+    print(f"   Reserved:       {stats['reserved']}  |  failed: {stats['failed']}")
+    print(f"   Elapsed:        {stats['elapsed']:.2f} s")
+    print(f"   Throughput:     {stats['reserved'] / stats['elapsed']:,.1f} reserves/s")
+    if stats['latencies']:
+        print(f"   analyze():      p50 {percentile(stats['latencies'], 0.5) * 1000:.1f} ms | "
+              f"p95 {percentile(stats['latencies'], 0.95) * 1000:.1f} ms | "
+              f"p99 {percentile(stats['latencies'], 0.99) * 1000:.1f} ms | "
+              f"mean {statistics.mean(stats['latencies']) * 1000:.1f} ms")
+    if stats['errors']:
+        print(f"   Errors seen:    {stats['errors'][:3]}")
+    print(f"   Server:         {server_stats['confirmed']} confirmed, {server_stats['errors']} injected errors, "
+          f"{server_stats['timeouts']} injected timeouts")
+    print(f"\n{'='*70}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+metrics.py - FLOW Metrics
+Per-stage latency histograms and outcome counters for FlowAgent
+
+Stages timed by the agent and CIH clients (seconds, one observation per
+call - batched calls observe the whole batch once):
+    features, scale, forward, forward_mc (MC-dropout samples), risk, reserve,
+    report, analyze, cih_simulation, cih_otp, cih_confirmation
+
+Counters:
+    flow_predictions_total                     businesses forecast
+    flow_forecast_cache_total{result}          hit / miss
+    flow_risks_total{type}                     low_cashflow / declining_trend
+    flow_risk_severity_total{severity}         none / low / medium / high
+    flow_reserve_outcomes_total{action}        reserved / no_reserve / queued / failed
+
+Histograms use fixed buckets (one bisect + one lock per observation), so
+instrumentation stays on in production.
+
+Usage:
+    agent = FlowAgent()                         # records into metrics.REGISTRY
+    REGISTRY.snapshot()                         # in-process dict
+    print(REGISTRY.to_prometheus())             # Prometheus text format
+    REGISTRY.add_exporter(PrometheusFileExporter('/var/lib/node_exporter/flow.prom'))
+    REGISTRY.export()                           # push to every exporter
+
+    FlowAgent(metrics=None)                     # instrumentation off
+"""
+
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('features', 'scale', 'forward', 'forward_mc', 'risk', 'reserve', 'report', 'analyze',
+          'cih_simulation', 'cih_otp', 'cih_confirmation')
+
+# name -> (help text, label name or None)
+COUNTERS = {
+    'flow_predictions_total': ('Businesses forecast', None),
+    'flow_forecast_cache_total': ('Forecast cache lookups', 'result'),
+    'flow_risks_total': ('Risks detected by type', 'type'),
+    'flow_risk_severity_total': ('Analyses by risk severity', 'severity'),
+    'flow_reserve_outcomes_total': ('Auto-reserve outcomes', 'action')
+}
+
+DEFAULT_BUCKETS = (5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Timer:
+    """Context manager observing its wall time into one stage"""
+
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics: 'Metrics', stage: str):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+
+
+class Metrics:
+    """
+    In-process metrics registry
+
+    Args:
+        buckets: Histogram upper bounds in seconds (ascending)
+        exporters: Objects with export(metrics) called by export()
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, exporters=()):
+        self.buckets = tuple(buckets)
+        self.exporters = list(exporters)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def __reduce__(self):
+        # The global registry pickles by reference; other registries travel
+        # as empty copies (worker-process observations stay in the worker)
+        if self is REGISTRY:
+            return 'REGISTRY'
+        return Metrics, (self.buckets,)
+
+    def reset(self):
+        with self._lock:
+            self._histograms: Dict[str, List] = {}     # stage -> [bucket counts..., +Inf]
+            self._sums: Dict[str, float] = {}
+            self._counters: Dict[tuple, float] = {}    # (name, label value) -> value
+
+    # ==========================================
+    # RECORDING
+    # ==========================================
+
+    def timer(self, stage: str) -> _Timer:
+        return _Timer(self, stage)
+
+    def observe(self, stage: str, seconds: float):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            counts = self._histograms.get(stage)
+            if counts is None:
+                counts = self._histograms[stage] = [0] * (len(self.buckets) + 1)
+                self._sums[stage] = 0.0
+            counts[index] += 1
+            self._sums[stage] += seconds
+
+    def timed(self, stage: str, fn, *args, **kwargs):
+        """Calls fn(*args, **kwargs) and observes its duration"""
+        with self.timer(stage):
+            return fn(*args, **kwargs)
+
+    def inc(self, name: str, label: Optional[str] = None, amount: float = 1):
+        key = (name, label)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def drain(self) -> Dict:
+        """
+        Takes the raw values recorded so far and resets (atomically) - a
+        worker process's delta for merge() in the parent
+        """
+        with self._lock:
+            state = {'histograms': self._histograms, 'sums': self._sums, 'counters': self._counters}
+            self._histograms, self._sums, self._counters = {}, {}, {}
+        return state
+
+    def merge(self, state: Optional[Dict]):
+        """Adds another registry's drain() (same buckets) into this one"""
+        if not state:
+            return
+        with self._lock:
+            for stage, counts in state['histograms'].items():
+                mine = self._histograms.get(stage)
+                if mine is None:
+                    self._histograms[stage] = list(counts)
+                    self._sums[stage] = state['sums'][stage]
+                    continue
+                if len(mine) != len(counts):
+                    raise ValueError(f"Cannot merge stage {stage!r}: different histogram buckets")
+                for i, count in enumerate(counts):
+                    mine[i] += count
+                self._sums[stage] += state['sums'][stage]
+            for key, value in state['counters'].items():
+                self._counters[key] = self._counters.get(key, 0) + value
+
+    # ==========================================
+    # READING
+    # ==========================================
+
+    def _quantile(self, counts: List[int], q: float) -> float:
+        """Quantile estimate by linear interpolation inside the bucket"""
+        total = sum(counts)
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return 0.0
+
+    def snapshot(self) -> Dict:
+        """
+        Current values
+
+        Returns:
+            {'stages': {stage: {count, sum, mean_ms, p50_ms, p90_ms, p99_ms}},
+             'counters': {name: value or {label: value}}}
+        """
+        with self._lock:
+            histograms = {stage: list(counts) for stage, counts in self._histograms.items()}
+            sums = dict(self._sums)
+            counters = dict(self._counters)
+
+        stages = {}
+        for stage, counts in histograms.items():
+            count = sum(counts)
+            stages[stage] = {
+                'count': count,
+                'sum': sums[stage],
+                'mean_ms': sums[stage] / count * 1000,
+                'p50_ms': self._quantile(counts, 0.5) * 1000,
+                'p90_ms': self._quantile(counts, 0.9) * 1000,
+                'p99_ms': self._quantile(counts, 0.99) * 1000
+            }
+
+        counter_values = {}
+        for (name, label), value in sorted(counters.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+            if label is None:
+                counter_values[name] = value
+            else:
+                counter_values.setdefault(name, {})[label] = value
+
+        return {'stages': stages, 'counters': counter_values}
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            histograms = {stage: list(counts) for stage, counts in self._histograms.items()}
+            sums = dict(self._sums)
+            counters = dict(self._counters)
+
+        lines = [
+            '# HELP flow_stage_seconds FlowAgent per-stage latency',
+            '# TYPE flow_stage_seconds histogram'
+        ]
+        for stage in sorted(histograms):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), histograms[stage]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'flow_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'flow_stage_seconds_sum{{stage="{stage}"}} {sums[stage]!r}')
+            lines.append(f'flow_stage_seconds_count{{stage="{stage}"}} {cumulative}')
+
+        for name, (help_text, label_name) in COUNTERS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for (counter, label), value in sorted(counters.items(), key=lambda item: str(item[0][1])):
+                if counter != name:
+                    continue
+                labels = f'{{{label_name}="{label}"}}' if label_name else ''
+                lines.append(f'{name}{labels} {value:g}')
+
+        return '\n'.join(lines) + '\n'
+
+    # ==========================================
+    # EXPORT
+    # ==========================================
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+
+    def export(self):
+        """Pushes the current values to every exporter"""
+        for exporter in self.exporters:
+            try:
+                exporter.export(self)
+            except Exception as e:
+                logger.error(f"Metrics exporter {type(exporter).__name__} failed: {e}")
+
+
+class NullMetrics(Metrics):
+    """Instrumentation switched off - every call is a no-op"""
+
+    def __reduce__(self):
+        return NullMetrics, ()
+
+    def observe(self, stage: str, seconds: float):
+        pass
+
+    def inc(self, name: str, label: Optional[str] = None, amount: float = 1):
+        pass
+
+    def merge(self, state: Optional[Dict]):
+        pass
+
+    def timed(self, stage: str, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+
+# ==========================================
+# EXPORTERS
+# ==========================================
+class PrometheusFileExporter:
+    """Writes the text format to a file (node_exporter textfile collector)"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, metrics: Metrics):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(metrics.to_prometheus())
+        os.replace(tmp_path, self.path)  # Scrapers never see a partial file
+
+
+class LogExporter:
+    """Logs a one-line stage summary"""
+
+    def __init__(self, log: logging.Logger = logger, level: int = logging.INFO):
+        self.log = log
+        self.level = level
+
+    def export(self, metrics: Metrics):
+        stages = metrics.snapshot()['stages']
+        summary = ', '.join(f"{stage} p50 {s['p50_ms']:.2f}ms p99 {s['p99_ms']:.2f}ms (n={s['count']})"
+                            for stage, s in stages.items())
+        self.log.log(self.level, f"📈 Metrics: {summary or 'no observations'}")
+
+
+REGISTRY = Metrics()
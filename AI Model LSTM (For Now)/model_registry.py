@@ -0,0 +1,273 @@
+"""
+model_registry.py - FLOW Model Registry
+Versioned artifact sets (weights, scalers, metadata) with an atomic
+"current" pointer, and a watcher that hot-swaps running agents
+
+Layout:
+    models/registry/
+        CURRENT                 ← active version id (replaced atomically)
+        v0001/
+            business_lstm.bundle, business_lstm.pt, business_lstm.onnx,
+            business_lstm_int8.pt, business_metadata.json
+            (older versions: business_scaler.pkl, business_target_scaler.pkl,
+            business_lstm.npz instead of the bundle)
+        v0002/ ...
+
+A version directory is staged under a hidden name and renamed into place,
+so readers never see a half-copied version, and it is never modified
+afterwards. Activating a version rewrites CURRENT via os.replace.
+
+Usage:
+    registry = ModelRegistry('models/registry')
+    version = registry.publish('models')          # after trainLSTM.py
+    agent = FlowAgent(registry=registry)          # serves CURRENT
+    with RegistryWatcher(agent, interval=30):     # follows CURRENT in the background
+        ...
+    registry.activate('v0001')                    # rollback, picked up by the watcher
+
+CLI:
+    python model_registry.py publish models
+    python model_registry.py list
+    python model_registry.py activate v0001
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# FlowAgent artifact path argument -> file name inside a version directory
+ARTIFACT_FILES = {
+    'model_path': 'business_lstm.pt',
+    'scaler_path': 'business_scaler.pkl',
+    'target_scaler_path': 'business_target_scaler.pkl',
+    'onnx_path': 'business_lstm.onnx',
+    'quantized_path': 'business_lstm_int8.pt',
+    'weights_path': 'business_lstm.npz',
+    'metadata_path': 'business_metadata.json',
+    'bundle_path': 'business_lstm.bundle'
+}
+
+VERSION_PATTERN = re.compile(r'^v(\d+)$')
+CURRENT_FILE = 'CURRENT'
+
+
+class ModelRegistry:
+    """
+    Directory of immutable, versioned model artifact sets
+
+    Args:
+        root: Registry directory (created if missing)
+    """
+
+    def __init__(self, root: str = 'models/registry'):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def __repr__(self):
+        return f"ModelRegistry({self.root!r})"
+
+    # ==========================================
+    # READING
+    # ==========================================
+
+    def versions(self) -> List[str]:
+        """Published version ids, oldest first"""
+        versions = [name for name in os.listdir(self.root)
+                    if VERSION_PATTERN.match(name)
+                    and os.path.isfile(os.path.join(self.root, name, ARTIFACT_FILES['metadata_path']))]
+        return sorted(versions, key=lambda name: int(VERSION_PATTERN.match(name).group(1)))
+
+    def current(self) -> Optional[str]:
+        """Active version id (None before the first publish)"""
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def resolve(self, version: Optional[str] = None) -> str:
+        """Version id to load (default: CURRENT)"""
+        version = version or self.current()
+        if version is None:
+            raise LookupError(f"Model registry {self.root} has no active version - publish one first")
+        if not os.path.isdir(os.path.join(self.root, version)):
+            raise LookupError(f"Model version {version} not found in {self.root}")
+        return version
+
+    def artifact_paths(self, version: Optional[str] = None) -> Dict[str, str]:
+        """FlowAgent artifact path arguments for one version"""
+        directory = os.path.join(self.root, self.resolve(version))
+        return {arg: os.path.join(directory, name) for arg, name in ARTIFACT_FILES.items()}
+
+    def metadata(self, version: Optional[str] = None) -> Dict:
+        with open(self.artifact_paths(version)['metadata_path']) as f:
+            return json.load(f)
+
+    # ==========================================
+    # PUBLISHING
+    # ==========================================
+
+    def _next_version(self) -> str:
+        versions = self.versions()
+        last = int(VERSION_PATTERN.match(versions[-1]).group(1)) if versions else 0
+        return f"v{last + 1:04d}"
+
+    def publish(self, source_dir: str = 'models', version: Optional[str] = None,
+                activate: bool = True) -> str:
+        """
+        Copies a trainLSTM.py output directory into a new version
+
+        Args:
+            source_dir: Directory holding the artifact files (missing optional
+                        artifacts, e.g. the .onnx, are skipped)
+            version: Version id (default: next vNNNN)
+            activate: Point CURRENT at the new version
+
+        Returns:
+            The new version id
+        """
+        if not os.path.isfile(os.path.join(source_dir, ARTIFACT_FILES['metadata_path'])):
+            raise FileNotFoundError(f"{source_dir} has no {ARTIFACT_FILES['metadata_path']}")
+
+        version = version or self._next_version()
+        target = os.path.join(self.root, version)
+        if os.path.exists(target):
+            raise ValueError(f"Model version {version} already exists in {self.root}")
+
+        staging = os.path.join(self.root, f".staging-{version}-{os.getpid()}")
+        os.makedirs(staging)
+        try:
+            copied = []
+            for name in ARTIFACT_FILES.values():
+                source = os.path.join(source_dir, name)
+                if os.path.isfile(source):
+                    shutil.copy2(source, os.path.join(staging, name))
+                    copied.append(name)
+
+            metadata_path = os.path.join(staging, ARTIFACT_FILES['metadata_path'])
+            with open(metadata_path) as f:
+                metadata = json.load(f)
+            metadata['registry'] = {'version': version, 'published_at': datetime.now().isoformat()}
+            with open(metadata_path, 'w') as f:
+                json.dump(metadata, f, indent=2)
+
+            os.rename(staging, target)  # The version appears complete or not at all
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        logger.info(f"✓ Published model {version} ({len(copied)} artifacts from {source_dir})")
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version: str):
+        """Points CURRENT at a published version (agents follow via RegistryWatcher)"""
+        version = self.resolve(version)
+        tmp_path = os.path.join(self.root, f"{CURRENT_FILE}.tmp-{os.getpid()}")
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(self.root, CURRENT_FILE))
+        logger.info(f"✓ Active model version: {version}")
+
+
+# ==========================================
+# HOT RELOAD
+# ==========================================
+class RegistryWatcher:
+    """
+    Background thread swapping an agent to the registry's CURRENT version
+
+    The new version is loaded on the watcher thread while the agent keeps
+    serving the old one; the swap itself is a single reference assignment
+    (see FlowAgent.reload_model), so in-flight requests finish on the model
+    they started with. A version that fails to load is logged and skipped.
+
+    Args:
+        agent: FlowAgent created with registry=...
+        interval: Seconds between CURRENT checks
+    """
+
+    def __init__(self, agent, interval: float = 30.0):
+        if agent.registry is None:
+            raise ValueError("RegistryWatcher needs a FlowAgent created with registry=...")
+        self.agent = agent
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._failed: Optional[str] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='model-registry-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def check(self) -> bool:
+        """Swaps the agent if CURRENT moved, returns True on a swap"""
+        version = self.agent.registry.current()
+        if version is None or version == self.agent.model_version or version == self._failed:
+            return False
+        try:
+            self.agent.reload_model(version)
+        except Exception as e:
+            self._failed = version  # Don't retry a broken version every interval
+            logger.error(f"❌ Hot reload to {version} failed, still serving {self.agent.model_version}: {e}")
+            return False
+        self._failed = None
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--root', default='models/registry')
+    commands = parser.add_subparsers(dest='command', required=True)
+    publish = commands.add_parser('publish', help='copy an artifact directory into a new version')
+    publish.add_argument('source_dir', nargs='?', default='models')
+    publish.add_argument('--version')
+    publish.add_argument('--no-activate', action='store_true')
+    commands.add_parser('list', help='published versions')
+    activate = commands.add_parser('activate', help='point CURRENT at a version')
+    activate.add_argument('version')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.command == 'publish':
+        registry.publish(args.source_dir, args.version, activate=not args.no_activate)
+    elif args.command == 'activate':
+        registry.activate(args.version)
+    else:
+        current = registry.current()
+        for version in registry.versions():
+            metadata = registry.metadata(version)
+            performance = metadata.get('performance', {})
+            mape = performance.get('test_mape')
+            split = 'holdout' if performance.get('split') == 'finetune_holdout' else 'test'
+            print(f"{'*' if version == current else ' '} {version}  trained {metadata.get('trained_at', '?')}"
+                  f"  {split} MAPE {f'{mape:.2f}%' if mape is not None else '?'}")
@@ -0,0 +1,146 @@
+"""
+numpy_lstm.py - FLOW Torch-Free LSTM Inference
+Pure-NumPy forward pass of BusinessLSTM running from exported weights
+
+Serving with this module needs neither torch, sklearn nor joblib:
+weights and scaler parameters live in the artifact bundle written by
+trainLSTM.py (see artifact_bundle.py), or in a legacy .npz.
+
+Usage:
+    from numpy_lstm import load_numpy_model, model_from_arrays
+
+    model, scaler, target_scaler = model_from_arrays(ArtifactBundle(path).arrays, copy=False)
+    model, scaler, target_scaler = load_numpy_model('models/business_lstm.npz')
+    predictions_scaled = model(scaler.transform(window).reshape(1, 8, 12))
+"""
+
+import numpy as np
+from typing import Dict, Tuple
+
+
+# ==========================================
+# SCALER
+# ==========================================
+class ArrayScaler:
+    """StandardScaler stand-in built from saved mean / scale vectors"""
+
+    def __init__(self, mean: np.ndarray, scale: np.ndarray):
+        self.mean_ = np.asarray(mean, dtype=np.float64)
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+
+    def transform(self, X) -> np.ndarray:
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+
+# ==========================================
+# MODEL
+# ==========================================
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 0.5 * (np.tanh(0.5 * x) + 1.0)  # Overflow-free form
+
+
+class NumpyBusinessLSTM:
+    """
+    BusinessLSTM forward pass in NumPy (eval mode: dropout is identity)
+
+    Expects the PyTorch state_dict layout: lstm.weight_ih_l{k},
+    lstm.weight_hh_l{k}, lstm.bias_ih_l{k}, lstm.bias_hh_l{k}, fc1.*, fc2.*
+    Gate order follows PyTorch: input, forget, cell, output. A global
+    model's embedding.weight is not used here - callers append the
+    business embedding columns to X (see FlowAgent.predict_windows).
+
+    With copy=False the weight matrices stay (transposed) views of the
+    given float32 arrays - e.g. a memory-mapped bundle shared by workers.
+    """
+
+    def __init__(self, weights: Dict[str, np.ndarray], copy: bool = True):
+        layout = np.ascontiguousarray if copy else (lambda a: a)
+        self.num_layers = sum(1 for key in weights if key.startswith('lstm.weight_ih_l'))
+        self.hidden = weights['lstm.weight_hh_l0'].shape[1]
+
+        self.layers = []
+        for k in range(self.num_layers):
+            w_ih = np.asarray(weights[f'lstm.weight_ih_l{k}'], dtype=np.float32)
+            w_hh = np.asarray(weights[f'lstm.weight_hh_l{k}'], dtype=np.float32)
+            bias = (np.asarray(weights[f'lstm.bias_ih_l{k}'], dtype=np.float32)
+                    + np.asarray(weights[f'lstm.bias_hh_l{k}'], dtype=np.float32))
+            self.layers.append((layout(w_ih.T), layout(w_hh.T), bias))
+
+        self.fc1_w = layout(np.asarray(weights['fc1.weight'], dtype=np.float32).T)
+        self.fc1_b = np.asarray(weights['fc1.bias'], dtype=np.float32)
+        self.fc2_w = layout(np.asarray(weights['fc2.weight'], dtype=np.float32).T)
+        self.fc2_b = np.asarray(weights['fc2.bias'], dtype=np.float32)
+
+    def __call__(self, X: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            X: [batch, seq_len, features] scaled float32 windows
+
+        Returns:
+            [batch, forecast_weeks] scaled predictions
+        """
+        x = np.asarray(X, dtype=np.float32)
+        batch, seq_len, _ = x.shape
+        H = self.hidden
+
+        for w_ih, w_hh, bias in self.layers:
+            # Input projection for every timestep at once: [batch, seq_len, 4H]
+            x_proj = (x.reshape(batch * seq_len, -1) @ w_ih + bias).reshape(batch, seq_len, -1)
+            h = np.zeros((batch, H), dtype=np.float32)
+            c = np.zeros((batch, H), dtype=np.float32)
+            outputs = np.empty((batch, seq_len, H), dtype=np.float32)
+
+            for t in range(seq_len):
+                gates = x_proj[:, t] + h @ w_hh
+                i = _sigmoid(gates[:, :H])
+                f = _sigmoid(gates[:, H:2 * H])
+                g = np.tanh(gates[:, 2 * H:3 * H])
+                o = _sigmoid(gates[:, 3 * H:])
+                c = f * c + i * g
+                h = o * np.tanh(c)
+                outputs[:, t] = h
+
+            x = outputs
+
+        hidden = np.maximum(x[:, -1] @ self.fc1_w + self.fc1_b, 0.0)
+        return hidden @ self.fc2_w + self.fc2_b
+
+
+# ==========================================
+# EXPORT / LOAD
+# ==========================================
+def export_weights(state_dict, scaler, target_scaler, path: str):
+    """
+    Writes model weights + scaler parameters to one .npz
+
+    Args:
+        state_dict: BusinessLSTM state_dict (torch tensors or arrays)
+        scaler: Fitted feature StandardScaler
+        target_scaler: Fitted target StandardScaler
+        path: Output .npz path
+    """
+    arrays = {
+        key: (value.detach().cpu().numpy() if hasattr(value, 'detach') else np.asarray(value))
+        for key, value in state_dict.items()
+    }
+    arrays['scaler.mean'] = np.asarray(scaler.mean_, dtype=np.float64)
+    arrays['scaler.scale'] = np.asarray(scaler.scale_, dtype=np.float64)
+    arrays['target_scaler.mean'] = np.asarray(target_scaler.mean_, dtype=np.float64)
+    arrays['target_scaler.scale'] = np.asarray(target_scaler.scale_, dtype=np.float64)
+    np.savez(path, **arrays)
+
+
+def model_from_arrays(arrays: Dict[str, np.ndarray],
+                      copy: bool = True) -> Tuple[NumpyBusinessLSTM, ArrayScaler, ArrayScaler]:
+    """(model, feature scaler, target scaler) from export_weights-style arrays"""
+    arrays = dict(arrays)
+    scaler = ArrayScaler(arrays.pop('scaler.mean'), arrays.pop('scaler.scale'))
+    target_scaler = ArrayScaler(arrays.pop('target_scaler.mean'), arrays.pop('target_scaler.scale'))
+    return NumpyBusinessLSTM(arrays, copy=copy), scaler, target_scaler
+
+
+def load_numpy_model(path: str) -> Tuple[NumpyBusinessLSTM, ArrayScaler, ArrayScaler]:
+    """Loads (model, feature scaler, target scaler) from an exported .npz"""
+    with np.load(path) as data:
+        arrays = {key: data[key] for key in data.files}
+    return model_from_arrays(arrays)
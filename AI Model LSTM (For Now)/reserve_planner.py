@@ -0,0 +1,318 @@
+"""
+reserve_planner.py - FLOW Auto-Reserve Coalescing
+Nets pending reserve intents per wallet and issues one CIH transfer each
+
+Every check_and_reserve normally pays a full simulate → OTP → confirm
+round-trip. With a planner in front of the CIH client, intents for the same
+(contract_id, pot_phone) are collected over a window, netted, and sent as a
+single transfer. Every intent keeps an audit record pointing at the
+transaction reference that carried it.
+
+Usage:
+    planner = ReservePlanner(cih_api, window_seconds=3600)
+    planner.add_intent('LAN19...', '212666233333', '212666999999', 250_000,
+                       business_id='shop_a', intent_key='2025-W49')
+    audit = planner.flush()          # wallets whose window has closed
+    audit = planner.flush(force=True)  # everything pending
+
+Transfers that failed before confirmation (simulation / OTP) go back to
+the pending set and are retried with exponential backoff, at most
+max_attempts times ('abandoned' after that). A failed or timed-out
+confirmation may already have moved money, so it is never retried: those
+wallets become 'needs_reconciliation' (as does every wallet of a flush
+whose reserve_many call raised) until reconcile() settles them.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, List, Optional
+
+# Failure stages that are safe to retry (nothing can have been transferred yet)
+RETRYABLE_STAGES = ('simulation', 'otp')
+
+logger = logging.getLogger(__name__)
+
+
+class ReservePlanner:
+    """
+    Collects reserve intents and nets them per (contract_id, pot_phone)
+
+    Intents sharing an intent_key (e.g. the ISO week being reserved) replace
+    each other, so re-running the analysis for the same week does not
+    reserve twice. After a settled flush (reserved, netted out or awaiting
+    reconciliation) the key is remembered for dedup_seconds: a repeat within
+    that time is ignored (returned with status 'duplicate') instead of
+    reserving again. Negative amounts are allowed and net against positive
+    ones (corrections); a wallet whose net is negative is recorded as
+    'not_transferred' - the planner only moves money into the pot.
+
+    Args:
+        cih_api: CIH client with reserve_many
+        window_seconds: Netting window per wallet
+        audit_log_size: Most recent audit records kept in audit_log
+        dedup_seconds: How long flushed intent keys are remembered
+        max_attempts: Transfer attempts per wallet before it is abandoned
+        retry_backoff: Delay before the first retry, doubled per attempt
+        clock: Time source (tests / simulations)
+    """
+
+    def __init__(self, cih_api, window_seconds: float = 3600.0, audit_log_size: int = 10000,
+                 dedup_seconds: float = 14 * 24 * 3600, max_attempts: int = 3,
+                 retry_backoff: float = 300.0, clock=time.time):
+        self.cih_api = cih_api
+        self.window_seconds = window_seconds
+        self.dedup_seconds = dedup_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.clock = clock
+        self.audit_log = deque(maxlen=audit_log_size)
+        self._pending: Dict[tuple, Dict] = {}
+        self._unresolved: Dict[tuple, Dict] = {}  # wallets awaiting reconcile()
+        self._flushed_keys: Dict[tuple, Dict] = {}  # (contract_id, pot_phone, intent_key) → flush outcome
+        self._lock = threading.Lock()
+
+    # ==========================================
+    # INTENTS
+    # ==========================================
+
+    def add_intent(self, contract_id: str, user_phone: str, pot_phone: str, amount: float,
+                   business_id: Optional[str] = None, intent_key: Optional[str] = None) -> Dict:
+        """
+        Records a reserve intent for later netting
+
+        Args:
+            contract_id: User's CIH contract ID
+            user_phone: User's phone number (source wallet)
+            pot_phone: Emergency pot phone number
+            amount: Amount to reserve in MAD (negative = release)
+            business_id: Business the intent came from (audit only)
+            intent_key: Intents with the same key on one wallet replace each other
+
+        Returns:
+            The intent record (with its intent_id); status 'duplicate' plus
+            the earlier transaction_ref / previous_status if its key was
+            flushed recently
+        """
+        now = self.clock()
+        intent = {
+            'intent_id': uuid.uuid4().hex[:12],
+            'business_id': business_id,
+            'contract_id': contract_id,
+            'pot_phone': pot_phone,
+            'amount': float(amount),
+            'intent_key': intent_key,
+            'created_at': now
+        }
+
+        with self._lock:
+            flushed = self._flushed_keys.get((contract_id, pot_phone, intent_key))
+            if flushed is not None and now - flushed['flushed_at'] < self.dedup_seconds:
+                duplicate = dict(intent, status='duplicate', transaction_ref=flushed['transaction_ref'],
+                                 previous_status=flushed['status'], flushed_at=now)
+                self.audit_log.append(duplicate)
+                return duplicate
+            wallet = self._pending.setdefault((contract_id, pot_phone), {
+                'user_phone': user_phone, 'opened_at': now, 'intents': {}, 'attempts': 0, 'retry_at': now
+            })
+            wallet['user_phone'] = user_phone
+            key = intent_key if intent_key is not None else intent['intent_id']
+            replaced = wallet['intents'].pop(key, None)
+            wallet['intents'][key] = intent
+
+        if replaced is not None:
+            self.audit_log.append(dict(replaced, status='superseded', superseded_by=intent['intent_id'],
+                                       flushed_at=now))
+        return intent
+
+    def pending(self) -> Dict[tuple, float]:
+        """Current net amount per (contract_id, pot_phone)"""
+        with self._lock:
+            return {key: sum(i['amount'] for i in wallet['intents'].values())
+                    for key, wallet in self._pending.items()}
+
+    # ==========================================
+    # FLUSH
+    # ==========================================
+
+    def flush(self, force: bool = False) -> List[Dict]:
+        """
+        Sends one transfer per wallet whose window has closed
+
+        Args:
+            force: Flush every pending wallet regardless of its window and
+                   retry backoff
+
+        Outcomes (audit record status):
+            reserved              transfer confirmed
+            netted_out            intents cancelled out, nothing to send
+            not_transferred       net release (< 0), nothing sent
+            failed                failed before confirmation, re-queued
+            abandoned             failed before confirmation max_attempts times
+            needs_reconciliation  confirmation failed / timed out, or
+                                  reserve_many raised: money may have moved,
+                                  never retried (see reconcile)
+
+        If reserve_many raises, the exception propagates after the flushed
+        wallets are recorded as needs_reconciliation.
+
+        Returns:
+            Audit records for the flushed intents
+        """
+        now = self.clock()
+        with self._lock:
+            due = [key for key, wallet in self._pending.items()
+                   if force or (now - wallet['opened_at'] >= self.window_seconds and now >= wallet['retry_at'])]
+            wallets = {key: self._pending.pop(key) for key in due}
+
+        transfers = {}
+        for (contract_id, pot_phone), wallet in wallets.items():
+            net = sum(intent['amount'] for intent in wallet['intents'].values())
+            if net > 0:
+                transfers[(contract_id, pot_phone)] = {
+                    'user_contract_id': contract_id,
+                    'user_phone': wallet['user_phone'],
+                    'pot_phone': pot_phone,
+                    'amount': net
+                }
+
+        try:
+            results = dict(zip(transfers, self.cih_api.reserve_many(list(transfers.values()))))
+        except Exception as e:
+            unknown = {'success': False, 'error': f"reserve_many raised: {e}", 'stage': None}
+            self._settle(wallets, {key: unknown for key in transfers}, now)
+            logger.error(f"Reserve planner: reserve_many failed - {len(transfers)} transfer(s) need reconciliation")
+            raise
+        if wallets:
+            logger.info(f"Reserve planner: {sum(len(w['intents']) for w in wallets.values())} intent(s) "
+                        f"→ {len(transfers)} transfer(s)")
+        return self._settle(wallets, results, now)
+
+    def _settle(self, wallets: Dict[tuple, Dict], results: Dict[tuple, Dict], now: float) -> List[Dict]:
+        """Audit records for flushed wallets; re-queues retryable failures"""
+        records, retry, unresolved = [], {}, {}
+        for key, wallet in wallets.items():
+            intents = list(wallet['intents'].values())
+            net = sum(intent['amount'] for intent in intents)
+            result = results.get(key)
+            attempt = wallet['attempts'] + 1 if result is not None else wallet['attempts']
+            reference, error = None, None
+
+            if result is None:
+                status = 'netted_out' if net == 0 else 'not_transferred'
+            elif result['success']:
+                status, reference = 'reserved', result.get('transaction_ref')
+            else:
+                reference, error = result.get('transaction_ref'), result.get('error')
+                wallet['attempts'] = attempt
+                if result.get('stage') not in RETRYABLE_STAGES:
+                    status = 'needs_reconciliation'
+                    unresolved[key] = dict(wallet, net_amount=net, transaction_ref=reference, error=error)
+                elif attempt >= self.max_attempts:
+                    status = 'abandoned'
+                else:
+                    status = 'failed'
+                    wallet['retry_at'] = now + self.retry_backoff * 2 ** (attempt - 1)
+                    retry[key] = wallet
+
+            for intent in intents:
+                records.append(dict(
+                    intent,
+                    status=status,
+                    net_amount=net,
+                    transaction_ref=reference,
+                    error=error,
+                    intents_in_transfer=len(intents),
+                    attempt=attempt,
+                    flushed_at=now
+                ))
+
+        with self._lock:
+            for record in records:
+                if record['status'] in ('reserved', 'netted_out', 'needs_reconciliation') \
+                        and record['intent_key'] is not None:
+                    self._flushed_keys[(record['contract_id'], record['pot_phone'], record['intent_key'])] = {
+                        'flushed_at': now, 'transaction_ref': record['transaction_ref'], 'status': record['status']}
+            expired = [key for key, flushed in self._flushed_keys.items()
+                       if now - flushed['flushed_at'] >= self.dedup_seconds]
+            for key in expired:
+                del self._flushed_keys[key]
+            self._unresolved.update(unresolved)
+        if retry:
+            self._requeue(retry)
+            logger.warning(f"Reserve planner: {len(retry)} transfer(s) failed before confirmation - re-queued")
+        for status, message in (('abandoned', f"abandoned after {self.max_attempts} attempt(s)"),
+                                ('needs_reconciliation', "need reconciliation (confirmation outcome unknown)"),
+                                ('not_transferred', "with a net release not transferred")):
+            count = len({(r['contract_id'], r['pot_phone']) for r in records if r['status'] == status})
+            if count:
+                logger.warning(f"Reserve planner: {count} wallet(s) {message}")
+
+        self.audit_log.extend(records)
+        return records
+
+    def _requeue(self, wallets: Dict[tuple, Dict]):
+        """Puts flushed wallets back (original window kept); intents added since win on key clashes"""
+        with self._lock:
+            for key, wallet in wallets.items():
+                current = self._pending.get(key)
+                if current is None:
+                    self._pending[key] = wallet
+                    continue
+                current['intents'] = {**wallet['intents'], **current['intents']}
+                current['opened_at'] = min(current['opened_at'], wallet['opened_at'])
+                current['attempts'] = max(current['attempts'], wallet['attempts'])
+                current['retry_at'] = max(current['retry_at'], wallet['retry_at'])
+
+    # ==========================================
+    # RECONCILIATION
+    # ==========================================
+
+    def unresolved(self) -> Dict[tuple, Dict]:
+        """Wallets whose transfer outcome is unknown: {(contract_id, pot_phone): {net_amount, transaction_ref, ...}}"""
+        with self._lock:
+            return {key: {name: value for name, value in wallet.items() if name != 'intents'}
+                    for key, wallet in self._unresolved.items()}
+
+    def reconcile(self, contract_id: str, pot_phone: str, transferred: bool,
+                  transaction_ref: Optional[str] = None) -> List[Dict]:
+        """
+        Settles a needs_reconciliation wallet once its CIH outcome is known
+
+        Args:
+            contract_id: User's CIH contract ID
+            pot_phone: Emergency pot phone number
+            transferred: The money reached the pot (status 'reserved');
+                         False re-queues the intents for a fresh transfer
+            transaction_ref: Reference of the confirmed transfer
+
+        Returns:
+            Audit records for the settled intents
+        """
+        now = self.clock()
+        key = (contract_id, pot_phone)
+        with self._lock:
+            wallet = self._unresolved.pop(key)
+        status = 'reserved' if transferred else 'failed'
+        reference = (transaction_ref or wallet['transaction_ref']) if transferred else None
+        intents = list(wallet['intents'].values())
+        records = [dict(intent, status=status, net_amount=wallet['net_amount'], transaction_ref=reference,
+                        error=None if transferred else wallet['error'], intents_in_transfer=len(intents),
+                        attempt=wallet['attempts'], flushed_at=now, reconciled=True)
+                   for intent in intents]
+
+        with self._lock:
+            for intent in intents:
+                flushed_key = (contract_id, pot_phone, intent['intent_key'])
+                if transferred and intent['intent_key'] is not None:
+                    self._flushed_keys[flushed_key] = {'flushed_at': now, 'transaction_ref': reference,
+                                                       'status': 'reserved'}
+                else:
+                    self._flushed_keys.pop(flushed_key, None)
+        if not transferred:
+            self._requeue({key: {'user_phone': wallet['user_phone'], 'opened_at': wallet['opened_at'],
+                                 'intents': wallet['intents'], 'attempts': 0, 'retry_at': now}})
+        self.audit_log.extend(records)
+        return records
@@ -0,0 +1,206 @@
+"""
+sequences.py - FLOW Training Sequences
+Sliding-window (X, y) training pairs as strided views, with batches
+materialized on demand
+
+The [N, seq_len, features] window tensor is never built: sliding_windows
+returns views of the scaled series (N windows cost no memory beyond the
+series itself) and WindowLoader gathers only the current batch into a
+contiguous tensor. Memory stays O(weeks x features) instead of
+O(weeks x seq_len x features), and build time is constant.
+
+Usage:
+    train_set = WindowDataset(features, targets, seq_len=8, horizon=4)
+    train_loader = WindowLoader(train_set, batch_size=16, shuffle=True)
+    for X, y in train_loader:       # X [16, 8, 12], y [16, 4] float32 tensors
+        ...
+
+    # Many businesses concatenated (long format, rows grouped by business)
+    train_set = WindowDataset(features, targets, groups=business_idx)
+    for X, y, b in WindowLoader(train_set):   # b [16] business index per window
+        ...
+
+Benchmark against the list-of-slices builder on a synthetic series:
+    python sequences.py --weeks 1000000
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+import torch
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def sliding_windows(features: np.ndarray, targets: np.ndarray, seq_len: int = 8,
+                    horizon: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    All (past seq_len weeks, next horizon targets) pairs of a series, as views
+
+    Args:
+        features: [T, num_features] scaled feature rows in time order
+        targets: [T] scaled target per week
+        seq_len: Weeks of history per window
+        horizon: Weeks to predict
+
+    Returns:
+        X: [N, seq_len, num_features] read-only view (N = T - seq_len - horizon + 1)
+        y: [N, horizon] read-only view
+    """
+    n = len(features) - seq_len - horizon + 1
+    if n <= 0:
+        empty = np.empty((0, seq_len, features.shape[1]), dtype=features.dtype)
+        return empty, np.empty((0, horizon), dtype=targets.dtype)
+    # sliding_window_view puts the window axis last: [T - seq_len + 1, F, seq_len]
+    X = sliding_window_view(features, seq_len, axis=0).transpose(0, 2, 1)[:n]
+    y = sliding_window_view(targets[seq_len:], horizon)[:n]
+    return X, y
+
+
+class WindowDataset(torch.utils.data.Dataset):
+    """
+    Training windows over one (or several concatenated) series
+
+    Args:
+        features: [T, num_features] scaled features
+        targets: [T] scaled target
+        seq_len, horizon: Window geometry
+        starts: Window start rows to use (default: every full window; pass
+                a subset to skip windows crossing a business boundary)
+        groups: [T] business index per row of several concatenated series
+                (rows of one business contiguous). Windows crossing a
+                business boundary are skipped and every item / batch also
+                carries its business index: (X, y, business_idx).
+        dtype: Storage dtype (the series is converted once)
+    """
+
+    def __init__(self, features: np.ndarray, targets: np.ndarray, seq_len: int = 8, horizon: int = 4,
+                 starts: Optional[np.ndarray] = None, groups: Optional[np.ndarray] = None, dtype=np.float32):
+        self.features = np.ascontiguousarray(features, dtype=dtype)
+        self.targets = np.ascontiguousarray(targets, dtype=dtype)
+        self.seq_len = seq_len
+        self.horizon = horizon
+        self.X, self.y = sliding_windows(self.features, self.targets, seq_len, horizon)
+        self.groups = None if groups is None else np.asarray(groups, dtype=np.int64)
+        if starts is None and self.groups is not None:
+            # A window stays inside one business iff its first and last rows do
+            n, last = len(self.X), seq_len + horizon - 1
+            starts = np.flatnonzero(self.groups[:n] == self.groups[last:last + n])
+        self.starts = np.arange(len(self.X)) if starts is None else np.asarray(starts, dtype=np.int64)
+        if len(self.starts) and (self.starts.min() < 0 or self.starts.max() >= len(self.X)):
+            raise ValueError(f"Window starts must lie in [0, {len(self.X)})")
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, index: int) -> Tuple[torch.Tensor, ...]:
+        start = self.starts[index]
+        item = (torch.from_numpy(self.X[start].copy()), torch.from_numpy(self.y[start].copy()))
+        if self.groups is not None:
+            item += (torch.tensor(self.groups[start]),)
+        return item
+
+    def batch(self, indices) -> Tuple[torch.Tensor, ...]:
+        """Gathers windows into contiguous [B, seq_len, F] / [B, horizon] (/ [B] business) tensors"""
+        starts = self.starts[indices]
+        batch = (torch.from_numpy(self.X[starts]), torch.from_numpy(self.y[starts]))
+        if self.groups is not None:
+            batch += (torch.from_numpy(self.groups[starts]),)
+        return batch
+
+    def tensors(self) -> Tuple[torch.Tensor, ...]:
+        """Every window at once (evaluation / export of small sets)"""
+        return self.batch(slice(None))
+
+
+class WindowLoader:
+    """
+    DataLoader stand-in yielding batches gathered straight from a WindowDataset
+
+    One fancy-index gather per batch replaces DataLoader's per-sample
+    __getitem__ + collate. Shuffling draws from torch's global RNG, so
+    torch.manual_seed keeps runs reproducible.
+    """
+
+    def __init__(self, dataset: WindowDataset, batch_size: int = 16, shuffle: bool = False,
+                 drop_last: bool = False):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+
+    def __len__(self) -> int:
+        if self.drop_last:
+            return len(self.dataset) // self.batch_size
+        return -(-len(self.dataset) // self.batch_size)
+
+    def __iter__(self):
+        n = len(self.dataset)
+        order = torch.randperm(n).numpy() if self.shuffle else np.arange(n)
+        for batch in range(len(self)):
+            yield self.dataset.batch(order[batch * self.batch_size:(batch + 1) * self.batch_size])
+
+
+# ==========================================
+# BENCHMARK
+# ==========================================
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    import tracemalloc
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--weeks', type=int, default=1_000_000)
+    parser.add_argument('--features', type=int, default=12)
+    parser.add_argument('--batch-size', type=int, default=256)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    features = rng.standard_normal((args.weeks, args.features))
+    targets = rng.standard_normal(args.weeks)
+
+    def list_of_slices():
+        """The original trainLSTM.create_sequences"""
+        X_list, y_list = [], []
+        for i in range(len(features) - 8 - 4 + 1):
+            X_list.append(features[i:i + 8])
+            y_list.append(targets[i + 8:i + 8 + 4])
+        return torch.FloatTensor(np.array(X_list)), torch.FloatTensor(np.array(y_list))
+
+    def strided():
+        return WindowDataset(features, targets, 8, 4)
+
+    def one_epoch(dataset):
+        if isinstance(dataset, tuple):
+            loader = torch.utils.data.DataLoader(torch.utils.data.TensorDataset(*dataset),
+                                                 batch_size=args.batch_size, shuffle=True)
+        else:
+            loader = WindowLoader(dataset, batch_size=args.batch_size, shuffle=True)
+        for X, y in loader:
+            pass
+
+    print(f"\n{'='*70}")
+    print(f"🪟 TRAINING WINDOWS - {args.weeks:,} weeks x {args.features} features, batch {args.batch_size}")
+    print(f"{'='*70}\n")
+
+    for label, build in (('list of slices → np.array → FloatTensor', list_of_slices),
+                         ('strided views + WindowDataset', strided)):
+        start = time.perf_counter()
+        dataset = build()
+        built = time.perf_counter() - start
+        del dataset
+        tracemalloc.start()  # Second build for memory (tracing slows it down)
+        dataset = build()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        one_epoch(dataset)
+        epoch = time.perf_counter() - start
+        print(f"   {label:<42} build {built:6.2f} s  peak {peak / 1e6:8.1f} MB  epoch of batches {epoch:6.2f} s")
+        del dataset
+
+    X, y = sliding_windows(features, targets)
+    print(f"\n   windows: {X.shape} view over {features.nbytes / 1e6:.1f} MB "
+          f"(materialized: {X.size * 4 / 1e6:.1f} MB float32)")
+    print(f"\n{'='*70}\n")
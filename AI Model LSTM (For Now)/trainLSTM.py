@@ -2,34 +2,47 @@
 train_business_lstm.py - FLOW LSTM Training on Real Business Data
 Trains cashflow prediction model using actual business transactions
 This version uses REAL data patterns (not synthetic random data)
+
+One global model for every business: the CSV is long format (one row per
+business per week, `business_id` column; a file without it is one
+business). Each business is split, scaled and windowed on its own and
+gets a learned EMBED_DIM embedding, so FlowAgent serves the whole
+customer base from one set of weights.
+
+Usage:
+    python trainLSTM.py                          # one run with the Config defaults
+
+    from trainLSTM import train
+    metadata = train(HIDDEN_SIZE=32, OUTPUT_DIR='runs/h32', PUBLISH_TO_REGISTRY=False)
+    metadata['performance']['test_mape']
+
+    train(FAST_TRAINING=True, COMPILE=True)      # fit_fast loop (bench_training.py)
+
+Many configurations / segments in parallel: see train_sweep.py
 """
 
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader
 import numpy as np
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-import matplotlib.pyplot as plt
-import joblib
 import os
 import logging
 import json
+import time
 from datetime import datetime
+from typing import Dict, Optional
+
+from business_lstm import BusinessLSTM
+from features import FEATURE_COLS, engineer_features, frame_to_arrays
+from sequences import WindowDataset, WindowLoader
+from artifact_bundle import export_bundle
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
-SEED = 42
-torch.manual_seed(SEED)
-np.random.seed(SEED)
-
-os.makedirs('models', exist_ok=True)
-os.makedirs('plots', exist_ok=True)
-
 # ==========================================
 # CONFIG
 # ==========================================
@@ -39,440 +52,823 @@ class Config:
     FORECAST_HORIZON = 4  # Predict next 4 weeks
     HIDDEN_SIZE = 64
     NUM_LSTM_LAYERS = 2
-    EMBED_DIM = 4
+    EMBED_DIM = 4  # Learned per-business vector appended to every week's features
     DROPOUT = 0.3
-    
+
     # Training
     BATCH_SIZE = 16
     LEARNING_RATE = 0.001
     EPOCHS = 100
     EARLY_STOPPING_PATIENCE = 15
-    
-    # Features from your dataset
-    FEATURE_COLS = [
-        'season_type',           # 0, 1, 2 (categorical but works as numeric)
-        'distributers',          # Number of distributors
-        'fixed_pay',            # Fixed payments
-        'cost_of_raw_materials', # Variable costs
-        'other_expenditure',     # Other expenses
-        'cash_out',             # Total expenditure
-        'net_profit_margin',    # Profitability indicator
-        'week_of_year',         # Temporal feature
-        'cash_flow',            # Derived: cash_in - cash_out
-        'profit_trend_4w',      # Rolling 4-week profit trend
-        'cash_in_lag1',         # Previous week's cash_in
-        'cash_out_lag1'         # Previous week's cash_out
-    ]
-    
+    SEED = 42
+
+    # Fast loop (fit_fast): shuffled index batches over preloaded tensors,
+    # on-tensor loss sums, best weights kept in memory; optionally compiled
+    # and/or bf16 autocast (CPU). See bench_training.py for epochs/sec.
+    FAST_TRAINING = False
+    COMPILE = False
+    BF16_AUTOCAST = False
+
+    # Features from your dataset (shared with Flow_agent.py, see features.py)
+    FEATURE_COLS = list(FEATURE_COLS)
+
     # Target variable
     TARGET_COL = 'cash_in'
 
-config = Config()
+    # Data
+    DATA_PATH = "C:/Users/Dell/Desktop/flow/tsf.csv"  # Change this path!
+    SEGMENT = None  # {column: value} - train on the matching rows only, e.g. {'region': 'north'}
 
-# ==========================================
-# DATA LOADING & PREPROCESSING
-# ==========================================
-logger.info("=== Loading Real Business Data ===")
+    # Long-format data: business of each row (a CSV without the column is
+    # trained as the single business DEFAULT_BUSINESS_ID)
+    BUSINESS_ID_COL = 'business_id'
+    DEFAULT_BUSINESS_ID = 'default'
 
-# Load your CSV
-# Adjust path to your actual file location
-df = pd.read_csv("C:/Users/Dell/Desktop/flow/tsf.csv")  # Change this path!
+    # Outputs
+    OUTPUT_DIR = 'models'
+    PLOTS_DIR = 'plots'
+    SAVE_PLOTS = True
 
-logger.info(f"Loaded {len(df)} records")
-logger.info(f"Date range: {df['date of week start'].min()} to {df['date of week start'].max()}")
+    # Versioned copy of the artifacts (see model_registry.py); running agents
+    # with a RegistryWatcher hot-swap to it
+    REGISTRY_DIR = 'models/registry'
+    PUBLISH_TO_REGISTRY = True
 
-# Convert date column
-df['date'] = pd.to_datetime(df['date of week start'])
-df = df.sort_values('date').reset_index(drop=True)
+    def __init__(self, **overrides):
+        """Config(HIDDEN_SIZE=32, ...) - class defaults with per-job overrides"""
+        for name, value in overrides.items():
+            if not name.isupper() or not hasattr(Config, name):
+                raise ValueError(f"Unknown Config field: {name}")
+            setattr(self, name, value)
 
-# Create snake_case aliases for training (Config expects these)
-df['cash_in'] = df['cash in']
-df['cash_out'] = df['cash out']
-df['net_profit_margin'] = df['net profit margin']
-df['season_type'] = df['season type']
-df['fixed_pay'] = df['fixed pay']
-df['cost_of_raw_materials'] = df['cost of raw materails']  # Note CSV typo
-df['other_expenditure'] = df['other expenditure']
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in dir(Config) if name.isupper()}
 
 # ==========================================
-# FEATURE ENGINEERING
+# DATA LOADING & PREPROCESSING
 # ==========================================
-logger.info("\n=== Feature Engineering ===")
-
-# 1. Temporal features
-df['week_of_year'] = df['date'].dt.isocalendar().week
-df['month'] = df['date'].dt.month
-df['quarter'] = df['date'].dt.quarter
-
-# 2. Derived financial features
-df['cash_flow'] = df['cash in'] - df['cash out']
-df['expense_ratio'] = df['cash out'] / df['cash in'].replace(0, 1)  # Avoid division by 0
-df['profit_per_distributer'] = df['cash_flow'] / df['distributers'].replace(0, 1)
-
-# 3. Rolling features (trends)
-df['profit_trend_4w'] = df['net profit margin'].rolling(4, min_periods=1).mean()
-df['cash_in_ma_4w'] = df['cash in'].rolling(4, min_periods=1).mean()
-df['cash_out_ma_4w'] = df['cash out'].rolling(4, min_periods=1).mean()
-
-# 4. Lag features (what happened last week)
-df['cash_in_lag1'] = df['cash in'].shift(1).fillna(df['cash in'].mean())
-df['cash_out_lag1'] = df['cash out'].shift(1).fillna(df['cash out'].mean())
-df['cash_flow_lag1'] = df['cash_flow'].shift(1).fillna(df['cash_flow'].mean())
+def load_data(config: Config):
+    """
+    Reads the long-format CSV (optionally one segment of it)
 
-# 5. Volatility features
-df['cash_in_volatility'] = df['cash in'].rolling(4, min_periods=1).std().fillna(0)
+    Returns:
+        (df sorted by business then week with snake_case columns and a
+        business_idx column, business ids in business_idx order)
+    """
+    logger.info("=== Loading Real Business Data ===")
+
+    # Load your CSV
+    df = pd.read_csv(config.DATA_PATH)
+    if config.SEGMENT:
+        for column, value in config.SEGMENT.items():
+            df = df[df[column] == value]
+        if df.empty:
+            raise ValueError(f"No rows in {config.DATA_PATH} match segment {config.SEGMENT}")
+        logger.info(f"Segment {config.SEGMENT}")
+
+    if config.BUSINESS_ID_COL not in df.columns:
+        df[config.BUSINESS_ID_COL] = config.DEFAULT_BUSINESS_ID
+    df[config.BUSINESS_ID_COL] = df[config.BUSINESS_ID_COL].astype(str)
+
+    logger.info(f"Loaded {len(df)} records ({df[config.BUSINESS_ID_COL].nunique()} businesses)")
+    logger.info(f"Date range: {df['date of week start'].min()} to {df['date of week start'].max()}")
+
+    # Convert date column; each business's weeks contiguous and in time order
+    df['date'] = pd.to_datetime(df['date of week start'])
+    df = df.sort_values([config.BUSINESS_ID_COL, 'date'], kind='stable').reset_index(drop=True)
+
+    # Business index = embedding row (and per-business scaler row)
+    df['business_idx'], business_ids = pd.factorize(df[config.BUSINESS_ID_COL])
+
+    # Create snake_case aliases for training (Config expects these)
+    df['cash_in'] = df['cash in']
+    df['cash_out'] = df['cash out']
+    df['net_profit_margin'] = df['net profit margin']
+    df['season_type'] = df['season type']
+    df['fixed_pay'] = df['fixed pay']
+    df['cost_of_raw_materials'] = df['cost of raw materails']  # Note CSV typo
+    df['other_expenditure'] = df['other expenditure']
+
+    return df, list(business_ids)
 
-logger.info(f"Created {len(df.columns)} total features")
-logger.info(f"Using {len(config.FEATURE_COLS)} features for training")
+# ==========================================
+# FEATURE ENGINEERING
+# ==========================================
+def add_features(df, config: Config):
+    """Adds the model features (and the extra analysis columns) in place"""
+    logger.info("\n=== Feature Engineering ===")
+    by_business = df.groupby('business_idx', sort=False)
+
+    # 1. Model features (week_of_year, cash_flow, profit_trend_4w, lags)
+    #    Same vectorized engine the agent uses at serving time, per business so
+    #    lags and rolling windows never reach into another business's weeks
+    raw, dates = frame_to_arrays(df)
+    features = np.empty((len(df), len(config.FEATURE_COLS)))
+    for rows in by_business.indices.values():
+        features[rows] = engineer_features(raw[rows], dates[rows])
+    df[config.FEATURE_COLS] = features
+
+    # 2. Extra temporal features
+    df['month'] = df['date'].dt.month
+    df['quarter'] = df['date'].dt.quarter
+
+    # 3. Derived financial features
+    df['expense_ratio'] = df['cash out'] / df['cash in'].replace(0, 1)  # Avoid division by 0
+    df['profit_per_distributer'] = df['cash_flow'] / df['distributers'].replace(0, 1)
+
+    # 4. Rolling and lag extras (per business)
+    df['cash_in_ma_4w'] = by_business['cash in'].transform(lambda s: s.rolling(4, min_periods=1).mean())
+    df['cash_out_ma_4w'] = by_business['cash out'].transform(lambda s: s.rolling(4, min_periods=1).mean())
+    df['cash_flow_lag1'] = by_business['cash_flow'].shift(1).fillna(by_business['cash_flow'].transform('mean'))
+
+    # 5. Volatility features
+    df['cash_in_volatility'] = by_business['cash in'].transform(lambda s: s.rolling(4, min_periods=1).std()).fillna(0)
+
+    logger.info(f"Created {len(df.columns)} total features")
+    logger.info(f"Using {len(config.FEATURE_COLS)} features for training")
+    return df
 
 # ==========================================
 # TRAIN/VAL/TEST SPLIT (Temporal)
 # ==========================================
-logger.info("\n=== Splitting Data (Temporal) ===")
-
-# For time series: NO random split! Use temporal order
-n = len(df)
-train_size = int(0.7 * n)
-val_size = int(0.15 * n)
-
-train_df = df.iloc[:train_size].copy()
-val_df = df.iloc[train_size:train_size+val_size].copy()
-test_df = df.iloc[train_size+val_size:].copy()
-
-logger.info(f"Train: {len(train_df)} weeks | Val: {len(val_df)} | Test: {len(test_df)}")
-logger.info(f"Train period: {train_df['date'].min()} to {train_df['date'].max()}")
-logger.info(f"Test period: {test_df['date'].min()} to {test_df['date'].max()}")
-
-# Scale features (fit only on train)
-scaler = StandardScaler()
-train_df[config.FEATURE_COLS] = scaler.fit_transform(train_df[config.FEATURE_COLS])
-val_df[config.FEATURE_COLS] = scaler.transform(val_df[config.FEATURE_COLS])
-test_df[config.FEATURE_COLS] = scaler.transform(test_df[config.FEATURE_COLS])
-
-# Scale target separately
-target_scaler = StandardScaler()
-train_df[[config.TARGET_COL]] = target_scaler.fit_transform(train_df[[config.TARGET_COL]])
-val_df[[config.TARGET_COL]] = target_scaler.transform(val_df[[config.TARGET_COL]])
-test_df[[config.TARGET_COL]] = target_scaler.transform(test_df[[config.TARGET_COL]])
+def split_temporal(df):
+    """First 70% / next 15% / last 15% of each business's weeks"""
+    logger.info("\n=== Splitting Data (Temporal) ===")
+
+    # For time series: NO random split! Use temporal order, within each business
+    by_business = df.groupby('business_idx', sort=False)
+    position = by_business.cumcount().to_numpy()
+    n = by_business['business_idx'].transform('size').to_numpy()
+    train_size = (0.7 * n).astype(int)
+    val_size = (0.15 * n).astype(int)
+
+    train_df = df[position < train_size].copy()
+    val_df = df[(position >= train_size) & (position < train_size + val_size)].copy()
+    test_df = df[position >= train_size + val_size].copy()
+
+    logger.info(f"Train: {len(train_df)} weeks | Val: {len(val_df)} | Test: {len(test_df)}")
+    logger.info(f"Train period: {train_df['date'].min()} to {train_df['date'].max()}")
+    logger.info(f"Test period: {test_df['date'].min()} to {test_df['date'].max()}")
+    return train_df, val_df, test_df
+
+def fit_scalers(train_df, config: Config, num_businesses: int):
+    """
+    Scalers fit only on train weeks
 
-logger.info(f"Target scaling - Mean: {target_scaler.mean_[0]:.2f}, Std: {target_scaler.scale_[0]:.2f}")
+    Returns:
+        (global feature scaler, global target scaler, per-business scalers).
+        The global pair is what the agent falls back to for a business the
+        model has never seen; the per-business rows (business_idx order)
+        bring small and large merchants to the shared LSTM in comparable units.
+    """
+    scaler = StandardScaler().fit(train_df[config.FEATURE_COLS])
+    target_scaler = StandardScaler().fit(train_df[[config.TARGET_COL]])
+
+    columns = config.FEATURE_COLS + [config.TARGET_COL]
+    grouped = train_df.groupby('business_idx')[columns]
+    mean = grouped.mean().reindex(range(num_businesses))
+    std = grouped.std(ddof=0).reindex(range(num_businesses))
+
+    # Global values where a business has no train weeks
+    global_mean = np.append(scaler.mean_, target_scaler.mean_)
+    global_std = np.append(scaler.scale_, target_scaler.scale_)
+    mean = mean.fillna(pd.Series(global_mean, index=columns)).to_numpy()
+    std = std.fillna(pd.Series(global_std, index=columns)).to_numpy()
+    std[std == 0] = 1.0  # Constant column, as StandardScaler does
+
+    business_scalers = {
+        'feature_mean': mean[:, :-1], 'feature_scale': std[:, :-1],
+        'target_mean': mean[:, -1], 'target_scale': std[:, -1]
+    }
+    logger.info(f"Target scaling - Global mean: {target_scaler.mean_[0]:.2f}, Std: {target_scaler.scale_[0]:.2f} "
+                f"({num_businesses} per-business scalers)")
+    return scaler, target_scaler, business_scalers
+
+def scale_by_business(frame, config: Config, business_scalers: Dict):
+    """Scales features and target in place with each row's business scaler"""
+    rows = frame['business_idx'].to_numpy()
+    frame[config.FEATURE_COLS] = ((frame[config.FEATURE_COLS].to_numpy() - business_scalers['feature_mean'][rows])
+                                  / business_scalers['feature_scale'][rows])
+    frame[config.TARGET_COL] = ((frame[config.TARGET_COL].to_numpy() - business_scalers['target_mean'][rows])
+                                / business_scalers['target_scale'][rows])
 
 # ==========================================
 # SEQUENCE CREATION
 # ==========================================
-logger.info("\n=== Creating Sequences ===")
-
-def create_sequences(df, seq_len=8, horizon=4):
+def create_sequences(df, config: Config):
     """
     Creates sequences for multi-step forecasting
-    
+
+    Windows are strided views of the scaled columns (see sequences.py);
+    batches are gathered on demand by WindowLoader. Windows never span two
+    businesses.
+
     Returns:
-        X: [N, seq_len, num_features] - Past 8 weeks of features
-        y: [N, horizon] - Next 4 weeks of cash_in to predict
+        WindowDataset of X: [seq_len, num_features] (past 8 weeks of features),
+        y: [horizon] (next 4 weeks of cash_in to predict) and business index triples
     """
-    X_list, y_list = [], []
-    
-    features = df[config.FEATURE_COLS].values
-    targets = df[config.TARGET_COL].values
-    
-    for i in range(len(features) - seq_len - horizon + 1):
-        X_list.append(features[i:i+seq_len])
-        y_list.append(targets[i+seq_len:i+seq_len+horizon])
-    
-    X_array = np.array(X_list)
-    y_array = np.array(y_list)
-    
-    return torch.FloatTensor(X_array), torch.FloatTensor(y_array)
-
-X_train, y_train = create_sequences(train_df, config.SEQ_LENGTH, config.FORECAST_HORIZON)
-X_val, y_val = create_sequences(val_df, config.SEQ_LENGTH, config.FORECAST_HORIZON)
-X_test, y_test = create_sequences(test_df, config.SEQ_LENGTH, config.FORECAST_HORIZON)
-
-logger.info(f"Train sequences: {len(X_train)} | Val: {len(X_val)} | Test: {len(X_test)}")
-logger.info(f"Input shape: {X_train.shape} | Output shape: {y_train.shape}")
-
-# DataLoaders
-train_loader = DataLoader(
-    torch.utils.data.TensorDataset(X_train, y_train),
-    batch_size=config.BATCH_SIZE, 
-    shuffle=True
-)
-val_loader = DataLoader(
-    torch.utils.data.TensorDataset(X_val, y_val),
-    batch_size=config.BATCH_SIZE
-)
-test_loader = DataLoader(
-    torch.utils.data.TensorDataset(X_test, y_test),
-    batch_size=config.BATCH_SIZE
-)
+    return WindowDataset(df[config.FEATURE_COLS].to_numpy(), df[config.TARGET_COL].to_numpy(),
+                         config.SEQ_LENGTH, config.FORECAST_HORIZON, groups=df['business_idx'].to_numpy())
 
 # ==========================================
 # MODEL DEFINITION
 # ==========================================
-class BusinessLSTM(nn.Module):
-    """
-    LSTM for business cashflow forecasting
-    Predicts next 4 weeks of cash_in based on past 8 weeks
-    """
-    
-    def __init__(self, num_features, hidden=64, forecast_weeks=4, num_layers=2, dropout=0.3):
-        super().__init__()
-        
-        self.lstm = nn.LSTM(
-            input_size=num_features,
-            hidden_size=hidden,
-            num_layers=num_layers,
-            batch_first=True,
-            dropout=dropout if num_layers > 1 else 0
-        )
-        
-        self.fc1 = nn.Linear(hidden, hidden // 2)
-        self.fc2 = nn.Linear(hidden // 2, forecast_weeks)
-        self.dropout = nn.Dropout(dropout)
-        self.relu = nn.ReLU()
-    
-    def forward(self, x):
-        # x: [batch, seq_len, features]
-        lstm_out, _ = self.lstm(x)
-        last_hidden = lstm_out[:, -1, :]  # [batch, hidden]
-        
-        x = self.relu(self.fc1(self.dropout(last_hidden)))
-        predictions = self.fc2(self.dropout(x))  # [batch, 4 weeks]
-        
-        return predictions
-
-model = BusinessLSTM(
-    num_features=len(config.FEATURE_COLS),
-    hidden=config.HIDDEN_SIZE,
-    forecast_weeks=config.FORECAST_HORIZON,
-    num_layers=config.NUM_LSTM_LAYERS,
-    dropout=config.DROPOUT
-)
-
-num_params = sum(p.numel() for p in model.parameters())
-logger.info(f"\nModel created: {num_params:,} parameters")
-
-criterion = nn.MSELoss()
-optimizer = optim.Adam(model.parameters(), lr=config.LEARNING_RATE)
-scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, patience=5, factor=0.5, verbose=False)
+# BusinessLSTM lives in business_lstm.py (shared with Flow_agent.py)
+
+def build_model(config: Config, num_businesses: int) -> BusinessLSTM:
+    model = BusinessLSTM(
+        num_features=len(config.FEATURE_COLS),
+        hidden=config.HIDDEN_SIZE,
+        forecast_weeks=config.FORECAST_HORIZON,
+        num_layers=config.NUM_LSTM_LAYERS,
+        dropout=config.DROPOUT,
+        num_businesses=num_businesses,
+        embed_dim=config.EMBED_DIM
+    )
+
+    num_params = sum(p.numel() for p in model.parameters())
+    logger.info(f"\nModel created: {num_params:,} parameters")
+    return model
 
 # ==========================================
 # TRAINING LOOP
 # ==========================================
-logger.info("\n=== Training Started ===")
+def fit(model, train_loader, val_loader, config: Config, checkpoint_path: str):
+    """
+    Adam + ReduceLROnPlateau + early stopping; the best epoch's weights are
+    saved to checkpoint_path and loaded back into the model
 
-best_val_loss = float('inf')
-patience_counter = 0
-history = {'train': [], 'val': []}
+    Returns:
+        (history {'train': [...], 'val': [...]}, best_val_loss)
+    """
+    logger.info("\n=== Training Started ===")
+
+    criterion = nn.MSELoss()
+    optimizer = optim.Adam(model.parameters(), lr=config.LEARNING_RATE)
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, patience=5, factor=0.5)
+
+    best_val_loss = float('inf')
+    patience_counter = 0
+    history = {'train': [], 'val': []}
+
+    for epoch in range(config.EPOCHS):
+        # Train
+        model.train()
+        train_loss = 0
+        for X, y, b in train_loader:
+            optimizer.zero_grad()
+            pred = model(X, b)
+            loss = criterion(pred, y)
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+            optimizer.step()
+            train_loss += loss.item()
+
+        # Validate
+        model.eval()
+        val_loss = 0
+        with torch.no_grad():
+            for X, y, b in val_loader:
+                pred = model(X, b)
+                val_loss += criterion(pred, y).item()
+
+        avg_train = train_loss / len(train_loader)
+        avg_val = val_loss / len(val_loader)
+        history['train'].append(avg_train)
+        history['val'].append(avg_val)
+
+        if (epoch + 1) % 10 == 0:
+            logger.info(f"Epoch {epoch+1:03d}/{config.EPOCHS} | Train: {avg_train:.6f} | Val: {avg_val:.6f}")
+
+        scheduler.step(avg_val)
+
+        # Early stopping
+        if avg_val < best_val_loss:
+            best_val_loss = avg_val
+            patience_counter = 0
+            torch.save(model.state_dict(), checkpoint_path)
+            if (epoch + 1) % 10 == 0:
+                logger.info("  ✓ Best model saved")
+        else:
+            patience_counter += 1
+            if patience_counter >= config.EARLY_STOPPING_PATIENCE:
+                logger.info(f"\n⏹ Early stopping at epoch {epoch+1}")
+                break
+
+    # Load best model
+    model.load_state_dict(torch.load(checkpoint_path, weights_only=True))
+    logger.info("\n=== Training Complete - Best Model Loaded ===")
+    return history, best_val_loss
+
+def make_optimizer(model, config: Config):
+    """fit_fast's Adam (fused) + ReduceLROnPlateau"""
+    optimizer = optim.Adam(model.parameters(), lr=config.LEARNING_RATE, fused=True)
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, patience=5, factor=0.5)
+    return optimizer, scheduler
+
+def fast_epoch(model, forward, optimizer, tensors, batch_size: int, bf16: bool = False) -> torch.Tensor:
+    """
+    One shuffled pass over preloaded (X, y, business_idx) tensors
 
-for epoch in range(config.EPOCHS):
-    # Train
+    Returns:
+        Mean batch loss as a 0-d tensor (no host sync until the caller reads it)
+    """
+    X, y, b = tensors
     model.train()
-    train_loss = 0
-    for X, y in train_loader:
-        optimizer.zero_grad()
-        pred = model(X)
-        loss = criterion(pred, y)
+    total = torch.zeros(())
+    order = torch.randperm(len(X))
+    batches = order.split(batch_size)
+    for batch in batches:
+        optimizer.zero_grad(set_to_none=True)
+        with torch.autocast('cpu', dtype=torch.bfloat16, enabled=bf16):
+            pred = forward(X[batch], b[batch])
+        loss = nn.functional.mse_loss(pred.float(), y[batch])
         loss.backward()
         torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
         optimizer.step()
-        train_loss += loss.item()
-    
-    # Validate
+        total += loss.detach()
+    return total / len(batches)
+
+def fast_validation_loss(model, forward, tensors, bf16: bool = False) -> float:
+    """MSE over every window of preloaded (X, y, business_idx) tensors"""
+    X, y, b = tensors
     model.eval()
-    val_loss = 0
-    with torch.no_grad():
-        for X, y in val_loader:
-            pred = model(X)
-            val_loss += criterion(pred, y).item()
-    
-    avg_train = train_loss / len(train_loader)
-    avg_val = val_loss / len(val_loader)
-    history['train'].append(avg_train)
-    history['val'].append(avg_val)
-    
-    if (epoch + 1) % 10 == 0:
-        logger.info(f"Epoch {epoch+1:03d}/{config.EPOCHS} | Train: {avg_train:.6f} | Val: {avg_val:.6f}")
-    
-    scheduler.step(avg_val)
-    
-    # Early stopping
-    if avg_val < best_val_loss:
-        best_val_loss = avg_val
-        patience_counter = 0
-        torch.save(model.state_dict(), 'models/business_lstm.pt')
-        if (epoch + 1) % 10 == 0:
-            logger.info("  ✓ Best model saved")
-    else:
-        patience_counter += 1
-        if patience_counter >= config.EARLY_STOPPING_PATIENCE:
-            logger.info(f"\n⏹ Early stopping at epoch {epoch+1}")
-            break
+    with torch.no_grad(), torch.autocast('cpu', dtype=torch.bfloat16, enabled=bf16):
+        pred = forward(X, b)
+    return nn.functional.mse_loss(pred.float(), y).item()
 
-# Load best model
-model.load_state_dict(torch.load('models/business_lstm.pt', weights_only=True))
-logger.info("\n=== Training Complete - Best Model Loaded ===")
+def fit_fast(model, train_set: WindowDataset, val_set: WindowDataset, config: Config, checkpoint_path: str):
+    """
+    fit() without the per-step overhead: same optimizer, schedule and early
+    stopping, but
+
+      - every window is gathered once up front, and batches are slices of a
+        shuffled index permutation over those tensors
+      - losses are summed on-tensor; the only host syncs are one per epoch
+        (the validation loss the scheduler / early stopping need)
+      - Adam runs as one fused kernel over all parameters
+      - the best weights are kept as an in-memory copy and the checkpoint is
+        written once, after the last epoch
+      - config.COMPILE runs the model through torch.compile,
+        config.BF16_AUTOCAST runs forward passes under CPU bf16 autocast
+        (the loss and the optimizer stay float32)
+
+    Validation loss is the MSE over all validation windows (fit() averages
+    per-batch means, which weighs a short last batch more).
+
+    Returns:
+        (history {'train': [...], 'val': [...]}, best_val_loss)
+    """
+    logger.info("\n=== Training Started (fast loop) ===")
+
+    train_tensors = train_set.tensors()
+    val_tensors = val_set.tensors()
+    forward = torch.compile(model) if config.COMPILE else model
+    optimizer, scheduler = make_optimizer(model, config)
+
+    best_val_loss = float('inf')
+    best_state = None
+    patience_counter = 0
+    history = {'train': [], 'val': []}
+
+    for epoch in range(config.EPOCHS):
+        train_loss = fast_epoch(model, forward, optimizer, train_tensors, config.BATCH_SIZE, config.BF16_AUTOCAST)
+        avg_val = fast_validation_loss(model, forward, val_tensors, config.BF16_AUTOCAST)
+        avg_train = train_loss.item()
+        history['train'].append(avg_train)
+        history['val'].append(avg_val)
+
+        if (epoch + 1) % 10 == 0:
+            logger.info(f"Epoch {epoch+1:03d}/{config.EPOCHS} | Train: {avg_train:.6f} | Val: {avg_val:.6f}")
+
+        scheduler.step(avg_val)
+
+        # Early stopping
+        if avg_val < best_val_loss:
+            best_val_loss = avg_val
+            patience_counter = 0
+            best_state = {name: value.detach().clone() for name, value in model.state_dict().items()}
+        else:
+            patience_counter += 1
+            if patience_counter >= config.EARLY_STOPPING_PATIENCE:
+                logger.info(f"\n⏹ Early stopping at epoch {epoch+1}")
+                break
+
+    # Best weights back into the model, one checkpoint write
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    torch.save(model.state_dict(), checkpoint_path)
+    logger.info("\n=== Training Complete - Best Model Loaded ===")
+    return history, best_val_loss
 
 # ==========================================
 # EVALUATION
 # ==========================================
-logger.info("\n=== Evaluating on Test Set ===")
-
-def inverse_transform_target(scaled_values):
-    """Convert scaled predictions back to real currency"""
-    real_values = scaled_values * target_scaler.scale_[0] + target_scaler.mean_[0]
+def inverse_transform_target(scaled_values, rows, business_scalers: Dict):
+    """Convert [N, horizon] scaled predictions back to real currency (rows: business index per window)"""
+    real_values = (scaled_values * business_scalers['target_scale'][rows, None]
+                   + business_scalers['target_mean'][rows, None])
     return real_values
 
-model.eval()
-all_preds = []
-all_actuals = []
-
-with torch.no_grad():
-    for X, y in test_loader:
-        preds = model(X)
-        all_preds.append(preds.numpy())
-        all_actuals.append(y.numpy())
-
-all_preds = np.concatenate(all_preds)
-all_actuals = np.concatenate(all_actuals)
-
-# Convert to real currency
-pred_flat = all_preds.flatten()
-actual_flat = all_actuals.flatten()
-pred_real = inverse_transform_target(pred_flat)
-actual_real = inverse_transform_target(actual_flat)
-
-mae = mean_absolute_error(actual_real, pred_real)
-rmse = np.sqrt(mean_squared_error(actual_real, pred_real))
-r2 = r2_score(actual_real, pred_real)
-mape = np.mean(np.abs((actual_real - pred_real) / actual_real)) * 100
-
-logger.info(f"\nOverall Performance:")
-logger.info(f"  MAE:  {mae:,.2f} (currency units)")
-logger.info(f"  RMSE: {rmse:,.2f}")
-logger.info(f"  R²:   {r2:.4f}")
-logger.info(f"  MAPE: {mape:.2f}%")
-
-# Week-specific accuracy
-logger.info(f"\nWeek-Specific Accuracy:")
-for week in range(1, config.FORECAST_HORIZON + 1):
-    week_preds = inverse_transform_target(all_preds[:, week-1])
-    week_actuals = inverse_transform_target(all_actuals[:, week-1])
-    week_mae = mean_absolute_error(week_actuals, week_preds)
-    week_mape = np.mean(np.abs((week_actuals - week_preds) / week_actuals)) * 100
-    logger.info(f"  Week {week}: MAE = {week_mae:,.2f} | MAPE = {week_mape:.2f}%")
-
-# Sanity check
-logger.info(f"\nSanity Check:")
-logger.info(f"  Actual cash_in range: {actual_real.min():,.0f} to {actual_real.max():,.0f}")
-logger.info(f"  Predicted cash_in range: {pred_real.min():,.0f} to {pred_real.max():,.0f}")
+def collect_predictions(model, loader):
+    """Runs a model over a loader, returns (predictions, actuals, business index) in scaled units"""
+    model.eval()
+    all_preds = []
+    all_actuals = []
+    all_rows = []
 
-# ==========================================
-# SAVE ARTIFACTS
-# ==========================================
-logger.info("\n=== Saving Production Artifacts ===")
-
-joblib.dump(scaler, 'models/business_scaler.pkl')
-joblib.dump(target_scaler, 'models/business_target_scaler.pkl')
-logger.info("✓ Scalers saved")
-
-metadata = {
-    'version': '1.0',
-    'trained_at': datetime.now().isoformat(),
-    'data_type': 'real_business_transactions',
-    'config': {
-        'seq_length': config.SEQ_LENGTH,
-        'forecast_horizon': config.FORECAST_HORIZON,
-        'hidden_size': config.HIDDEN_SIZE,
-        'num_layers': config.NUM_LSTM_LAYERS,
-        'feature_cols': config.FEATURE_COLS,
-        'target_col': config.TARGET_COL
-    },
-    'scaler_params': {
-        'target_mean': float(target_scaler.mean_[0]),
-        'target_std': float(target_scaler.scale_[0])
-    },
-    'performance': {
+    with torch.no_grad():
+        for X, y, b in loader:
+            preds = model(X, b)
+            all_preds.append(preds.numpy())
+            all_actuals.append(y.numpy())
+            all_rows.append(b.numpy())
+
+    return np.concatenate(all_preds), np.concatenate(all_actuals), np.concatenate(all_rows)
+
+def evaluate(model, test_loader, config: Config, business_scalers: Dict):
+    """
+    Test-set accuracy in real currency
+
+    Returns:
+        (performance {'test_mae', 'test_rmse', 'test_r2', 'test_mape'},
+        [N, horizon] predictions, [N, horizon] actuals, [N] business index)
+    """
+    logger.info("\n=== Evaluating on Test Set ===")
+
+    all_preds, all_actuals, test_rows = collect_predictions(model, test_loader)
+
+    # Convert to real currency
+    all_preds_real = inverse_transform_target(all_preds, test_rows, business_scalers)
+    all_actuals_real = inverse_transform_target(all_actuals, test_rows, business_scalers)
+    pred_real = all_preds_real.flatten()
+    actual_real = all_actuals_real.flatten()
+
+    mae = mean_absolute_error(actual_real, pred_real)
+    rmse = np.sqrt(mean_squared_error(actual_real, pred_real))
+    r2 = r2_score(actual_real, pred_real)
+    mape = np.mean(np.abs((actual_real - pred_real) / actual_real)) * 100
+
+    logger.info(f"\nOverall Performance:")
+    logger.info(f"  MAE:  {mae:,.2f} (currency units)")
+    logger.info(f"  RMSE: {rmse:,.2f}")
+    logger.info(f"  R²:   {r2:.4f}")
+    logger.info(f"  MAPE: {mape:.2f}%")
+
+    # Week-specific accuracy
+    logger.info(f"\nWeek-Specific Accuracy:")
+    for week in range(1, config.FORECAST_HORIZON + 1):
+        week_preds = all_preds_real[:, week-1]
+        week_actuals = all_actuals_real[:, week-1]
+        week_mae = mean_absolute_error(week_actuals, week_preds)
+        week_mape = np.mean(np.abs((week_actuals - week_preds) / week_actuals)) * 100
+        logger.info(f"  Week {week}: MAE = {week_mae:,.2f} | MAPE = {week_mape:.2f}%")
+
+    # Sanity check
+    logger.info(f"\nSanity Check:")
+    logger.info(f"  Actual cash_in range: {actual_real.min():,.0f} to {actual_real.max():,.0f}")
+    logger.info(f"  Predicted cash_in range: {pred_real.min():,.0f} to {pred_real.max():,.0f}")
+
+    performance = {
         'test_mae': float(mae),
         'test_rmse': float(rmse),
         'test_r2': float(r2),
         'test_mape': float(mape)
-    },
-    'epochs_trained': len(history['train']),
-    'best_val_loss': float(best_val_loss)
-}
+    }
+    return performance, all_preds_real, all_actuals_real, test_rows
+
+# ==========================================
+# INT8 DYNAMIC QUANTIZATION
+# ==========================================
+def quantize(model, test_loader, config: Config, business_scalers: Dict, performance: Dict,
+             all_preds_real, all_actuals_real, test_rows):
+    """
+    Int8 dynamic quantization of LSTM + fc1 + fc2, with its accuracy cost
+
+    Returns:
+        (quantized model, metadata['quantized_int8'] dict)
+    """
+    logger.info("\n=== Int8 Dynamic Quantization (LSTM + fc1 + fc2) ===")
+    mae, mape = performance['test_mae'], performance['test_mape']
+    actual_real = all_actuals_real.flatten()
+
+    quantized_model = torch.ao.quantization.quantize_dynamic(
+        model, {nn.LSTM, nn.Linear}, dtype=torch.qint8
+    )
+    q_preds, _, _ = collect_predictions(quantized_model, test_loader)
+    q_preds_real = inverse_transform_target(q_preds, test_rows, business_scalers)
+    q_pred_real = q_preds_real.flatten()
+
+    q_mae = mean_absolute_error(actual_real, q_pred_real)
+    q_mape = np.mean(np.abs((actual_real - q_pred_real) / actual_real)) * 100
+
+    logger.info(f"  MAE:  {q_mae:,.2f} (Δ vs fp32: {q_mae - mae:+,.2f})")
+    logger.info(f"  MAPE: {q_mape:.2f}% (Δ vs fp32: {q_mape - mape:+.2f} pts)")
+
+    q_week_deltas = []
+    for week in range(1, config.FORECAST_HORIZON + 1):
+        week_actuals = all_actuals_real[:, week-1]
+        fp32_week = all_preds_real[:, week-1]
+        int8_week = q_preds_real[:, week-1]
+        mae_delta = mean_absolute_error(week_actuals, int8_week) - mean_absolute_error(week_actuals, fp32_week)
+        mape_delta = (np.mean(np.abs((week_actuals - int8_week) / week_actuals))
+                      - np.mean(np.abs((week_actuals - fp32_week) / week_actuals))) * 100
+        q_week_deltas.append({'week': week, 'mae_delta': float(mae_delta), 'mape_delta': float(mape_delta)})
+        logger.info(f"  Week {week}: ΔMAE = {mae_delta:+,.2f} | ΔMAPE = {mape_delta:+.2f} pts")
+
+    return quantized_model, {
+        'test_mae': float(q_mae),
+        'test_mape': float(q_mape),
+        'mae_delta': float(q_mae - mae),
+        'mape_delta': float(q_mape - mape),
+        'week_deltas': q_week_deltas
+    }
+
+# ==========================================
+# SAVE ARTIFACTS
+# ==========================================
+def export_onnx(model, X_test, b_test, path: str) -> bool:
+    """
+    ONNX export with a dynamic batch axis (FlowAgent backend='onnx'). Serving
+    backends take one input: the features with the business embedding appended
+
+    An existing file at path is removed first, so a failed export never
+    leaves an older model next to new weights.
+
+    Returns:
+        True if the model was exported
+    """
+    for stale in (path, f'{path}.data'):
+        if os.path.exists(stale):
+            os.remove(stale)
+    try:
+        model.eval()
+        with torch.no_grad():
+            X_serving = model.append_embedding(X_test, b_test)
+        # Example batch of 2: newer exporters specialize a batch of 1 as a constant
+        torch.onnx.export(
+            model, (X_serving[:2],), path,
+            input_names=['input'], output_names=['predictions'],
+            dynamic_axes={'input': {0: 'batch'}, 'predictions': {0: 'batch'}},
+            opset_version=18
+        )
+        # Keep weights inside the .onnx (some exporters write a side .data file)
+        import onnx
+        onnx.save_model(onnx.load(path), path)
+        if os.path.exists(f'{path}.data'):
+            os.remove(f'{path}.data')
+        logger.info("✓ ONNX model exported")
+
+        import onnxruntime as ort
+        session = ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+        onnx_preds = session.run(None, {'input': X_serving.numpy()})[0]
+        with torch.no_grad():
+            torch_preds = model(X_test, b_test).numpy()
+        max_diff = float(np.abs(onnx_preds - torch_preds).max())
+        logger.info(f"  ONNX vs torch max abs diff (scaled): {max_diff:.2e}")
+        if max_diff > 1e-4:
+            logger.warning("  ONNX output differs from torch beyond tolerance!")
+        return True
+    except ImportError as e:
+        logger.warning(f"ONNX export/check skipped - missing dependency ({e})")
+    except Exception as e:
+        logger.warning(f"ONNX export failed: {e}")
+        for partial in (path, f'{path}.data'):
+            if os.path.exists(partial):
+                os.remove(partial)
+    # Without onnx / onnxruntime the export may still have completed (unchecked)
+    return os.path.exists(path) and not os.path.exists(f'{path}.data')
+
+def save_artifacts(model, quantized_model, metadata: Dict, scaler, target_scaler, business_scalers: Dict,
+                   X_example, b_example, output_dir: str):
+    """
+    Writes one complete artifact set (.pt checkpoint excepted - fit writes it)
 
-with open('models/business_metadata.json', 'w') as f:
-    json.dump(metadata, f, indent=2)
-logger.info("✓ Metadata saved")
+    Args:
+        scaler, target_scaler: Global scalers (anything with mean_ / scale_)
+        X_example, b_example: Windows + business index for the ONNX export and check
+
+    Returns:
+        True if business_lstm.onnx was exported (see export_onnx)
+    """
+    logger.info("\n=== Saving Production Artifacts ===")
+    artifact = lambda name: os.path.join(output_dir, name)
+    onnx_exported = export_onnx(model, X_example, b_example, artifact('business_lstm.onnx'))
+
+    # Int8 model as TorchScript (packed int8 params can't go through weights_only loading)
+    torch.jit.save(torch.jit.script(quantized_model), artifact('business_lstm_int8.pt'))
+    logger.info("✓ Int8 quantized model saved")
+
+    with open(artifact('business_metadata.json'), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    logger.info("✓ Metadata saved")
+
+    # Weights + scaler mean/scale (global and per business) + metadata in one
+    # memory-mappable file (every backend's scalers, the numpy backend's
+    # weights) - replaces the scaler pickles and the .npz
+    export_bundle(model.state_dict(), scaler, target_scaler, metadata, artifact('business_lstm.bundle'),
+                  business_scalers=business_scalers)
+    logger.info("✓ Artifact bundle saved")
+    return onnx_exported
 
 # ==========================================
 # VISUALIZATION
 # ==========================================
-logger.info("\n=== Creating Visualizations ===")
-
-fig, axes = plt.subplots(2, 2, figsize=(16, 10))
-
-# Training history
-ax = axes[0, 0]
-ax.plot(history['train'], label='Train Loss', linewidth=2)
-ax.plot(history['val'], label='Val Loss', linewidth=2)
-ax.set_title('Training History (Real Business Data)', fontsize=14, fontweight='bold')
-ax.set_xlabel('Epoch')
-ax.set_ylabel('MSE Loss')
-ax.legend()
-ax.grid(True, alpha=0.3)
-
-# Scatter plot
-ax = axes[0, 1]
-ax.scatter(actual_real, pred_real, alpha=0.5, s=30)
-min_val, max_val = actual_real.min(), actual_real.max()
-ax.plot([min_val, max_val], [min_val, max_val], 'r--', linewidth=2)
-ax.set_title(f'Predictions vs Actuals (R²={r2:.3f})', fontsize=14, fontweight='bold')
-ax.set_xlabel('Actual Cash In')
-ax.set_ylabel('Predicted Cash In')
-ax.grid(True, alpha=0.3)
-
-# Example forecast
-ax = axes[1, 0]
-sample_idx = 0
-sample_pred = inverse_transform_target(all_preds[sample_idx])
-sample_actual = inverse_transform_target(all_actuals[sample_idx])
-weeks = np.arange(1, config.FORECAST_HORIZON + 1)
-ax.plot(weeks, sample_actual, 'bo-', label='Actual', linewidth=2, markersize=8)
-ax.plot(weeks, sample_pred, 'rs--', label='Predicted', linewidth=2, markersize=8)
-ax.set_title('Example 4-Week Forecast', fontsize=14, fontweight='bold')
-ax.set_xlabel('Weeks Ahead')
-ax.set_ylabel('Cash In')
-ax.legend()
-ax.grid(True, alpha=0.3)
-
-# Week-specific MAE
-ax = axes[1, 1]
-week_maes = []
-for week in range(config.FORECAST_HORIZON):
-    week_preds = inverse_transform_target(all_preds[:, week])
-    week_actuals = inverse_transform_target(all_actuals[:, week])
-    week_maes.append(mean_absolute_error(week_actuals, week_preds))
-ax.plot(range(1, config.FORECAST_HORIZON + 1), week_maes, 'o-', linewidth=2, markersize=8)
-ax.set_title('Prediction Accuracy by Week', fontsize=14, fontweight='bold')
-ax.set_xlabel('Weeks Ahead')
-ax.set_ylabel('MAE')
-ax.grid(True, alpha=0.3)
-
-plt.tight_layout()
-plt.savefig('plots/business_training_results.png', dpi=300, bbox_inches='tight')
-logger.info("✓ Plots saved")
-plt.close()
-
-logger.info("\n" + "="*60)
-logger.info("🎉 TRAINING COMPLETE!")
-logger.info("="*60)
-logger.info("\nProduction artifacts ready:")
-logger.info("  📦 models/business_lstm.pt")
-logger.info("  📦 models/business_scaler.pkl")
-logger.info("  📦 models/business_target_scaler.pkl")
-logger.info("  📦 models/business_metadata.json")
-logger.info("  📊 plots/business_training_results.png")
-logger.info("\nNext: Use business_agent.py for predictions")
-logger.info("="*60)
\ No newline at end of file
+def plot_results(history: Dict, all_preds_real, all_actuals_real, r2: float, config: Config, path: str):
+    logger.info("\n=== Creating Visualizations ===")
+    import matplotlib.pyplot as plt
+
+    pred_real = all_preds_real.flatten()
+    actual_real = all_actuals_real.flatten()
+    fig, axes = plt.subplots(2, 2, figsize=(16, 10))
+
+    # Training history
+    ax = axes[0, 0]
+    ax.plot(history['train'], label='Train Loss', linewidth=2)
+    ax.plot(history['val'], label='Val Loss', linewidth=2)
+    ax.set_title('Training History (Real Business Data)', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Epoch')
+    ax.set_ylabel('MSE Loss')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+
+    # Scatter plot
+    ax = axes[0, 1]
+    ax.scatter(actual_real, pred_real, alpha=0.5, s=30)
+    min_val, max_val = actual_real.min(), actual_real.max()
+    ax.plot([min_val, max_val], [min_val, max_val], 'r--', linewidth=2)
+    ax.set_title(f'Predictions vs Actuals (R²={r2:.3f})', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Actual Cash In')
+    ax.set_ylabel('Predicted Cash In')
+    ax.grid(True, alpha=0.3)
+
+    # Example forecast
+    ax = axes[1, 0]
+    sample_idx = 0
+    sample_pred = all_preds_real[sample_idx]
+    sample_actual = all_actuals_real[sample_idx]
+    weeks = np.arange(1, config.FORECAST_HORIZON + 1)
+    ax.plot(weeks, sample_actual, 'bo-', label='Actual', linewidth=2, markersize=8)
+    ax.plot(weeks, sample_pred, 'rs--', label='Predicted', linewidth=2, markersize=8)
+    ax.set_title('Example 4-Week Forecast', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Weeks Ahead')
+    ax.set_ylabel('Cash In')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+
+    # Week-specific MAE
+    ax = axes[1, 1]
+    week_maes = []
+    for week in range(config.FORECAST_HORIZON):
+        week_preds = all_preds_real[:, week]
+        week_actuals = all_actuals_real[:, week]
+        week_maes.append(mean_absolute_error(week_actuals, week_preds))
+    ax.plot(range(1, config.FORECAST_HORIZON + 1), week_maes, 'o-', linewidth=2, markersize=8)
+    ax.set_title('Prediction Accuracy by Week', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Weeks Ahead')
+    ax.set_ylabel('MAE')
+    ax.grid(True, alpha=0.3)
+
+    plt.tight_layout()
+    plt.savefig(path, dpi=300, bbox_inches='tight')
+    logger.info("✓ Plots saved")
+    plt.close()
+
+# ==========================================
+# TRAINING JOB
+# ==========================================
+def train(config: Optional[Config] = None, extra_metadata: Optional[Dict] = None, **overrides) -> Dict:
+    """
+    One complete training run: data → features → split/scale → fit →
+    evaluate → int8 → artifacts in config.OUTPUT_DIR (→ registry)
+
+    No module-level state, so jobs can run side by side in worker
+    processes (see train_sweep.py) as long as each has its own OUTPUT_DIR.
+
+    Args:
+        config: Config to run (default: Config(**overrides))
+        extra_metadata: Additional top-level metadata sections (e.g. the
+                        hparam_search.py record of how the config was chosen)
+        overrides: Config fields, e.g. HIDDEN_SIZE=32, SEGMENT={'region': 'north'}
+
+    Returns:
+        The business_metadata.json contents written for this run
+    """
+    if config is None:
+        config = Config(**overrides)
+    elif overrides:
+        raise ValueError("Pass either a Config or field overrides, not both")
+    started = time.perf_counter()
+
+    torch.manual_seed(config.SEED)
+    np.random.seed(config.SEED)
+    os.makedirs(config.OUTPUT_DIR, exist_ok=True)
+    artifact = lambda name: os.path.join(config.OUTPUT_DIR, name)
+
+    df, business_ids = load_data(config)
+    add_features(df, config)
+    train_df, val_df, test_df = split_temporal(df)
+    scaler, target_scaler, business_scalers = fit_scalers(train_df, config, len(business_ids))
+    for frame in (train_df, val_df, test_df):
+        scale_by_business(frame, config, business_scalers)
+
+    logger.info("\n=== Creating Sequences ===")
+    train_set = create_sequences(train_df, config)
+    val_set = create_sequences(val_df, config)
+    test_set = create_sequences(test_df, config)
+    X_test, y_test, b_test = test_set.tensors()
+
+    logger.info(f"Train sequences: {len(train_set)} | Val: {len(val_set)} | Test: {len(test_set)}")
+    logger.info(f"Input shape: {(len(train_set),) + train_set.X.shape[1:]} | "
+                f"Output shape: {(len(train_set),) + train_set.y.shape[1:]}")
+
+    # Loaders
+    train_loader = WindowLoader(train_set, batch_size=config.BATCH_SIZE, shuffle=True)
+    val_loader = WindowLoader(val_set, batch_size=config.BATCH_SIZE)
+    test_loader = WindowLoader(test_set, batch_size=config.BATCH_SIZE)
+
+    model = build_model(config, len(business_ids))
+    if config.FAST_TRAINING:
+        history, best_val_loss = fit_fast(model, train_set, val_set, config, artifact('business_lstm.pt'))
+    else:
+        history, best_val_loss = fit(model, train_loader, val_loader, config, artifact('business_lstm.pt'))
+    train_seconds = time.perf_counter() - started
+
+    performance, all_preds_real, all_actuals_real, test_rows = evaluate(model, test_loader, config,
+                                                                        business_scalers)
+    quantized_model, quantized_metrics = quantize(model, test_loader, config, business_scalers, performance,
+                                                  all_preds_real, all_actuals_real, test_rows)
+
+    metadata = {
+        'version': '1.0',
+        'trained_at': datetime.now().isoformat(),
+        'data_type': 'real_business_transactions',
+        'config': {
+            'seq_length': config.SEQ_LENGTH,
+            'forecast_horizon': config.FORECAST_HORIZON,
+            'hidden_size': config.HIDDEN_SIZE,
+            'num_layers': config.NUM_LSTM_LAYERS,
+            'dropout': config.DROPOUT,
+            'feature_cols': config.FEATURE_COLS,
+            'target_col': config.TARGET_COL,
+            'num_businesses': len(business_ids),
+            'embed_dim': config.EMBED_DIM,
+            'business_id_col': config.BUSINESS_ID_COL
+        },
+        # Embedding / per-business scaler row order
+        'businesses': business_ids,
+        'training': {
+            'data_path': config.DATA_PATH,
+            'segment': config.SEGMENT,
+            'batch_size': config.BATCH_SIZE,
+            'learning_rate': config.LEARNING_RATE,
+            'seed': config.SEED,
+            # Last week of the data / of the windows the weights were fit on
+            # (finetune.py fine-tunes on the windows after trained_through)
+            'data_end': str(df['date'].max().date()),
+            'trained_through': str(train_df['date'].max().date()),
+            'fast_training': config.FAST_TRAINING,
+            'compile': config.COMPILE,
+            'bf16_autocast': config.BF16_AUTOCAST,
+            'train_seconds': train_seconds
+        },
+        'scaler_params': {
+            'target_mean': float(target_scaler.mean_[0]),
+            'target_std': float(target_scaler.scale_[0])
+        },
+        'performance': performance,
+        'quantized_int8': quantized_metrics,
+        'epochs_trained': len(history['train']),
+        'best_val_loss': float(best_val_loss)
+    }
+    metadata.update(extra_metadata or {})
+
+    save_artifacts(model, quantized_model, metadata, scaler, target_scaler, business_scalers,
+                   X_test, b_test, config.OUTPUT_DIR)
+
+    if config.PUBLISH_TO_REGISTRY:
+        from model_registry import ModelRegistry
+        registry_version = ModelRegistry(config.REGISTRY_DIR).publish(config.OUTPUT_DIR)
+        logger.info(f"✓ Published to {config.REGISTRY_DIR} as {registry_version} (now active)")
+
+    if config.SAVE_PLOTS:
+        os.makedirs(config.PLOTS_DIR, exist_ok=True)
+        plot_results(history, all_preds_real, all_actuals_real, performance['test_r2'], config,
+                     os.path.join(config.PLOTS_DIR, 'business_training_results.png'))
+
+    logger.info("\n" + "="*60)
+    logger.info("🎉 TRAINING COMPLETE!")
+    logger.info("="*60)
+    logger.info("\nProduction artifacts ready:")
+    for name in ('business_lstm.pt', 'business_lstm.onnx', 'business_lstm_int8.pt',
+                 'business_lstm.bundle', 'business_metadata.json'):
+        logger.info(f"  📦 {artifact(name)}")
+    if config.SAVE_PLOTS:
+        logger.info(f"  📊 {os.path.join(config.PLOTS_DIR, 'business_training_results.png')}")
+    logger.info("\nNext: Use business_agent.py for predictions")
+    logger.info("="*60)
+    return metadata
+
+
+if __name__ == "__main__":
+    train()
@@ -0,0 +1,368 @@
+"""
+train_sweep.py - FLOW Parallel Training Runs
+Fans trainLSTM.train jobs out over a process pool and ranks the results
+
+Each job is one set of Config overrides (a hyperparameter point, a
+business segment, or both). It trains in a worker process with torch /
+OpenMP / BLAS capped at threads_per_job threads, into its own run
+directory. The leaderboard is read back from the business_metadata.json
+every run writes, so it can be rebuilt later from the run directories
+alone. Runs on different segments train and validate on different data
+(with their own scalers), so they are ranked within their segment only:
+ranks restart at 1 for each segment.
+
+Layout:
+    runs/sweep/
+        hidden_size-32_dropout-0.2/     ← job.json + trainLSTM artifacts
+        ...
+        leaderboard.csv, leaderboard.json
+
+Usage:
+    jobs = grid_jobs({'HIDDEN_SIZE': [32, 64], 'DROPOUT': [0.2, 0.3]}, DATA_PATH='tsf.csv')
+    leaderboard = run_sweep(jobs, root='runs/sweep', processes=4)
+    leaderboard[0]                          # best validation loss (of the first segment)
+
+CLI:
+    python train_sweep.py --data tsf.csv --grid HIDDEN_SIZE=32,64 SEQ_LENGTH=8,12 DROPOUT=0.2,0.3
+    python train_sweep.py --data businesses.csv --segment-col region --set EPOCHS=40
+    python train_sweep.py --leaderboard-only runs/sweep
+"""
+
+import ast
+import csv
+import itertools
+import json
+import logging
+import multiprocessing as mp
+import os
+import re
+import time
+import traceback
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_FILE = 'job.json'
+METADATA_FILE = 'business_metadata.json'
+
+# Leaderboard columns: (name, path into business_metadata.json)
+LEADERBOARD_FIELDS = (
+    ('best_val_loss', ('best_val_loss',)),
+    ('test_mae', ('performance', 'test_mae')),
+    ('test_rmse', ('performance', 'test_rmse')),
+    ('test_r2', ('performance', 'test_r2')),
+    ('test_mape', ('performance', 'test_mape')),
+    ('int8_test_mape', ('quantized_int8', 'test_mape')),
+    ('epochs_trained', ('epochs_trained',)),
+    ('train_seconds', ('training', 'train_seconds')),
+    ('seq_length', ('config', 'seq_length')),
+    ('hidden_size', ('config', 'hidden_size')),
+    ('num_layers', ('config', 'num_layers')),
+    ('dropout', ('config', 'dropout')),
+    ('batch_size', ('training', 'batch_size')),
+    ('learning_rate', ('training', 'learning_rate')),
+    ('num_businesses', ('config', 'num_businesses')),
+    ('segment', ('training', 'segment'))
+)
+
+# Metrics where higher is better (leaderboard sorts them descending)
+HIGHER_IS_BETTER = ('test_r2',)
+
+
+# ==========================================
+# JOBS
+# ==========================================
+
+def job_name(overrides: Dict) -> str:
+    """Filesystem-safe run directory name from a job's overrides"""
+    parts = []
+    for key, value in overrides.items():
+        if isinstance(value, dict):  # SEGMENT={'region': 'north'} → region-north
+            parts.extend(f"{column}-{v}" for column, v in value.items())
+        else:
+            parts.append(f"{key.lower()}-{value}")
+    return re.sub(r'[^A-Za-z0-9_.=-]+', '_', '_'.join(parts)) or 'default'
+
+
+def grid_jobs(grid: Dict[str, List], **base) -> List[Dict]:
+    """
+    One job per point of a Config grid
+
+    Args:
+        grid: {Config field: [values]}, e.g. {'HIDDEN_SIZE': [32, 64]}
+        base: Overrides shared by every job (DATA_PATH, EPOCHS, SEGMENT, ...)
+
+    Returns:
+        [{'name': run directory name, 'overrides': {...}}, ...]
+    """
+    fields = list(grid)
+    jobs = []
+    for values in itertools.product(*(grid[field] for field in fields)):
+        point = dict(zip(fields, values))
+        varying = dict(point, SEGMENT=base['SEGMENT']) if base.get('SEGMENT') else point
+        jobs.append({'name': job_name(varying), 'overrides': dict(base, **point)})
+    return jobs
+
+
+def segment_values(data_path: str, column: str) -> List:
+    """Distinct values of a segment column (e.g. region) in a training CSV"""
+    import pandas as pd
+    return sorted(pd.read_csv(data_path, usecols=[column])[column].dropna().unique().tolist())
+
+
+# ==========================================
+# WORKER
+# ==========================================
+
+def _init_worker(threads: int, log_level: int):
+    from portfolio_pool import pin_threads
+    pin_threads(threads)  # Env caps first, so torch starts with them
+    import trainLSTM      # Imported once per worker, not per job
+    pin_threads(threads)
+    logging.getLogger('trainLSTM').setLevel(log_level)
+
+
+def _run_job(job: Dict, root: str) -> Dict:
+    """Trains one job into root/<name>, returns its status (never raises)"""
+    run_dir = os.path.join(root, job['name'])
+    os.makedirs(run_dir, exist_ok=True)
+    overrides = dict(job['overrides'])
+    overrides.setdefault('SAVE_PLOTS', False)
+    overrides.update(OUTPUT_DIR=run_dir, PLOTS_DIR=os.path.join(run_dir, 'plots'), PUBLISH_TO_REGISTRY=False)
+
+    # A re-run must not leave an earlier run's metadata to be ranked if it fails
+    metadata_path = os.path.join(run_dir, METADATA_FILE)
+    if os.path.exists(metadata_path):
+        os.remove(metadata_path)
+    with open(os.path.join(run_dir, JOB_FILE), 'w') as f:
+        json.dump(dict(job, pid=os.getpid(), started_at=time.time()), f, indent=2, default=str)
+
+    started = time.perf_counter()
+    try:
+        from trainLSTM import train
+        train(**overrides)
+        error = None
+    except Exception:
+        error = traceback.format_exc(limit=3)
+    return {'name': job['name'], 'seconds': time.perf_counter() - started, 'error': error}
+
+
+# ==========================================
+# SWEEP
+# ==========================================
+
+def run_sweep(jobs: List[Dict], root: str = 'runs/sweep', processes: Optional[int] = None,
+              threads_per_job: int = 1, start_method: Optional[str] = None,
+              worker_log_level: int = logging.WARNING, sort_by: str = 'best_val_loss') -> List[Dict]:
+    """
+    Trains every job across a process pool and writes the leaderboard
+
+    Args:
+        jobs: [{'name', 'overrides'}, ...] (see grid_jobs)
+        root: Sweep directory (one run directory per job)
+        processes: Concurrent jobs (default: os.cpu_count() // threads_per_job)
+        threads_per_job: Intra-op threads per training process
+        start_method: 'fork' (default where available) or 'spawn'
+        worker_log_level: trainLSTM log level inside workers
+        sort_by: Leaderboard metric (see LEADERBOARD_FIELDS)
+
+    Returns:
+        Leaderboard rows, best first (failed jobs last, with their error)
+    """
+    names = [job['name'] for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError("Job names must be unique (they are the run directories)")
+    os.makedirs(root, exist_ok=True)
+    processes = processes or max(1, (os.cpu_count() or 1) // threads_per_job)
+    start_method = start_method or ('fork' if 'fork' in mp.get_all_start_methods() else 'spawn')
+
+    logger.info(f"🧪 Sweep: {len(jobs)} job(s) on {processes} process(es) x {threads_per_job} thread(s) → {root}")
+    started = time.perf_counter()
+    statuses = {}
+    context = mp.get_context(start_method)
+    with context.Pool(processes, initializer=_init_worker, initargs=(threads_per_job, worker_log_level)) as pool:
+        results = pool.imap_unordered(_run_job_star, [(job, root) for job in jobs])
+        for done, status in enumerate(results, 1):
+            statuses[status['name']] = status
+            outcome = 'failed' if status['error'] else f"{status['seconds']:.1f}s"
+            logger.info(f"   [{done}/{len(jobs)}] {status['name']}: {outcome}")
+            if status['error']:
+                logger.error(status['error'])
+
+    rows = collect_leaderboard(root, sort_by, names=names)
+    for row in rows:
+        if row['name'] in statuses and statuses[row['name']]['error']:
+            row['error'] = statuses[row['name']]['error'].strip().splitlines()[-1]
+    write_leaderboard(rows, root)
+    logger.info(f"✓ Sweep finished in {time.perf_counter() - started:.1f}s")
+    return rows
+
+
+def _run_job_star(args):
+    return _run_job(*args)
+
+
+# ==========================================
+# LEADERBOARD
+# ==========================================
+
+def _lookup(metadata: Dict, path: tuple):
+    for key in path:
+        if not isinstance(metadata, dict) or key not in metadata:
+            return None
+        metadata = metadata[key]
+    return metadata
+
+
+def collect_leaderboard(root: str, sort_by: str = 'best_val_loss', names: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Leaderboard rows from the run directories under root
+
+    Args:
+        root: Sweep directory
+        sort_by: Metric to rank by (test_r2 descending, the rest ascending)
+        names: Run directories to include (default: every one with a job.json)
+
+    Returns:
+        [{'rank', 'name', 'overrides', <LEADERBOARD_FIELDS>...}, ...] grouped
+        by segment, ranked within each segment (losses of different
+        segments are not comparable). Per segment, runs without metadata
+        (failed / unfinished) or with metadata older than their job.json
+        (left over from an earlier run) come last with rank None
+    """
+    if sort_by not in dict(LEADERBOARD_FIELDS):
+        raise ValueError(f"Unknown leaderboard metric: {sort_by}")
+    if names is None:
+        names = sorted(name for name in os.listdir(root) if os.path.isfile(os.path.join(root, name, JOB_FILE)))
+
+    rows = []
+    for name in names:
+        run_dir = os.path.join(root, name)
+        row = {'rank': None, 'name': name, 'overrides': None}
+        job = {}
+        try:
+            with open(os.path.join(run_dir, JOB_FILE)) as f:
+                job = json.load(f)
+            row['overrides'] = job.get('overrides')
+        except FileNotFoundError:
+            pass
+        metadata_path = os.path.join(run_dir, METADATA_FILE)
+        error = None
+        try:
+            with open(metadata_path) as f:
+                metadata = json.load(f)
+        except FileNotFoundError:
+            metadata, error = None, 'no business_metadata.json'
+        if metadata is not None and os.path.getmtime(metadata_path) < job.get('started_at', 0):
+            metadata, error = None, 'stale business_metadata.json (written before the last job start)'
+        for field, path in LEADERBOARD_FIELDS:
+            row[field] = _lookup(metadata, path) if metadata else None
+        if row['segment'] is None:  # Failed runs: the segment the job was for
+            row['segment'] = (row['overrides'] or {}).get('SEGMENT')
+        row['error'] = error
+        rows.append(row)
+
+    segments = {}
+    for row in rows:
+        segments.setdefault(json.dumps(row['segment'], sort_keys=True, default=str), []).append(row)
+
+    sign = -1 if sort_by in HIGHER_IS_BETTER else 1
+    leaderboard = []
+    for segment_rows in segments.values():
+        ranked = sorted((row for row in segment_rows if row[sort_by] is not None), key=lambda row: sign * row[sort_by])
+        for rank, row in enumerate(ranked, 1):
+            row['rank'] = rank
+        leaderboard += ranked + [row for row in segment_rows if row[sort_by] is None]
+    return leaderboard
+
+
+def write_leaderboard(rows: List[Dict], root: str):
+    """leaderboard.json + leaderboard.csv in the sweep directory"""
+    with open(os.path.join(root, 'leaderboard.json'), 'w') as f:
+        json.dump(rows, f, indent=2, default=str)
+    fields = ['rank', 'name'] + [field for field, _ in LEADERBOARD_FIELDS] + ['overrides', 'error']
+    with open(os.path.join(root, 'leaderboard.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({field: json.dumps(row[field]) if isinstance(row[field], dict) else row[field]
+                             for field in fields})
+
+
+def format_leaderboard(rows: List[Dict], top: Optional[int] = None) -> str:
+    lines = [f"{'#':>3}  {'run':<40} {'val loss':>9} {'MAE':>14} {'MAPE':>7} {'R²':>7} {'epochs':>6} {'time':>7}"]
+    segments = {json.dumps(row['segment'], sort_keys=True, default=str) for row in rows}
+    segment = None
+    for row in rows[:top]:
+        if len(segments) > 1 and row['segment'] != segment:
+            segment = row['segment']
+            label = ', '.join(f"{column}={value}" for column, value in (segment or {}).items()) or 'all businesses'
+            lines.append(f"     segment {label}")
+        if row['rank'] is None:
+            lines.append(f"{'-':>3}  {row['name']:<40} {row.get('error') or 'failed'}")
+            continue
+        lines.append(f"{row['rank']:>3}  {row['name']:<40} {row['best_val_loss']:>9.5f} {row['test_mae']:>14,.0f} "
+                     f"{row['test_mape']:>6.2f}% {row['test_r2']:>7.4f} {row['epochs_trained']:>6} "
+                     f"{row['train_seconds'] or 0:>6.1f}s")
+    return '\n'.join(lines)
+
+
+# ==========================================
+# CLI
+# ==========================================
+
+def _parse_value(text: str):
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def _parse_assignments(items: List[str], multi: bool) -> Dict:
+    parsed = {}
+    for item in items or []:
+        field, _, values = item.partition('=')
+        if not values:
+            raise SystemExit(f"Expected FIELD=value, got {item!r}")
+        parsed[field] = [_parse_value(v) for v in values.split(',')] if multi else _parse_value(values)
+    return parsed
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', help='training CSV (Config.DATA_PATH)')
+    parser.add_argument('--grid', nargs='*', metavar='FIELD=v1,v2', help='Config fields to sweep')
+    parser.add_argument('--set', nargs='*', metavar='FIELD=value', help='Config overrides for every job')
+    parser.add_argument('--segment-col', help='one job set per distinct value of this CSV column')
+    parser.add_argument('--root', default='runs/sweep')
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--threads-per-job', type=int, default=1)
+    parser.add_argument('--sort-by', default='best_val_loss', choices=[field for field, _ in LEADERBOARD_FIELDS])
+    parser.add_argument('--leaderboard-only', metavar='ROOT', help='re-rank an existing sweep directory')
+    args = parser.parse_args()
+
+    if args.leaderboard_only:
+        rows = collect_leaderboard(args.leaderboard_only, args.sort_by)
+        write_leaderboard(rows, args.leaderboard_only)
+    else:
+        base = _parse_assignments(args.set, multi=False)
+        if args.data:
+            base['DATA_PATH'] = args.data
+        grid = _parse_assignments(args.grid, multi=True)
+        if args.segment_col:
+            from trainLSTM import Config
+            data_path = base.get('DATA_PATH', Config.DATA_PATH)
+            jobs = [job for value in segment_values(data_path, args.segment_col)
+                    for job in grid_jobs(grid, **base, SEGMENT={args.segment_col: value})]
+        else:
+            jobs = grid_jobs(grid, **base)
+        rows = run_sweep(jobs, args.root, args.processes, args.threads_per_job, sort_by=args.sort_by)
+
+    print(f"\n{'='*70}")
+    print(f"🏆 LEADERBOARD (by {args.sort_by})")
+    print(f"{'='*70}\n")
+    print(format_leaderboard(rows))
+    print(f"\n{'='*70}\n")